@@ -0,0 +1,187 @@
+"""
+WebSocket chat: one authenticated connection per conversation, with its state kept in memory.
+
+Connect to /ws/chat?token=<access token> (or send an Authorization: Bearer header), then send
+{"message": "..."} frames. Each reply streams back as {"type": "token", "content": ...} frames
+followed by one {"type": "done", "reply": ..., "stage": ..., "intent": ...} frame.
+
+Each turn is admitted through the worker's ChatLimiter, like POST /chat, and cut off after
+CHAT_TIMEOUT. A turn that can't run is answered with {"type": "error", "status": 429 | 503 | 504,
+"detail": ...} and the connection stays open.
+
+History, stage, intent and escalation state are loaded from Mongo once on connect; messages
+are written back on a background task. A turn waits for those writes only on the rare turn
+that escalates the conversation, because the escalation flag lives on the same document.
+"""
+import os
+import asyncio
+import logging
+from fastapi import APIRouter, WebSocket, WebSocketDisconnect
+from langchain.schema import HumanMessage, AIMessage
+from app.chatbot import (
+    get_llm, analyze_stage, detect_intent, get_full_session_history, escalation_notice, calculate_lead_score,
+    chat_messages, should_escalate,
+)
+from app.prompt_cache import prefix_cache
+from app.tokens import count_tokens
+from app.db import validate_token, save_message, get_escalation_status
+from api.limiter import Overloaded
+
+logger = logging.getLogger(__name__)
+
+WS_MAX_CONNECTIONS = int(os.getenv("WS_MAX_CONNECTIONS", 500))
+WS_IDLE_TIMEOUT = float(os.getenv("WS_IDLE_TIMEOUT", 300))
+# Most recent messages kept in memory and fed to the prompts
+WS_HISTORY_WINDOW = int(os.getenv("WS_HISTORY_WINDOW", 40))
+
+# Close codes: 1008 policy violation (auth), 1013 try again later (cap), 4000 idle
+WS_CLOSE_UNAUTHORIZED = 1008
+WS_CLOSE_OVERLOADED = 1013
+WS_CLOSE_IDLE = 4000
+
+router = APIRouter()
+active_connections = 0
+
+
+class ChatSession:
+    """Conversation state for one WebSocket connection."""
+
+    def __init__(self, user_id):
+        self.user_id = user_id
+        self.history = []
+        self.message_count = 0
+        self.stage = 1
+        self.intent = "neutral"
+        self.escalated = False
+        self._pending_writes = asyncio.Queue()
+        self._writer = None
+
+    async def load(self):
+        history = await asyncio.to_thread(get_full_session_history, self.user_id)
+        self.message_count = len(history)
+        self.history = history[-WS_HISTORY_WINDOW:]
+        success, escalated = await asyncio.to_thread(get_escalation_status, self.user_id)
+        self.escalated = success and escalated
+        self._writer = asyncio.create_task(self._write_messages())
+
+    async def _write_messages(self):
+        while True:
+            sender, message, analysis = await self._pending_writes.get()
+            try:
+                await asyncio.to_thread(save_message, self.user_id, sender, message, **analysis)
+            except Exception as e:
+                logger.error("Could not save %s message for %s: %s", sender, self.user_id, str(e))
+            finally:
+                self._pending_writes.task_done()
+
+    def _remember(self, sender, message, **analysis):
+        # Counted once here; the count travels with the message in memory and in Mongo
+        tokens = count_tokens(message)
+        message_class = HumanMessage if sender == "user" else AIMessage
+        self.history.append(message_class(content=message, additional_kwargs={"tokens": tokens}))
+        del self.history[:-WS_HISTORY_WINDOW]
+        self.message_count += 1
+        self._pending_writes.put_nowait((sender, message, {**analysis, "tokens": tokens}))
+
+    async def turn(self, user_message, send):
+        """Answer one message, streaming the reply through `send`; returns the full reply."""
+        from app.retriever import retrieve_relevant_chunks
+        history = list(self.history)
+        context, stage, intent = await asyncio.gather(
+            asyncio.to_thread(retrieve_relevant_chunks, user_message, namespace=self.user_id),
+            asyncio.to_thread(analyze_stage, user_message, history),
+            asyncio.to_thread(detect_intent, user_message, history),
+        )
+        self.stage, self.intent = stage, intent
+        messages = chat_messages(stage, history, user_message, context)
+
+        parts = []
+        async for chunk in get_llm().astream(messages, stream_usage=True):
+            if getattr(chunk, "usage_metadata", None):
+                prefix_cache.record_response(chunk)
+            if chunk.content:
+                parts.append(chunk.content)
+                await send({"type": "token", "content": chunk.content})
+        reply = "".join(parts)
+        self._remember("user", user_message, stage=stage, intent=intent, score=calculate_lead_score(stage, intent))
+        self._remember("ai", reply)
+
+        if not self.escalated and should_escalate(stage, intent, self.message_count):
+            # The escalation flag lives on the conversation document, so it must be written first
+            await self._pending_writes.join()
+            notice = await asyncio.to_thread(escalation_notice, self.user_id, history, stage, intent, self.message_count)
+            if notice:
+                self.escalated = True
+                await send({"type": "token", "content": notice})
+                reply += notice
+        return reply
+
+    async def close(self):
+        """Flush pending messages to Mongo and stop the writer."""
+        if self._writer is not None:
+            await self._pending_writes.join()
+            self._writer.cancel()
+
+
+def _token(websocket):
+    token = websocket.query_params.get("token")
+    authorization = websocket.headers.get("authorization", "")
+    if not token and authorization.lower().startswith("bearer "):
+        token = authorization[len("bearer "):]
+    return token
+
+
+@router.websocket("/ws/chat")
+async def chat_socket(websocket: WebSocket):
+    global active_connections
+    if active_connections >= WS_MAX_CONNECTIONS:
+        await websocket.close(code=WS_CLOSE_OVERLOADED, reason="Too many connections")
+        return
+    success, user_id = validate_token(_token(websocket) or "")
+    if not success:
+        await websocket.close(code=WS_CLOSE_UNAUTHORIZED, reason=user_id)
+        return
+
+    active_connections += 1
+    limiter = websocket.app.state.chat_limiter
+    session = ChatSession(user_id)
+    try:
+        await websocket.accept()
+        await session.load()
+        while True:
+            try:
+                data = await asyncio.wait_for(websocket.receive_json(), WS_IDLE_TIMEOUT)
+            except asyncio.TimeoutError:
+                await websocket.close(code=WS_CLOSE_IDLE, reason="Idle timeout")
+                return
+            message = (data.get("message") or "").strip() if isinstance(data, dict) else ""
+            if not message:
+                await websocket.send_json({"type": "error", "detail": "Send {\"message\": \"...\"}"})
+                continue
+            try:
+                async with limiter.admit():
+                    reply = await asyncio.wait_for(session.turn(message, websocket.send_json), limiter.timeout)
+            except Overloaded as e:
+                logger.warning("Rejected WebSocket turn for %s: %s", user_id, e.detail)
+                await websocket.send_json({"type": "error", "status": e.status_code, "detail": e.detail})
+                continue
+            except asyncio.TimeoutError:
+                logger.error("WebSocket turn for %s timed out after %.0fs", user_id, limiter.timeout)
+                await websocket.send_json({"type": "error", "status": 504, "detail": "Chat timed out"})
+                continue
+            except WebSocketDisconnect:
+                raise
+            except Exception as e:
+                logger.error("WebSocket chat turn failed for %s: %s", user_id, str(e))
+                await websocket.send_json({"type": "error", "detail": "Sorry, something went wrong. Please try again."})
+                continue
+            await websocket.send_json({"type": "done", "reply": reply, "stage": session.stage, "intent": session.intent})
+    except WebSocketDisconnect:
+        pass
+    finally:
+        active_connections -= 1
+        await session.close()
+
+
+def connection_stats():
+    return {"websocket_connections": active_connections, "websocket_max_connections": WS_MAX_CONNECTIONS}
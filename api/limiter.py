@@ -0,0 +1,93 @@
+"""
+Per-worker admission control for chat turns, shared by POST /chat and the WebSocket chat.
+
+Each worker runs at most CHAT_MAX_CONCURRENCY chats at once and queues up to CHAT_MAX_QUEUE
+more. Requests beyond that are rejected with 429; requests that wait in the queue longer than
+CHAT_QUEUE_TIMEOUT get 503, and chats running past CHAT_TIMEOUT get 504.
+"""
+import os
+import asyncio
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from dotenv import load_dotenv
+
+load_dotenv()
+
+CHAT_MAX_CONCURRENCY = int(os.getenv("CHAT_MAX_CONCURRENCY", 8))
+CHAT_MAX_QUEUE = int(os.getenv("CHAT_MAX_QUEUE", 32))
+CHAT_QUEUE_TIMEOUT = float(os.getenv("CHAT_QUEUE_TIMEOUT", 10))
+CHAT_TIMEOUT = float(os.getenv("CHAT_TIMEOUT", 60))
+
+
+class Overloaded(Exception):
+    """Raised when a chat can't be admitted: `status_code` is 429 (queue full) or 503 (waited too long)."""
+
+    def __init__(self, status_code, detail):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+
+
+class ChatLimiter:
+    """
+    Runs blocking chat calls on a fixed-size thread pool with a bounded wait queue.
+
+    A slot is held until the chat call actually returns, even if the caller already gave
+    up on it, so timed-out LLM calls still count against the concurrency limit. Async turns
+    (see `admit()`) take slots from the same pool.
+    """
+
+    def __init__(self, max_concurrency=CHAT_MAX_CONCURRENCY, max_queue=CHAT_MAX_QUEUE,
+                 queue_timeout=CHAT_QUEUE_TIMEOUT, timeout=CHAT_TIMEOUT):
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.timeout = timeout
+        self._slots = asyncio.Semaphore(max_concurrency)
+        self._executor = ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix="chat")
+        self.waiting = 0
+        self.running = 0
+
+    async def _acquire(self):
+        if not self._slots.locked():
+            await self._slots.acquire()
+        elif self.waiting >= self.max_queue:
+            raise Overloaded(429, "Too many chats in progress; retry shortly")
+        else:
+            self.waiting += 1
+            try:
+                await asyncio.wait_for(self._slots.acquire(), self.queue_timeout)
+            except asyncio.TimeoutError:
+                raise Overloaded(503, "Chat service is busy; retry shortly")
+            finally:
+                self.waiting -= 1
+        self.running += 1
+
+    async def run(self, func, *args):
+        await self._acquire()
+        # Carry the request id into the worker thread's log records
+        context = contextvars.copy_context()
+        future = asyncio.get_running_loop().run_in_executor(self._executor, context.run, func, *args)
+        future.add_done_callback(self._release)
+        return await asyncio.wait_for(asyncio.shield(future), self.timeout)
+
+    @asynccontextmanager
+    async def admit(self):
+        """Hold a slot for the duration of the block, for turns that run on the event loop."""
+        await self._acquire()
+        try:
+            yield
+        finally:
+            self._release(None)
+
+    def _release(self, _):
+        self.running -= 1
+        self._slots.release()
+
+    def stats(self):
+        return {"running": self.running, "waiting": self.waiting,
+                "max_concurrency": self.max_concurrency, "max_queue": self.max_queue}
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
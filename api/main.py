@@ -1,24 +1,293 @@
-from dotenv import load_dotenv
+"""
+Chat API for running the SDR bot behind a load balancer.
+
+    uvicorn api.main:app --host 0.0.0.0 --port 8000 --workers 4
+
+Each worker runs at most CHAT_MAX_CONCURRENCY chats at once, HTTP and WebSocket turns alike
+(see api.limiter), and queues up to CHAT_MAX_QUEUE more. Requests beyond that are rejected with 429; requests that wait in the queue longer than
+CHAT_QUEUE_TIMEOUT get 503, and chats running past CHAT_TIMEOUT get 504.
+
+Bulk opener runs (/outbound) keep their state in Mongo, so any worker can serve their progress,
+results and cancels.
+"""
 import os
-from fastapi import FastAPI
+import hmac
+import time
+import uuid
+import asyncio
+import logging
+import contextvars
+from contextlib import asynccontextmanager
+from datetime import datetime
+from typing import Literal, Optional
+from dotenv import load_dotenv
+from fastapi import FastAPI, Depends, Header, HTTPException, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import FileResponse, JSONResponse, StreamingResponse
+from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
+from pydantic import BaseModel
+from app.chatbot import chat_with_lead
+from app.db import validate_token
+from app.prompt_cache import prefix_cache
+from app.retrieval_client import RETRIEVAL_SERVICE_URL, get_retrieval_client
+from api.chat_ws import router as chat_ws_router, connection_stats
+from api.limiter import ChatLimiter, Overloaded
 
-app = FastAPI()
 load_dotenv()
-openai_api_key = os.getenv("OPENAI_API_KEY")
 
+# Where bulk opener runs write their results, one file per user and format; must be shared by
+# all workers (and hosts), since any of them may serve /outbound/results
+OUTBOUND_DIR = os.getenv("OUTBOUND_DIR", "data/outbound")
+# Shared secret for GET /export (all users' conversations); the endpoint is disabled when unset
+EXPORT_API_KEY = os.getenv("EXPORT_API_KEY")
 
+request_id_var = contextvars.ContextVar("request_id", default="-")
 
 
-from fastapi import FastAPI, Request
-from pydantic import BaseModel
-from app.chatbot import chat_with_lead
+class RequestIdFilter(logging.Filter):
+    """Stamps every log record with the id of the request being served."""
+
+    def filter(self, record):
+        record.request_id = request_id_var.get()
+        return True
+
+
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s - %(name)s - %(levelname)s - [%(request_id)s] %(message)s"
+)
+for handler in logging.getLogger().handlers:
+    handler.addFilter(RequestIdFilter())
+logger = logging.getLogger(__name__)
+
+
+limiter = None
+# Filled in by warm_up(); /ready reports 503 until models_warm is set
+readiness = {"models_warm": False, "faq_index": False, "warmup_seconds": None, "error": None}
+
+
+def warm_up():
+    """
+    Load the embedding model, FAQ index and LLM client, so the first chat doesn't pay for them.
+
+    With RETRIEVAL_SERVICE_URL set, retrieval runs in the sidecar, so only the LLM client is
+    loaded here and /ready probes the service instead.
+    """
+    start = time.perf_counter()
+    try:
+        from app.chatbot import get_llm
+        if not RETRIEVAL_SERVICE_URL:
+            from app.embeddings import get_embeddings
+            from app.retriever import get_faq_vectorstore
+            get_embeddings()
+            readiness["faq_index"] = get_faq_vectorstore() is not None
+        get_llm()
+        readiness["models_warm"] = True
+    except Exception as e:
+        logger.exception("Warm-up failed: %s", str(e))
+        readiness["error"] = str(e)
+    readiness["warmup_seconds"] = round(time.perf_counter() - start, 2)
+    logger.info("Warm-up finished in %.2fs: %s", readiness["warmup_seconds"], readiness)
+
+
+@asynccontextmanager
+async def lifespan(app):
+    global limiter
+    limiter = ChatLimiter()
+    # WebSocket turns are admitted through the same slots (api.chat_ws)
+    app.state.chat_limiter = limiter
+    # Serve /health (and logins elsewhere) right away; models load in the background and /ready tracks them
+    warmup_task = asyncio.create_task(run_in_threadpool(warm_up))
+    yield
+    warmup_task.cancel()
+    limiter.shutdown()
+
+
+app = FastAPI(title="AI SDR chat API", lifespan=lifespan)
+app.include_router(chat_ws_router)
+
+
+@app.middleware("http")
+async def request_id_middleware(request: Request, call_next):
+    request_id = request.headers.get("X-Request-ID") or uuid.uuid4().hex
+    token = request_id_var.set(request_id)
+    try:
+        response = await call_next(request)
+    finally:
+        request_id_var.reset(token)
+    response.headers["X-Request-ID"] = request_id
+    return response
+
+
+bearer = HTTPBearer()
+
+
+def current_user(credentials: HTTPAuthorizationCredentials = Depends(bearer)) -> str:
+    """The user id (email) from a valid access token issued by app.db.authenticate_user."""
+    success, result = validate_token(credentials.credentials)
+    if not success:
+        raise HTTPException(status_code=401, detail=result, headers={"WWW-Authenticate": "Bearer"})
+    return result
 
-app = FastAPI()
 
 class LeadMessage(BaseModel):
     message: str
 
+
 @app.post("/chat")
-def chat(message: LeadMessage):
-    reply = chat_with_lead(message.message)
-    return {"reply": reply}
\ No newline at end of file
+async def chat(message: LeadMessage, user_id: str = Depends(current_user)):
+    try:
+        reply = await limiter.run(chat_with_lead, user_id, message.message)
+    except Overloaded as e:
+        logger.warning("Rejected chat for %s: %s", user_id, e.detail)
+        raise HTTPException(status_code=e.status_code, detail=e.detail, headers={"Retry-After": "1"})
+    except asyncio.TimeoutError:
+        logger.error("Chat for %s timed out after %.0fs", user_id, limiter.timeout)
+        raise HTTPException(status_code=504, detail="Chat timed out")
+    return {"reply": reply, "request_id": request_id_var.get()}
+
+
+@app.get("/health")
+def health():
+    """Liveness: the process is up and serving, whether or not models are loaded yet."""
+    return {"status": "ok", **(limiter.stats() if limiter else {}), **connection_stats(), **prefix_cache.stats()}
+
+
+def _probe_retrieval_service():
+    """Whether the retrieval sidecar answers, and whether its FAQ index is loaded; errors are reported, not raised."""
+    try:
+        health = get_retrieval_client().health()
+    except Exception as e:
+        return {"retrieval_service": False, "faq_index": False, "error": f"Retrieval service unreachable: {e}"}
+    return {"retrieval_service": True, "faq_index": bool(health.get("faq_chunks"))}
+
+
+@app.get("/ready")
+def ready():
+    """
+    Readiness: 200 once the embedding model, FAQ index and LLM client are warm, 503 before.
+
+    With a retrieval service configured, it must also answer its health check.
+    """
+    status = dict(readiness)
+    if RETRIEVAL_SERVICE_URL:
+        status.update(_probe_retrieval_service())
+    if not status["models_warm"] or status.get("retrieval_service") is False:
+        return JSONResponse(status_code=503, content={"status": "warming", **status})
+    return {"status": "ready", **status}
+
+
+class OutboundRequest(BaseModel):
+    format: Literal["jsonl", "csv"] = "jsonl"
+    limit: Optional[int] = None
+
+
+# Run state and the one-run-per-user lock live in Mongo (app.db.claim_outbound_run), so any API
+# worker can report on or cancel a run started by another. Each worker keeps its own runs here:
+# user id -> (run id, OutboundRun, the task reporting its progress)
+outbound_runs = {}
+# How often a running bulk run reports progress to Mongo and checks for a cancel request
+OUTBOUND_HEARTBEAT = float(os.getenv("OUTBOUND_HEARTBEAT", 5))
+
+
+def _outbound_run(user_id):
+    from app.db import get_outbound_run
+    run = get_outbound_run(user_id)
+    if run is None:
+        raise HTTPException(status_code=404, detail="No outbound run for this user")
+    return run
+
+
+def _outbound_done(user_id, outbound, task):
+    """Log a run that raised; one that never got going (e.g. no LLM client) is marked failed too."""
+    if task.cancelled():
+        outbound.status = "cancelled"
+    elif task.exception() is not None:
+        logger.error("Outbound run for %s failed", user_id, exc_info=task.exception())
+        outbound.status = "failed"
+
+
+async def _track_outbound(user_id, run_id, outbound, task):
+    """Report the run's progress to Mongo until it ends, passing on cancels requested through any worker."""
+    from app.db import update_outbound_run
+    try:
+        while True:
+            done, _ = await asyncio.wait([task], timeout=OUTBOUND_HEARTBEAT)
+            try:
+                if await asyncio.to_thread(update_outbound_run, user_id, run_id, outbound.progress()):
+                    outbound.cancel()
+            except Exception as e:
+                logger.error("Could not record outbound progress for %s: %s", user_id, str(e))
+            if done:
+                return
+    finally:
+        if outbound_runs.get(user_id, (None,))[0] == run_id:
+            del outbound_runs[user_id]
+
+
+@app.post("/outbound")
+async def start_outbound(request: OutboundRequest, user_id: str = Depends(current_user)):
+    """Generate openers for all of the caller's leads; re-posting after a stop resumes into the same file."""
+    from app.db import claim_outbound_run
+    from app.namespaces import namespace_filename
+    from app.outbound import OutboundRun
+    os.makedirs(OUTBOUND_DIR, exist_ok=True)
+    output = os.path.join(OUTBOUND_DIR, namespace_filename(user_id).rsplit(".", 1)[0] + f".{request.format}")
+    outbound = OutboundRun(user_id, output, limit=request.limit)
+    outbound.status = "running"
+    run_id = uuid.uuid4().hex
+    if not await asyncio.to_thread(claim_outbound_run, user_id, run_id, outbound.progress()):
+        raise HTTPException(status_code=409, detail="An outbound run is already in progress")
+    task = asyncio.create_task(outbound.run())
+    # Registered before the tracker waits on the task, so the final status it records is settled
+    task.add_done_callback(lambda task: _outbound_done(user_id, outbound, task))
+    outbound_runs[user_id] = (run_id, outbound, asyncio.create_task(_track_outbound(user_id, run_id, outbound, task)))
+    return outbound.progress()
+
+
+@app.get("/outbound")
+def outbound_progress(user_id: str = Depends(current_user)):
+    return _outbound_run(user_id)["progress"]
+
+
+@app.post("/outbound/cancel")
+def cancel_outbound(user_id: str = Depends(current_user)):
+    """Stop the caller's run after the calls in flight; the worker running it applies this within OUTBOUND_HEARTBEAT."""
+    from app.db import request_outbound_cancel
+    run = _outbound_run(user_id)
+    if request_outbound_cancel(user_id) and user_id in outbound_runs:
+        outbound_runs[user_id][1].cancel()
+    return run["progress"]
+
+
+@app.get("/outbound/results")
+def outbound_results(user_id: str = Depends(current_user)):
+    """The openers generated so far (the file grows while the run is in progress)."""
+    output_path = _outbound_run(user_id)["progress"]["output"]
+    if not os.path.exists(output_path):
+        raise HTTPException(status_code=404, detail="No openers generated yet")
+    media_type = "text/csv" if output_path.endswith(".csv") else "application/x-ndjson"
+    return FileResponse(output_path, media_type=media_type, filename=os.path.basename(output_path))
+
+
+@app.get("/export")
+def export_conversations(since: Optional[datetime] = None, escalated: Optional[bool] = None,
+                         stage: Optional[int] = None, max_messages: Optional[int] = None,
+                         after: Optional[str] = None, x_export_key: Optional[str] = Header(None)):
+    """
+    Stream all conversations as NDJSON for CRM sync (see app.export for the filters).
+
+    Rows come in `_id` order; to resume an interrupted download, pass the last `_id` received as `after`.
+    """
+    if not EXPORT_API_KEY or not hmac.compare_digest(x_export_key or "", EXPORT_API_KEY):
+        raise HTTPException(status_code=403, detail="Export requires a valid X-Export-Key header")
+    from bson import ObjectId
+    from bson.errors import InvalidId
+    from app.export import iter_conversations, ndjson_line
+    try:
+        after_id = ObjectId(after) if after else None
+    except InvalidId:
+        raise HTTPException(status_code=400, detail="'after' must be an exported _id")
+    records = iter_conversations(since, escalated, stage, after_id, max_messages)
+    # A sync generator, so Starlette pulls from the Mongo cursor on a worker thread, one row at a time
+    return StreamingResponse((ndjson_line(record) for record in records), media_type="application/x-ndjson")
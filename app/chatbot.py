@@ -1,21 +1,18 @@
 import os
+from functools import lru_cache
 from dotenv import load_dotenv
-from langchain_openai.chat_models import ChatOpenAI
-from langchain.schema import HumanMessage, AIMessage
-from app.prompts import base_prompt
-from app.retriever import retrieve_relevant_chunks
+from langchain.schema import HumanMessage, AIMessage, SystemMessage
+from app.prompts import base_system_prompt, base_turn_prompt
+from app.prompt_cache import prefix_cache
 from app.db import save_message, get_last_messages, get_all_messages, set_escalation_status, get_escalation_status
-import streamlit as st
 import smtplib
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
-import tiktoken  # Added for token counting
-from app.prompts import stage_analyzer_prompt
+from app.tokens import count_tokens, count_template_tokens, history_tokens  # Added for token counting
+from app.prompts import stage_analyzer_prompt, intent_prompt
 
 load_dotenv()
 
-# Initialize tokenizer for gpt-3.5-turbo (uses cl100k_base encoding)
-tokenizer = tiktoken.get_encoding("cl100k_base")
 
 
 # llm = ChatOpenAI(
@@ -24,12 +21,16 @@ tokenizer = tiktoken.get_encoding("cl100k_base")
 #    model_name= "llama3-70b-8192",   #"mistral-saba-24b",
 #    base_url="https://api.groq.com/openai/v1"  # Groq uses OpenAI-compatible API
 # )
-llm = ChatOpenAI(
-    openai_api_key=os.getenv("OPENROUTER_API_KEY"),
-    temperature=0.0,
-    model_name="gpt-3.5-turbo",
-    base_url="https://openrouter.ai/api/v1"
-)
+@lru_cache(maxsize=None)
+def get_llm():
+    """The chat model client, created on first use so importing this module stays cheap."""
+    from langchain_openai.chat_models import ChatOpenAI
+    return ChatOpenAI(
+        openai_api_key=os.getenv("OPENROUTER_API_KEY"),
+        temperature=0.0,
+        model_name="gpt-3.5-turbo",
+        base_url="https://openrouter.ai/api/v1"
+    )
 
 # Email configuration
 EMAIL_SENDER = os.getenv("EMAIL_SENDER")
@@ -82,38 +83,73 @@ def send_escalation_email(user_id: str, intent: str, history: list, stage: int):
         print(f"Error sending escalation email to {user_id}: {e}")
         return False, str(e)
 
+def format_history(history: list) -> str:
+    return "\n".join(f"{'User' if isinstance(m, HumanMessage) else 'AI'}: {m.content}" for m in history)
+
+
+def chat_messages(stage: int, history: list, user_input: str, context: str) -> list:
+    """
+    The chat model's input for one turn: the static instructions as a system message, then the
+    turn's history, stage, retrieved context and user input (in that order) as one user message.
+    """
+    turn = base_turn_prompt.format(history=format_history(history), stage=stage, context=context, input=user_input)
+    messages = [SystemMessage(content=base_system_prompt), HumanMessage(content=turn)]
+    # Hash what is actually sent, so a per-turn value leaking into the system message shows up as misses
+    prefix_cache.record_prefix(messages[0].content)
+    return messages
+
+
+def chat_prompt_tokens(stage: int, history: list, user_input: str, context: str, user_tokens: int = None) -> int:
+    """
+    Input tokens of chat_messages(...) without tokenizing the whole prompt: static parts are
+    counted once per process and history from stored per-message counts, so only the
+    turn's new text (user input, retrieved context) is tokenized. Pass `user_tokens` if the
+    user input is already counted.
+    """
+    if user_tokens is None:
+        user_tokens = count_tokens(user_input)
+    scaffolding = base_turn_prompt.format(history="", stage=stage, context="", input="")
+    return (count_template_tokens(base_system_prompt) + count_template_tokens(scaffolding)
+            + history_tokens(history) + count_tokens(context) + user_tokens)
+
+
+def classify_stage(user_message: str, history_f: list) -> int:
+    """The conversation stage the LLM assigns; raises if the call fails or the reply isn't a stage number."""
+    # Format conversation history
+    formatted_history = format_history(history_f)
+    stage_input_prompt = stage_analyzer_prompt.format(
+        history=formatted_history, message=user_message
+    )
+    input_message = HumanMessage(content=stage_input_prompt)
+    response = get_llm().invoke([input_message])
+    stage_str = response.content.strip()
+
+    stage = int(stage_str)
+    print(f"Detected stage: {stage}")
+    return stage
+
+
 def analyze_stage(user_message: str, history_f: list) -> int:
     try:
-        # Format conversation history
-        formatted_history = "\n".join(
-            [f"{'User' if isinstance(m, HumanMessage) else 'AI'}: {m.content}" for m in history_f]
-        )
-        stage_input_prompt = stage_analyzer_prompt.format(
-            history=formatted_history, message=user_message
-        )
-        input_message = HumanMessage(content=stage_input_prompt)
-        response = llm.invoke([input_message])
-        stage_str = response.content.strip()
-
-        stage = int(stage_str)
-        print(f"Detected stage: {stage}")
-        return stage
+        return classify_stage(user_message, history_f)
     except Exception as e:
         print(f"Error analyzing stage: {e}")
         return 1  # Default to Introduction
 
 
+def _as_message(msg: dict):
+    """A stored message as a LangChain message, carrying its stored token count (if any) along."""
+    kwargs = {"tokens": msg["tokens"]} if msg.get("tokens") is not None else {}
+    if msg["sender"] == "user":
+        return HumanMessage(content=msg["message"], additional_kwargs=kwargs)
+    return AIMessage(content=msg["message"], additional_kwargs=kwargs)
+
+
 # Fetch session history from MongoDB
 def get_session_history(user_id: str):
     try:
         messages = get_last_messages(user_id=user_id, limit=4)
-        history = []
-        for msg in messages:
-            if msg["sender"] == "user":
-                history.append(HumanMessage(content=msg["message"]))
-            else:
-                history.append(AIMessage(content=msg["message"]))
-        return history
+        return [_as_message(msg) for msg in messages]
     except Exception as e:
         print(f"Error fetching session history: {e}")
         return []
@@ -121,43 +157,21 @@ def get_session_history(user_id: str):
 def get_full_session_history(user_id: str):
     try:
         messages_f = get_all_messages(user_id=user_id)
-        history_f = []
-        for msg in messages_f:
-            if msg["sender"] == "user":
-                history_f.append(HumanMessage(content=msg["message"]))
-            else:
-                history_f.append(AIMessage(content=msg["message"]))
-        return history_f
+        return [_as_message(msg) for msg in messages_f]
     except Exception as e:
         print(f"Error fetching session history: {e}")
         return []
 
 def detect_intent(user_message: str, history: list) -> str:
-    intent_prompt = f"""
-Based on the following user message and conversation history, classify the user's intent as one of:
-- 'interest' (e.g., asking about product details, features, demos, or showing enthusiasm with positive tone like 'excited,' 'great')
-- 'frustration' (e.g., complaints, repeated questions, negative tone like 'annoying,' 'not working,' or use of '?!')
-- 'neutral' (e.g., general inquiries with no strong sentiment, like factual questions about features or processes)
-
-User message: {user_message}
-Conversation history (chronological, user and bot messages): {history}
-
-Rules:
-- Analyze tone (e.g., positive/negative adjectives, punctuation like '!' or '?!') and keywords (e.g., 'help,' 'issue' for frustration; 'interested,' 'cool' for interest).
-- If mixed intents are detected, prioritize 'frustration' for escalation.
-- Use conversation history to detect context, prioritizing recent messages. Classify as 'frustration' if the user repeats a question or expresses dissatisfaction without resolution.
-- For escalation, treat multiple unresolved neutral inquiries as 'frustration.'
-
-Provide the intent as a single word: interest, frustration, or neutral
-"""
-    intent_input = [HumanMessage(content=intent_prompt)]
-    response = llm.invoke(intent_input)
+    prompt = intent_prompt.format(message=user_message, history=format_history(history))
+    response = get_llm().invoke([HumanMessage(content=prompt)])
     
-    # Count input and output tokens for intent detection
-    input_text = intent_prompt
+    # Count input and output tokens for intent detection: the template once per process, the
+    # history from its stored per-message counts, and only the new message here
     output_text = response.content.strip()
-    input_tokens = len(tokenizer.encode(input_text))
-    output_tokens = len(tokenizer.encode(output_text))
+    input_tokens = (count_template_tokens(intent_prompt.format(message="", history=""))
+                    + count_tokens(user_message) + history_tokens(history))
+    output_tokens = count_tokens(output_text)
     print(f"Intent Detection - Input Tokens: {input_tokens}, Output Tokens: {output_tokens}")
     
     return output_text.lower()
@@ -185,66 +199,82 @@ Conversation:
 
 Lead Summary:
 """
-        response = llm.invoke([HumanMessage(content=prompt)])
+        response = get_llm().invoke([HumanMessage(content=prompt)])
         return response.content.strip()
     except Exception as e:
         print(f"Error generating summary: {e}")
         return "Summary unavailable."
 
 
+def should_escalate(stage: int, intent: str, message_count: int) -> bool:
+    """Whether a conversation is far enough along to hand to a human; no I/O, so cheap to check every turn."""
+    # Check if conversation has at least 6 messages (3 user + 3 AI)
+    return message_count >= 6 and stage >= 6 and intent in ["interest", "frustration"]
+
+
+def escalation_notice(user_id: str, history: list, stage: int, intent: str, message_count: int) -> str:
+    """
+    Escalate a not-yet-escalated conversation to a human agent when it is far enough along.
+
+    Returns the note to append to the AI reply, or "" if the conversation was not escalated.
+    """
+    if not should_escalate(stage, intent, message_count):
+        return ""
+    success, message = set_escalation_status(user_id, True)
+    if not success:
+        print(f"Failed to set escalation status: {message}")
+        return ""
+    # Send email notification to user
+    email_success, email_message = send_escalation_email(user_id, intent, history, stage)
+    if not email_success:
+        print(f"Warning: {email_message}")
+    reason = (
+        "you seem really interested in our product" if intent == "interest"
+        else "it seems like you might need more personalized assistance"
+    )
+    return f" 🚀 I've flagged this for a human agent because {reason}. They'll reach out shortly."
+
+
 # Chat function with token counting
 def chat_with_lead(user_id: str, user_message: str) -> str:
+    # Imported here so the login page and API start without loading the retrieval stack
+    from app.retriever import retrieve_relevant_chunks
     try:
-        context = retrieve_relevant_chunks(user_message)
+        context = retrieve_relevant_chunks(user_message, namespace=user_id)
         history = get_full_session_history(user_id)
-        history_f = get_full_session_history(user_id)
+        history_f = history
         stage = analyze_stage(user_message, history_f)
-        formatted_prompt = base_prompt.format(stage = stage,history=history, input=user_message) + f"\n\nRelevant Company Info:\n{context}"
-        human_message = HumanMessage(content=formatted_prompt)
+        messages = chat_messages(stage, history, user_message, context)
 
         intent = detect_intent(user_message, history_f)
         
 
         #print("stage\n" ,stage)
-        # Count input tokens for chat response
-        input_text = formatted_prompt
-        input_tokens = len(tokenizer.encode(input_text))
+        # Count input tokens for chat response; the user message's count is stored with it below
+        user_tokens = count_tokens(user_message)
+        input_tokens = chat_prompt_tokens(stage, history, user_message, context, user_tokens=user_tokens)
         
-        response = llm.invoke([human_message])
+        response = get_llm().invoke(messages)
+        prefix_cache.record_response(response)
         ai_reply = response.content
         
         # Count output tokens for chat response
-        output_tokens = len(tokenizer.encode(ai_reply))
+        output_tokens = count_tokens(ai_reply)
         
         # Print token counts
         print(f"Chat Response - Input Tokens: {input_tokens}, Output Tokens: {output_tokens}")
-        print("Prompt:", formatted_prompt)
+        print("Prompt:", messages[-1].content)
         print("Intent:", intent)
 
-        # Save messages
-        save_message(user_id, "user", user_message)
-        save_message(user_id, "ai", ai_reply)
+        # Save messages; the turn's stage, intent and score go on the user message and into the rollups
+        save_message(user_id, "user", user_message, stage=stage, intent=intent,
+                     score=calculate_lead_score(stage, intent), tokens=user_tokens)
+        save_message(user_id, "ai", ai_reply, tokens=output_tokens)
 
         # Check escalation status and conversation length
         success, escalated = get_escalation_status(user_id)
         if success and not escalated:  # Only escalate if not already escalated
-            # Check if conversation has at least 6 messages (3 user + 3 AI)
-            all_messages = get_all_messages(user_id)
-            if len(all_messages) >= 6:  # Assuming alternating user/AI messages
-                  if stage >= 6 and intent in ["interest", "frustration"]:
-                    success, message = set_escalation_status(user_id, True)
-                    if success:
-                        # Send email notification to user
-                        email_success, email_message = send_escalation_email(user_id, intent, history, stage)
-                        if not email_success:
-                            print(f"Warning: {email_message}")
-                        reason = (
-                            "you seem really interested in our product" if intent == "interest"
-                            else "it seems like you might need more personalized assistance"
-                        )
-                        return ai_reply + f" 🚀 I've flagged this for a human agent because {reason}. They'll reach out shortly."
-                    else:
-                        print(f"Failed to set escalation status: {message}")
+            return ai_reply + escalation_notice(user_id, history, stage, intent, len(get_all_messages(user_id)))
 
         return ai_reply
     except Exception as e:
@@ -0,0 +1,107 @@
+# app/context.py
+import os
+import re
+import logging
+from dotenv import load_dotenv
+from app.tokens import count_tokens
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Total prompt tokens the retrieved context may use, across all sections
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", 600))
+# Cosine similarity below which a dense hit is considered noise (see VectorDB._similarities)
+CONTEXT_MIN_SIMILARITY = float(os.getenv("CONTEXT_MIN_SIMILARITY", 0.25))
+# BM25 score a lexical-only hit needs; common words score well below this, rare names well above
+CONTEXT_MIN_LEXICAL_SCORE = float(os.getenv("CONTEXT_MIN_LEXICAL_SCORE", 2.0))
+# Share of a chunk's words that must appear in an already-kept chunk for it to count as a duplicate
+CONTEXT_DUPLICATE_OVERLAP = float(os.getenv("CONTEXT_DUPLICATE_OVERLAP", 0.8))
+
+_WORD_PATTERN = re.compile(r"\w+")
+
+
+def is_relevant(chunk, min_similarity=CONTEXT_MIN_SIMILARITY, min_lexical_score=CONTEXT_MIN_LEXICAL_SCORE):
+    """A chunk is kept if either its dense similarity or its BM25 score clears the threshold."""
+    similarity = chunk.get("similarity")
+    lexical_score = chunk.get("lexical_score")
+    return (similarity is not None and similarity >= min_similarity) or \
+        (lexical_score is not None and lexical_score >= min_lexical_score)
+
+
+def _is_duplicate(words, kept_word_sets, overlap):
+    if not words:
+        return True
+    for kept in kept_word_sets:
+        if len(words & kept) / len(words) >= overlap:
+            return True
+    return False
+
+
+def assemble_context(sections, token_budget=CONTEXT_TOKEN_BUDGET, duplicate_overlap=CONTEXT_DUPLICATE_OVERLAP):
+    """
+    Pack the best retrieved chunks from several sections into a token budget.
+
+    Args:
+        sections: Ordered list of dicts with "name", "header", "empty" (text used when nothing
+            is kept) and "chunks". Each chunk is a dict with "text" (already formatted for the
+            prompt), "score" (rank score comparable across sections), and optional
+            "similarity" / "lexical_score" used for thresholding. An optional "prefix" format
+            string is put before each kept chunk, with {n} its number within the section.
+        token_budget: Maximum tokens for all chunk texts and headers combined
+        duplicate_overlap: Word-overlap ratio above which a chunk is dropped as a duplicate
+
+    Returns:
+        A (context, stats) tuple; stats maps each section name to its kept chunk count and
+        tokens, plus totals for dropped chunks.
+    """
+    candidates = []
+    dropped_irrelevant = 0
+    for position, section in enumerate(sections):
+        for chunk in section["chunks"]:
+            if is_relevant(chunk):
+                candidates.append((chunk["score"], position, chunk))
+            else:
+                dropped_irrelevant += 1
+    # Highest score first; ties keep section order
+    candidates.sort(key=lambda item: (-item[0], item[1]))
+
+    kept = {position: [] for position in range(len(sections))}
+    kept_word_sets = []
+    used_tokens = 0
+    dropped_duplicates = dropped_budget = 0
+    header_tokens = [count_tokens(section["header"]) for section in sections]
+
+    for _, position, chunk in candidates:
+        words = set(_WORD_PATTERN.findall(chunk["text"].lower()))
+        if _is_duplicate(words, kept_word_sets, duplicate_overlap):
+            dropped_duplicates += 1
+            continue
+        # Kept chunks are numbered in the order they're accepted, so the numbers have no gaps
+        text = sections[position].get("prefix", "").format(n=len(kept[position]) + 1) + chunk["text"]
+        cost = count_tokens(text) + (header_tokens[position] if not kept[position] else 0)
+        if used_tokens + cost > token_budget:
+            dropped_budget += 1
+            continue
+        used_tokens += cost
+        kept[position].append((text, cost))
+        kept_word_sets.append(words)
+
+    parts = []
+    stats = {"budget": token_budget, "dropped_irrelevant": dropped_irrelevant,
+             "dropped_duplicates": dropped_duplicates, "dropped_over_budget": dropped_budget}
+    for position, section in enumerate(sections):
+        chunks = kept[position]
+        if chunks:
+            parts.append(section["header"] + "\n" + "\n".join(text for text, _ in chunks))
+        else:
+            parts.append(section["empty"])
+        stats[section["name"]] = {"chunks": len(chunks), "tokens": sum(cost for _, cost in chunks)}
+
+    stats["total_tokens"] = used_tokens
+    logger.info(
+        "Context tokens: %s; total %d/%d (dropped %d irrelevant, %d duplicate, %d over budget)",
+        ", ".join(f"{section['name']}={stats[section['name']]['tokens']}" for section in sections),
+        used_tokens, token_budget, dropped_irrelevant, dropped_duplicates, dropped_budget
+    )
+    return "\n\n".join(parts), stats
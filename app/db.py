@@ -1,9 +1,10 @@
-from pymongo import MongoClient
 import os
+from functools import lru_cache
 from dotenv import load_dotenv
 import bcrypt
 from datetime import datetime, timedelta
 import jwt
+from app.tokens import count_tokens
 
 
 
@@ -13,39 +14,183 @@ MONGO_URI = os.getenv("MONGODB_URI")
 JWT_SECRET = os.getenv("JWT_SECRET", "your-secret-key")  # Set in .env
 JWT_ALGORITHM = "HS256"
 
-try:
-    client = MongoClient(MONGO_URI)
-    db = client["ai_sdr_db"]
-    conversations_collection = db["conversations"]
-    users_collection = db["users"]
-    tokens_collection = db["tokens"]
-except Exception as e:
-    print(f"Error connecting to MongoDB: {e}")
-    raise
+
+@lru_cache(maxsize=None)
+def get_database():
+    """The Mongo database, with the client created on first use rather than at import."""
+    from pymongo import MongoClient
+    try:
+        client = MongoClient(MONGO_URI)
+        return client["ai_sdr_db"]
+    except Exception as e:
+        print(f"Error connecting to MongoDB: {e}")
+        raise
+
+
+class _LazyCollection:
+    """Stands in for a pymongo collection and resolves it on first attribute access."""
+
+    def __init__(self, name):
+        self._name = name
+
+    def __getattr__(self, attr):
+        return getattr(get_database()[self._name], attr)
+
+
+conversations_collection = _LazyCollection("conversations")
+users_collection = _LazyCollection("users")
+tokens_collection = _LazyCollection("tokens")
+# One document per UTC day ("YYYY-MM-DD") plus a "current" snapshot, updated with $inc on every analyzed turn
+pipeline_rollups_collection = _LazyCollection("pipeline_rollups")
+# One document per user (`_id` is the user id) for bulk opener runs; shared by all API workers
+outbound_runs_collection = _LazyCollection("outbound_runs")
+
+# A running outbound run whose worker hasn't reported for this long is treated as dead
+OUTBOUND_RUN_STALE_AFTER = float(os.getenv("OUTBOUND_RUN_STALE_AFTER", 120))
+
+INTENTS = ("interest", "frustration", "neutral")
+SCORE_BUCKETS = ("0-19", "20-39", "40-59", "60-79", "80-100")
+
+
+def score_bucket(score: int) -> str:
+    return SCORE_BUCKETS[min(max(int(score), 0) // 20, len(SCORE_BUCKETS) - 1)]
+
+
+def _pipeline_keys(stage, intent, score):
+    """Rollup field paths for one analyzed turn; unexpected LLM output is folded into "other"."""
+    intent = (intent or "").strip(" .'\"").lower()
+    intent = intent if intent in INTENTS else "other"
+    return [f"stages.{int(stage)}", f"intents.{intent}", f"scores.{score_bucket(score)}"]
+
+
+def _update_pipeline_rollups(previous, analysis, timestamp):
+    """
+    Count one analyzed turn into its day's rollup, and move the conversation between
+    buckets of the "current" snapshot (where every conversation stands right now).
+
+    `previous` is the conversation's last analysis ({stage, intent, score}) or None.
+    """
+    day = timestamp.strftime("%Y-%m-%d")
+    daily = dict.fromkeys(_pipeline_keys(**analysis), 1)
+    daily["turns"] = 1
+    current = dict.fromkeys(_pipeline_keys(**analysis), 1)
+    if previous and previous.get("stage") is not None:
+        for key in _pipeline_keys(previous["stage"], previous.get("intent"), previous.get("score", 0)):
+            current[key] = current.get(key, 0) - 1
+    else:
+        daily["new_conversations"] = 1
+        current["conversations"] = 1
+    pipeline_rollups_collection.update_one(
+        {"_id": day}, {"$inc": daily, "$setOnInsert": {"day": day}}, upsert=True
+    )
+    current = {key: n for key, n in current.items() if n}
+    if current:
+        pipeline_rollups_collection.update_one({"_id": "current"}, {"$inc": current}, upsert=True)
 
 # Save a message to the database
-def save_message(user_id: str, sender: str, message: str):
+def save_message(user_id: str, sender: str, message: str, stage: int = None, intent: str = None, score: int = None,
+                 tokens: int = None):
+    """
+    Append a message to the user's conversation.
+
+    The message's token count is stored with it (pass `tokens` if already counted), so prompt
+    token totals can be summed instead of re-tokenizing the history every turn.
+
+    For user messages, pass the turn's `stage`, `intent` and lead `score`: they are stored on
+    the message and the conversation, and counted into the pipeline rollups.
+    """
     try:
-        conversations_collection.update_one(
+        timestamp = datetime.utcnow()
+        entry = {
+            "sender": sender,
+            "message": message,
+            "timestamp": timestamp,
+            "tokens": tokens if tokens is not None else count_tokens(message)
+        }
+        if stage is None:
+            conversations_collection.update_one(
+                {"user_id": user_id},
+                {
+                    "$push": {"messages": entry},
+                    "$set": {"updated_at": timestamp},
+                    "$setOnInsert": {"user_id": user_id, "escalated": False}
+                },
+                upsert=True
+            )
+            return
+        from pymongo import ReturnDocument
+        analysis = {"stage": stage, "intent": intent, "score": score}
+        entry.update(analysis)
+        previous = conversations_collection.find_one_and_update(
             {"user_id": user_id},
             {
-                "$push": {
-                    "messages": {
-                        "sender": sender,
-                        "message": message,
-                        "timestamp": datetime.utcnow()
-                    }
-                },
-                "$setOnInsert": {
-                    "user_id": user_id,
-                    "escalated": False
-                }
+                "$push": {"messages": entry},
+                "$set": {**analysis, "updated_at": timestamp},
+                "$setOnInsert": {"user_id": user_id, "escalated": False}
             },
+            projection={"_id": False, "stage": True, "intent": True, "score": True},
+            return_document=ReturnDocument.BEFORE,
             upsert=True
         )
     except Exception as e:
         print(f"Error saving message: {e}")
         raise
+    try:
+        _update_pipeline_rollups(previous, analysis, timestamp)
+    except Exception as e:
+        # The message is saved; a missed rollup increment shouldn't fail the chat
+        print(f"Error updating pipeline rollups: {e}")
+
+# Delete a user's conversation and take it out of the current pipeline snapshot
+def delete_conversation(user_id: str):
+    try:
+        conversation = conversations_collection.find_one_and_delete(
+            {"user_id": user_id}, projection={"_id": False, "stage": True, "intent": True, "score": True}
+        )
+        if conversation and conversation.get("stage") is not None:
+            decrement = dict.fromkeys(
+                _pipeline_keys(conversation["stage"], conversation.get("intent"), conversation.get("score", 0)), -1
+            )
+            decrement["conversations"] = -1
+            pipeline_rollups_collection.update_one({"_id": "current"}, {"$inc": decrement})
+        return True, "Conversation deleted"
+    except Exception as e:
+        print(f"Error deleting conversation: {e}")
+        return False, str(e)
+
+# Recount the "current" pipeline snapshot from the conversations' latest analysis (after a bulk re-score)
+def rebuild_pipeline_snapshot():
+    try:
+        counts = {"conversations": 0}
+        for conversation in conversations_collection.find(
+            {"stage": {"$ne": None}}, projection={"_id": False, "stage": True, "intent": True, "score": True}
+        ):
+            counts["conversations"] += 1
+            for key in _pipeline_keys(conversation["stage"], conversation.get("intent"), conversation.get("score", 0)):
+                counts[key] = counts.get(key, 0) + 1
+        snapshot = {"_id": "current"}
+        for key, n in counts.items():
+            group, _, name = key.partition(".")
+            if name:
+                snapshot.setdefault(group, {})[name] = n
+            else:
+                snapshot[key] = n
+        pipeline_rollups_collection.replace_one({"_id": "current"}, snapshot, upsert=True)
+        return True, counts["conversations"]
+    except Exception as e:
+        print(f"Error rebuilding pipeline snapshot: {e}")
+        return False, str(e)
+
+# Read the pipeline rollups: the current snapshot and the last `days` daily documents
+def get_pipeline_rollups(days: int = 30):
+    try:
+        since = (datetime.utcnow() - timedelta(days=days - 1)).strftime("%Y-%m-%d")
+        current = pipeline_rollups_collection.find_one({"_id": "current"}) or {}
+        daily = list(pipeline_rollups_collection.find({"day": {"$gte": since}}).sort("day", 1))
+        return current, daily
+    except Exception as e:
+        print(f"Error retrieving pipeline rollups: {e}")
+        return {}, []
 
 # Get the latest N messages for a user
 def get_last_messages(user_id: str, limit: int = 4):
@@ -60,7 +205,8 @@ def get_last_messages(user_id: str, limit: int = 4):
                     "_id": str(i),  # Generate a fake _id for compatibility
                     "user_id": user_id,
                     "sender": msg["sender"],
-                    "message": msg["message"]
+                    "message": msg["message"],
+                    "tokens": msg.get("tokens")
                 }
                 for i, msg in enumerate(messages)
             ]
@@ -83,7 +229,8 @@ def get_all_messages(user_id: str):
                     "_id": str(i),  # Generate a fake _id for compatibility
                     "user_id": user_id,
                     "sender": msg["sender"],
-                    "message": msg["message"]
+                    "message": msg["message"],
+                    "tokens": msg.get("tokens")
                 }
                 for i, msg in enumerate(messages)
             ]
@@ -93,12 +240,52 @@ def get_all_messages(user_id: str):
         print(f"Error retrieving messages: {e}")
         return []
 
+# Get one page of messages for a user, newest page first
+def get_messages_page(user_id: str, before: int = None, limit: int = 20):
+    """
+    Return up to `limit` messages older than position `before` (the latest messages if None).
+
+    Only the requested slice of the messages array leaves the server. Returns a
+    (messages, cursor) tuple with messages in chronological order; pass `cursor` as `before`
+    to fetch the previous page. `cursor` is None when there are no older messages.
+    """
+    try:
+        if before is None:
+            messages_slice = {"$slice": ["$messages", -limit]}
+        else:
+            start = max(before - limit, 0)
+            if before <= start:
+                return [], None
+            messages_slice = {"$slice": ["$messages", start, before - start]}
+        result = list(conversations_collection.aggregate([
+            {"$match": {"user_id": user_id}},
+            {"$project": {"total": {"$size": {"$ifNull": ["$messages", []]}}, "messages": messages_slice}},
+        ]))
+        if not result or not result[0].get("messages"):
+            return [], None
+        messages = result[0]["messages"]
+        first = (result[0]["total"] if before is None else before) - len(messages)
+        formatted_messages = [
+            {
+                "_id": str(first + i),  # Position in the conversation, stable while messages are only appended
+                "user_id": user_id,
+                "sender": msg["sender"],
+                "message": msg["message"],
+                "tokens": msg.get("tokens")
+            }
+            for i, msg in enumerate(messages)
+        ]
+        return formatted_messages, first if first > 0 else None
+    except Exception as e:
+        print(f"Error retrieving messages: {e}")
+        return [], None
+
 # Set escalation status for a user's conversation
 def set_escalation_status(user_id: str, escalated: bool):
     try:
         result = conversations_collection.update_one(
             {"user_id": user_id},
-            {"$set": {"escalated": escalated}}
+            {"$set": {"escalated": escalated, "updated_at": datetime.utcnow()}}
         )
         if result.matched_count > 0:
             return True, "Escalation status updated successfully"
@@ -199,4 +386,54 @@ def revoke_refresh_token(email: str):
         return True, "Logged out successfully"
     except Exception as e:
         print(f"Error revoking token: {e}")
-        return False, str(e)
\ No newline at end of file
+        return False, str(e)
+
+
+def claim_outbound_run(user_id: str, run_id: str, progress: dict):
+    """
+    Atomically mark a new run as the user's running outbound run; False if another worker holds a live one.
+
+    The claim succeeds when the user has no run, the last one finished, or the running one
+    stopped reporting for OUTBOUND_RUN_STALE_AFTER seconds (its worker died).
+    """
+    from pymongo.errors import DuplicateKeyError
+    now = datetime.utcnow()
+    try:
+        outbound_runs_collection.find_one_and_update(
+            {
+                "_id": user_id,
+                "$or": [
+                    {"progress.status": {"$ne": "running"}},
+                    {"heartbeat_at": {"$lt": now - timedelta(seconds=OUTBOUND_RUN_STALE_AFTER)}},
+                ],
+            },
+            {"$set": {"run_id": run_id, "progress": progress, "cancel_requested": False, "heartbeat_at": now}},
+            upsert=True
+        )
+    except DuplicateKeyError:
+        # The filter didn't match an existing document, so the upsert collided with it
+        return False
+    return True
+
+
+# Record a run's progress; returns whether a cancel was requested for it
+def update_outbound_run(user_id: str, run_id: str, progress: dict):
+    run = outbound_runs_collection.find_one_and_update(
+        {"_id": user_id, "run_id": run_id},
+        {"$set": {"progress": progress, "heartbeat_at": datetime.utcnow()}},
+        projection={"_id": False, "cancel_requested": True}
+    )
+    return bool(run and run.get("cancel_requested"))
+
+
+def request_outbound_cancel(user_id: str):
+    """Flag the user's running outbound run to stop; whichever worker runs it picks this up."""
+    result = outbound_runs_collection.update_one(
+        {"_id": user_id, "progress.status": "running"}, {"$set": {"cancel_requested": True}}
+    )
+    return result.matched_count > 0
+
+
+def get_outbound_run(user_id: str):
+    """The user's latest outbound run document ({run_id, progress, cancel_requested, heartbeat_at}), or None."""
+    return outbound_runs_collection.find_one({"_id": user_id})
@@ -0,0 +1,160 @@
+# app/dedup.py
+import os
+import re
+import zlib
+import hashlib
+import numpy as np
+import pandas as pd
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Estimated Jaccard similarity above which two lead rows are treated as the same lead
+DEDUP_THRESHOLD = float(os.getenv("DEDUP_THRESHOLD", 0.8))
+# 8 bands x 8 rows puts the LSH candidate threshold around 0.77, just under DEDUP_THRESHOLD
+DEDUP_NUM_PERM = 64
+DEDUP_BANDS = 8
+
+_MERSENNE_PRIME = (1 << 61) - 1
+_TOKEN_PATTERN = re.compile(r"\w+")
+_EMAIL_PATTERN = re.compile(r"[\w.+-]+@[\w-]+(?:\.[\w-]+)+")
+
+
+def _normalize(value):
+    if value is None or (isinstance(value, float) and np.isnan(value)):
+        return ""
+    return " ".join(str(value).lower().split())
+
+
+class LeadDeduplicator:
+    """
+    Detects exact duplicates (by normalized row hash) and near-duplicates (by MinHash/LSH)
+    among lead rows, remembering canonical leads across successive imports.
+
+    Matching against earlier imports only works if the owner keeps one deduplicator for the
+    life of its store and clears it only together with the store.
+    """
+
+    def __init__(self, threshold=DEDUP_THRESHOLD, num_perm=DEDUP_NUM_PERM, bands=DEDUP_BANDS):
+        self.threshold = threshold
+        self.num_perm = num_perm
+        self.bands = bands
+        self.rows_per_band = num_perm // bands
+        rng = np.random.default_rng(1)
+        self._a = rng.integers(1, 1 << 31, num_perm, dtype=np.uint64)
+        self._b = rng.integers(0, 1 << 31, num_perm, dtype=np.uint64)
+        self.clear()
+
+    def clear(self):
+        self._exact = {}  # normalized row hash -> canonical key
+        self._buckets = [{} for _ in range(self.bands)]  # band signature -> [canonical keys]
+        self._signatures = []  # canonical key -> MinHash signature
+        self._emails = []  # canonical key -> set of emails in the row
+
+    def forget(self, keys):
+        """Unregister canonical leads (e.g. ones whose import was cancelled before they were indexed)."""
+        keys = set(keys)
+        if not keys:
+            return
+        self._exact = {h: key for h, key in self._exact.items() if key not in keys}
+        for buckets in self._buckets:
+            for band_key in list(buckets):
+                buckets[band_key] = [key for key in buckets[band_key] if key not in keys]
+                if not buckets[band_key]:
+                    del buckets[band_key]
+        # Keys are list positions, so forgotten slots stay behind as unmatchable placeholders
+        for key in keys:
+            self._emails[key] = set()
+
+    def _signature(self, text):
+        tokens = _TOKEN_PATTERN.findall(text)
+        # Unigrams plus bigrams so reordered-but-equal rows still differ from genuinely different ones
+        shingles = set(tokens) | {f"{a} {b}" for a, b in zip(tokens, tokens[1:])}
+        if not shingles:
+            shingles = {text}
+        hashes = np.fromiter((zlib.crc32(s.encode("utf-8")) for s in shingles), dtype=np.uint64)
+        return (((hashes[:, None] * self._a) + self._b) % _MERSENNE_PRIME).min(axis=0)
+
+    def _band_keys(self, signature):
+        r = self.rows_per_band
+        return [signature[i * r:(i + 1) * r].tobytes() for i in range(self.bands)]
+
+    def _find_near_duplicate(self, signature, band_keys, emails):
+        seen = set()
+        for band, key in enumerate(band_keys):
+            for candidate in self._buckets[band].get(key, ()):
+                if candidate in seen:
+                    continue
+                seen.add(candidate)
+                # Two rows with different email addresses are different people, however similar
+                if emails and self._emails[candidate] and not (emails & self._emails[candidate]):
+                    continue
+                if np.mean(signature == self._signatures[candidate]) >= self.threshold:
+                    return candidate
+        return None
+
+    def deduplicate(self, df):
+        """
+        Collapse duplicate rows of `df`, also matching against leads seen in earlier calls.
+
+        Duplicate rows are merged into their canonical row: empty fields of the canonical
+        row are filled from the duplicate.
+
+        Returns:
+            A (new_rows, keys, merges, report) tuple. `new_rows` is a dataframe with one row
+            per lead not seen before, and `keys` holds their canonical keys. `merges` maps
+            the canonical keys of previously imported leads to the fields their duplicates carry.
+            `report` counts exact and near duplicates and the dedup ratio.
+        """
+        columns = list(df.columns)
+        new_rows = {}  # canonical key -> merged row dict, in first-seen order
+        merges = {}
+        exact_duplicates = near_duplicates = 0
+
+        for row in df.to_dict("records"):
+            normalized = {col: _normalize(row[col]) for col in columns}
+            text = " | ".join(value for value in normalized.values() if value)
+            exact_hash = hashlib.blake2b(
+                "\x1f".join(f"{col}={value}" for col, value in sorted(normalized.items()) if value).encode("utf-8"),
+                digest_size=16
+            ).digest()
+
+            canonical = self._exact.get(exact_hash)
+            if canonical is not None:
+                exact_duplicates += 1
+            else:
+                signature = self._signature(text)
+                band_keys = self._band_keys(signature)
+                emails = set(_EMAIL_PATTERN.findall(text))
+                canonical = self._find_near_duplicate(signature, band_keys, emails)
+                if canonical is not None:
+                    near_duplicates += 1
+                    self._exact[exact_hash] = canonical
+                    self._emails[canonical] |= emails
+                else:
+                    canonical = len(self._signatures)
+                    self._signatures.append(signature)
+                    self._emails.append(emails)
+                    self._exact[exact_hash] = canonical
+                    for band, key in enumerate(band_keys):
+                        self._buckets[band].setdefault(key, []).append(canonical)
+                    new_rows[canonical] = dict(row)
+                    continue
+
+            target = new_rows.get(canonical)
+            if target is None:
+                target = merges.setdefault(canonical, {})
+            for col in columns:
+                if normalized[col] and not _normalize(target.get(col)):
+                    target[col] = row[col]
+
+        rows_in = len(df)
+        duplicates = exact_duplicates + near_duplicates
+        report = {
+            "rows_in": rows_in,
+            "exact_duplicates": exact_duplicates,
+            "near_duplicates": near_duplicates,
+            "rows_indexed": len(new_rows),
+            "dedup_ratio": round(duplicates / rows_in, 4) if rows_in else 0.0,
+        }
+        return pd.DataFrame(list(new_rows.values()), columns=columns), list(new_rows), merges, report
@@ -0,0 +1,105 @@
+# app/embeddings.py
+import os
+import logging
+from functools import lru_cache
+from dotenv import load_dotenv
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+EMBEDDING_MODEL_NAME = "all-MiniLM-L6-v2"
+# torch (sentence-transformers) | onnx | onnx-int8
+EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "torch").lower()
+EMBED_BATCH_SIZE = int(os.getenv("EMBED_BATCH_SIZE", 64))
+EMBED_WORKERS = int(os.getenv("EMBED_WORKERS", 1))
+# Below this many texts the pool start-up and IPC cost more than they save
+EMBED_MIN_PARALLEL_TEXTS = int(os.getenv("EMBED_MIN_PARALLEL_TEXTS", 2048))
+
+
+class BulkEmbedder:
+    """Embed large lists of texts in batches, optionally across a pool of CPU worker processes."""
+
+    def __init__(self, model=None, model_name=EMBEDDING_MODEL_NAME, batch_size=EMBED_BATCH_SIZE,
+                 num_workers=EMBED_WORKERS, min_parallel_texts=EMBED_MIN_PARALLEL_TEXTS):
+        if model is None:
+            from sentence_transformers import SentenceTransformer
+            model = SentenceTransformer(model_name, device="cpu")
+        self.model = model
+        self.batch_size = max(1, batch_size)
+        self.num_workers = max(1, num_workers)
+        self.min_parallel_texts = min_parallel_texts
+        self._pool = None
+
+    @property
+    def supports_pool(self):
+        # ONNX Runtime already spreads one batch across all cores; only torch models get a process pool
+        return self.num_workers > 1 and hasattr(self.model, "start_multi_process_pool")
+
+    def start_pool(self):
+        """Start the worker pool (no-op for a single worker, non-torch backends, or if already running)."""
+        if self.supports_pool and self._pool is None:
+            logger.info("Starting embedding pool with %d CPU workers", self.num_workers)
+            self._pool = self.model.start_multi_process_pool(target_devices=["cpu"] * self.num_workers)
+
+    def stop_pool(self):
+        """Terminate the worker pool if one is running."""
+        if self._pool is not None:
+            self.model.stop_multi_process_pool(self._pool)
+            self._pool = None
+
+    def embed_documents(self, texts):
+        """Embed texts and return one vector per text, in input order."""
+        texts = list(texts)
+        if not texts:
+            return []
+
+        if self.supports_pool and len(texts) >= self.min_parallel_texts:
+            self.start_pool()
+            # Each worker gets contiguous chunks; results are re-assembled in input order
+            chunk_size = max(self.batch_size, len(texts) // (self.num_workers * 4))
+            vectors = self.model.encode_multi_process(
+                texts, self._pool, batch_size=self.batch_size, chunk_size=chunk_size
+            )
+        else:
+            vectors = self.model.encode(
+                texts, batch_size=self.batch_size, show_progress_bar=False, convert_to_numpy=True
+            )
+        return vectors.tolist()
+
+    def iter_embedded_batches(self, texts, rows_per_batch=None):
+        """Yield (texts, vectors) pairs in input order, one slice of `rows_per_batch` texts at a time."""
+        texts = list(texts)
+        if rows_per_batch is None:
+            rows_per_batch = max(self.min_parallel_texts, self.batch_size * self.num_workers * 8)
+        for start in range(0, len(texts), rows_per_batch):
+            batch = texts[start:start + rows_per_batch]
+            yield batch, self.embed_documents(batch)
+
+    def __enter__(self):
+        self.start_pool()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.stop_pool()
+
+
+@lru_cache(maxsize=None)
+def get_embeddings(model_name=EMBEDDING_MODEL_NAME, backend=EMBEDDING_BACKEND):
+    """Process-wide query embedding model for the configured backend, loaded once and shared by every index."""
+    logger.info("Loading embedding model %s (%s backend)", model_name, backend)
+    if backend in ("onnx", "onnx-int8"):
+        from app.onnx_embeddings import OnnxEmbeddings
+        return OnnxEmbeddings(model_name, quantized=backend == "onnx-int8", batch_size=EMBED_BATCH_SIZE)
+    if backend != "torch":
+        raise ValueError(f"Unknown embedding backend '{backend}', expected torch, onnx or onnx-int8")
+    from langchain_community.embeddings import HuggingFaceEmbeddings
+    return HuggingFaceEmbeddings(model_name=model_name, model_kwargs={"device": "cpu"})
+
+
+@lru_cache(maxsize=None)
+def get_bulk_embedder(model_name=EMBEDDING_MODEL_NAME, backend=EMBEDDING_BACKEND):
+    """Process-wide bulk embedder sharing the query model's weights (and one worker pool)."""
+    embeddings = get_embeddings(model_name, backend)
+    # HuggingFaceEmbeddings wraps a SentenceTransformer; OnnxEmbeddings encodes directly
+    return BulkEmbedder(model=getattr(embeddings, "client", embeddings))
@@ -0,0 +1,327 @@
+# app/export.py
+"""
+Streaming bulk export of conversations and their lead signals, for CRM sync.
+
+    python -m app.export --output exports/conversations.ndjson --since 2026-10-01
+    python -m app.export --output exports/escalated --format parquet --escalated --max-messages 0
+
+Conversations are read in `_id` order through one server-side cursor, EXPORT_BATCH_SIZE
+conversations per round trip and preferably from a secondary. Each batch is written and then forgotten,
+so memory stays flat however large the collection is. Filters are updated-since (the
+conversation's last write), the escalated flag and the current stage.
+
+Output is NDJSON, one conversation per line, or a Parquet dataset directory. The Parquet
+dataset is written as part files, one row group per batch, and a part is closed every
+EXPORT_PART_ROWS rows. A checkpoint next to the output records the last exported `_id` and
+how much output is complete: the NDJSON byte length, or the number of closed Parquet parts.
+Re-running with the same output resumes there and first drops anything written after the
+checkpoint, so an interrupted export never duplicates or loses rows.
+"""
+import os
+import json
+import time
+import logging
+import argparse
+from datetime import datetime
+from dotenv import load_dotenv
+from app.db import conversations_collection
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+EXPORT_BATCH_SIZE = int(os.getenv("EXPORT_BATCH_SIZE", 1000))
+# Parquet rows per part file; each part is complete (footer written) before it is checkpointed
+EXPORT_PART_ROWS = int(os.getenv("EXPORT_PART_ROWS", 100000))
+
+FORMATS = ("ndjson", "parquet")
+
+
+def export_filter(since=None, escalated=None, stage=None, after=None):
+    """The Mongo query for an export; `after` is the last `_id` already exported."""
+    query = {}
+    if after is not None:
+        query["_id"] = {"$gt": after}
+    if escalated is not None:
+        query["escalated"] = escalated
+    if stage is not None:
+        query["stage"] = stage
+    if since is not None:
+        # Conversations written before updated_at existed fall back to their message timestamps
+        query["$or"] = [
+            {"updated_at": {"$gte": since}},
+            {"updated_at": {"$exists": False}, "messages.timestamp": {"$gte": since}},
+        ]
+    return query
+
+
+def iter_conversations(since=None, escalated=None, stage=None, after=None, max_messages=None,
+                       batch_size=EXPORT_BATCH_SIZE):
+    """
+    Yield export records in `_id` order from one server-side cursor.
+
+    `max_messages` keeps only each conversation's last N messages (0 for lead signals only,
+    None for the whole transcript); the slicing happens in Mongo, not here.
+    """
+    from pymongo import ReadPreference
+
+    if max_messages is None:
+        messages = {"$ifNull": ["$messages", []]}
+    else:
+        messages = {"$slice": [{"$ifNull": ["$messages", []]}, -max_messages]} if max_messages else {"$literal": []}
+    pipeline = [
+        {"$match": export_filter(since, escalated, stage, after)},
+        {"$sort": {"_id": 1}},
+        {"$project": {
+            "user_id": True, "escalated": True, "stage": True, "intent": True, "score": True, "updated_at": True,
+            "message_count": {"$size": {"$ifNull": ["$messages", []]}},
+            "first_message_at": {"$min": "$messages.timestamp"},
+            "last_message_at": {"$max": "$messages.timestamp"},
+            "messages": messages,
+        }},
+    ]
+    collection = conversations_collection.with_options(read_preference=ReadPreference.SECONDARY_PREFERRED)
+    with collection.aggregate(pipeline, allowDiskUse=True, batchSize=batch_size) as cursor:
+        for doc in cursor:
+            yield {
+                "_id": str(doc["_id"]),
+                "user_id": doc.get("user_id"),
+                "escalated": bool(doc.get("escalated", False)),
+                "stage": doc.get("stage"),
+                "intent": doc.get("intent"),
+                "score": doc.get("score"),
+                "message_count": doc.get("message_count", 0),
+                "first_message_at": doc.get("first_message_at"),
+                "last_message_at": doc.get("last_message_at"),
+                "updated_at": doc.get("updated_at") or doc.get("last_message_at"),
+                "messages": [
+                    {"sender": m.get("sender"), "message": m.get("message"), "timestamp": m.get("timestamp"),
+                     "stage": m.get("stage"), "intent": m.get("intent"), "tokens": m.get("tokens")}
+                    for m in doc.get("messages", [])
+                ],
+            }
+
+
+def _json_default(value):
+    if isinstance(value, datetime):
+        return value.isoformat() + "Z"
+    return str(value)
+
+
+def ndjson_line(record):
+    return json.dumps(record, ensure_ascii=False, default=_json_default) + "\n"
+
+
+class NdjsonWriter:
+    """Appends records to one file; progress is the file's byte length after each durable flush."""
+
+    def __init__(self, path, resume_from=None):
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._file = open(path, "ab")
+        # Drop a tail written after the last checkpoint
+        self._file.truncate(resume_from or 0)
+        self._file.seek(0, os.SEEK_END)
+
+    def write_batch(self, records):
+        self._file.write("".join(ndjson_line(record) for record in records).encode("utf-8"))
+
+    def commit(self):
+        """Make what's written durable; returns the progress to checkpoint, or None if nothing new is complete."""
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        return {"bytes": self._file.tell()}
+
+    def close(self):
+        return self.commit()
+
+
+class ParquetWriter:
+    """Writes a dataset directory of part files, one row group per batch; progress is the number of closed parts."""
+
+    def __init__(self, path, resume_from=None, part_rows=EXPORT_PART_ROWS):
+        import pyarrow as pa
+
+        self.path = path
+        self.part_rows = part_rows
+        self.parts = resume_from or 0
+        os.makedirs(path, exist_ok=True)
+        # Drop any part that was being written when the last run stopped
+        for name in os.listdir(path):
+            if name.startswith("part-") and name.endswith(".parquet") and int(name[5:10]) >= self.parts:
+                os.remove(os.path.join(path, name))
+        message = pa.struct([
+            ("sender", pa.string()), ("message", pa.string()), ("timestamp", pa.timestamp("ms")),
+            ("stage", pa.int64()), ("intent", pa.string()), ("tokens", pa.int64()),
+        ])
+        self.schema = pa.schema([
+            ("_id", pa.string()), ("user_id", pa.string()), ("escalated", pa.bool_()),
+            ("stage", pa.int64()), ("intent", pa.string()), ("score", pa.int64()), ("message_count", pa.int64()),
+            ("first_message_at", pa.timestamp("ms")), ("last_message_at", pa.timestamp("ms")),
+            ("updated_at", pa.timestamp("ms")), ("messages", pa.list_(message)),
+        ])
+        self._writer = None
+        self._rows_in_part = 0
+
+    def write_batch(self, records):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        if self._writer is None:
+            part_path = os.path.join(self.path, f"part-{self.parts:05d}.parquet")
+            self._writer = pq.ParquetWriter(part_path, self.schema, compression="zstd")
+        self._writer.write_table(pa.Table.from_pylist(records, schema=self.schema))
+        self._rows_in_part += len(records)
+
+    def commit(self):
+        if self._writer is None or self._rows_in_part < self.part_rows:
+            return None
+        return self._close_part()
+
+    def _close_part(self):
+        self._writer.close()
+        self._writer = None
+        self._rows_in_part = 0
+        self.parts += 1
+        return {"parts": self.parts}
+
+    def close(self):
+        return self._close_part() if self._writer is not None else {"parts": self.parts}
+
+
+class ExportRun:
+    """
+    One resumable export to `output`; the checkpoint lives at `<output>.checkpoint.json`.
+
+    A checkpoint only resumes an export with the same format and filters.
+    """
+
+    def __init__(self, output, format="ndjson", since=None, escalated=None, stage=None, max_messages=None,
+                 batch_size=EXPORT_BATCH_SIZE, part_rows=EXPORT_PART_ROWS):
+        if format not in FORMATS:
+            raise ValueError(f"Unknown export format '{format}', expected one of {', '.join(FORMATS)}")
+        self.output = output
+        self.format = format
+        self.filters = {"since": since.isoformat() if since else None, "escalated": escalated,
+                        "stage": stage, "max_messages": max_messages}
+        self.since, self.escalated, self.stage, self.max_messages = since, escalated, stage, max_messages
+        self.batch_size = batch_size
+        self.part_rows = part_rows
+        self.checkpoint_path = f"{output.rstrip(os.sep)}.checkpoint.json"
+        self.status = "pending"
+        self.rows = 0
+        self.last_id = None
+        self.started_at = self.finished_at = None
+
+    def progress(self):
+        elapsed = (self.finished_at or time.time()) - self.started_at if self.started_at else 0.0
+        return {
+            "status": self.status, "output": self.output, "format": self.format, "filters": self.filters,
+            "rows": self.rows, "last_id": self.last_id, "elapsed": round(elapsed, 1),
+            "rows_per_second": round(self.rows / elapsed, 1) if elapsed else 0,
+        }
+
+    def _load_checkpoint(self):
+        if not os.path.exists(self.checkpoint_path):
+            return {}
+        with open(self.checkpoint_path) as f:
+            checkpoint = json.load(f)
+        if checkpoint.get("format") != self.format or checkpoint.get("filters") != self.filters:
+            raise ValueError(
+                f"{self.checkpoint_path} is for a different export ({checkpoint.get('format')}, "
+                f"{checkpoint.get('filters')}); use another output or delete the checkpoint"
+            )
+        return checkpoint
+
+    def _save_checkpoint(self, written):
+        # Write-then-rename so a crash mid-write never leaves a truncated checkpoint
+        tmp_path = f"{self.checkpoint_path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({**self.progress(), "written": written}, f)
+        os.replace(tmp_path, self.checkpoint_path)
+
+    def run(self):
+        from bson import ObjectId
+
+        self.started_at = time.time()
+        checkpoint = self._load_checkpoint()
+        if checkpoint.get("status") == "done":
+            logger.info("Export to %s already complete", self.output)
+            self.status, self.rows, self.last_id = "done", checkpoint["rows"], checkpoint["last_id"]
+            self.finished_at = time.time()
+            return self.progress()
+        self.status = "running"
+        self.rows, self.last_id = checkpoint.get("rows", 0), checkpoint.get("last_id")
+        written = checkpoint.get("written", {})
+        if self.last_id:
+            logger.info("Resuming export to %s after %s (%d rows done)", self.output, self.last_id, self.rows)
+
+        if self.format == "ndjson":
+            writer = NdjsonWriter(self.output, written.get("bytes"))
+        else:
+            writer = ParquetWriter(self.output, written.get("parts"), self.part_rows)
+        # Rows and last id as of the last commit, which is what a checkpoint may claim
+        pending_rows, pending_last_id = self.rows, self.last_id
+        batch = []
+
+        def flush():
+            nonlocal batch, pending_rows, pending_last_id
+            writer.write_batch(batch)
+            pending_rows += len(batch)
+            pending_last_id = batch[-1]["_id"]
+            batch = []
+            committed = writer.commit()
+            if committed is not None:
+                self.rows, self.last_id = pending_rows, pending_last_id
+                self._save_checkpoint(committed)
+                logger.info("Exported %d conversations (through %s)", self.rows, self.last_id)
+
+        try:
+            records = iter_conversations(
+                self.since, self.escalated, self.stage, ObjectId(self.last_id) if self.last_id else None,
+                self.max_messages, self.batch_size
+            )
+            for record in records:
+                batch.append(record)
+                if len(batch) >= self.batch_size:
+                    flush()
+            if batch:
+                flush()
+            self.rows, self.last_id = pending_rows, pending_last_id
+            self.status = "done"
+            self._save_checkpoint(writer.close())
+        except Exception as e:
+            logger.error("Export to %s failed after %s: %s", self.output, self.last_id, str(e))
+            self.status = "failed"
+            raise
+        finally:
+            self.finished_at = time.time()
+            logger.info("Export %s: %s", self.status, self.progress())
+        return self.progress()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export conversations and lead signals for CRM sync")
+    parser.add_argument("--output", required=True, help="NDJSON file or Parquet directory; re-run with the same output to resume")
+    parser.add_argument("--format", choices=FORMATS, help="Default: parquet if --output ends in .parquet or is a directory, else ndjson")
+    parser.add_argument("--since", type=datetime.fromisoformat, help="Only conversations updated at or after this UTC time (ISO 8601)")
+    parser.add_argument("--escalated", action="store_true", default=None, help="Only escalated conversations")
+    parser.add_argument("--not-escalated", dest="escalated", action="store_false", default=None,
+                        help="Only conversations not escalated")
+    parser.add_argument("--stage", type=int, help="Only conversations currently at this sales stage")
+    parser.add_argument("--max-messages", type=int, help="Keep each conversation's last N messages (0: lead signals only)")
+    parser.add_argument("--batch-size", type=int, default=EXPORT_BATCH_SIZE)
+    parser.add_argument("--part-rows", type=int, default=EXPORT_PART_ROWS, help="Parquet rows per part file")
+    args = parser.parse_args()
+
+    fmt = args.format or ("parquet" if args.output.endswith(".parquet") or os.path.isdir(args.output) else "ndjson")
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+    export = ExportRun(args.output, fmt, args.since, args.escalated, args.stage, args.max_messages,
+                       args.batch_size, args.part_rows)
+    print(json.dumps(export.run(), indent=2))
+
+
+if __name__ == "__main__":
+    main()
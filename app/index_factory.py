@@ -0,0 +1,134 @@
+# app/index_factory.py
+import os
+import math
+import time
+import logging
+import numpy as np
+import faiss
+from dotenv import load_dotenv
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# flat | hnsw | ivfpq | ivfsq8
+VECTOR_INDEX_TYPE = os.getenv("VECTOR_INDEX_TYPE", "flat").lower()
+# Corpora smaller than this stay on the exact flat index, which is already fast at that size
+VECTOR_INDEX_TRAIN_THRESHOLD = int(os.getenv("VECTOR_INDEX_TRAIN_THRESHOLD", 50000))
+VECTOR_INDEX_MAX_TRAIN_POINTS = int(os.getenv("VECTOR_INDEX_MAX_TRAIN_POINTS", 200000))
+HNSW_M = int(os.getenv("HNSW_M", 32))
+HNSW_EF_CONSTRUCTION = int(os.getenv("HNSW_EF_CONSTRUCTION", 80))
+HNSW_EF_SEARCH = int(os.getenv("HNSW_EF_SEARCH", 64))
+IVF_NLIST = int(os.getenv("IVF_NLIST", 0))  # 0 = derive from corpus size
+IVF_NPROBE = int(os.getenv("IVF_NPROBE", 16))
+PQ_M = int(os.getenv("PQ_M", 48))
+
+INDEX_TYPES = ("flat", "hnsw", "ivfpq", "ivfsq8")
+
+
+def _default_nlist(n_vectors):
+    # ~4*sqrt(n) lists, but keep >= 39 training points per centroid as faiss recommends
+    return max(1, min(int(4 * math.sqrt(n_vectors)), n_vectors // 39))
+
+
+def _pq_subquantizers(dim, requested):
+    # PQ needs the dimension to split evenly into sub-vectors
+    for m in range(min(requested, dim), 0, -1):
+        if dim % m == 0:
+            return m
+    return 1
+
+
+def factory_string(index_type, dim, n_vectors):
+    """Return the faiss index_factory description for an index type and corpus size."""
+    if index_type == "flat":
+        return "Flat"
+    if index_type == "hnsw":
+        return f"HNSW{HNSW_M}"
+    nlist = IVF_NLIST or _default_nlist(n_vectors)
+    if index_type == "ivfpq":
+        return f"IVF{nlist},PQ{_pq_subquantizers(dim, PQ_M)}x8"
+    if index_type == "ivfsq8":
+        return f"IVF{nlist},SQ8"
+    raise ValueError(f"Unknown vector index type '{index_type}', expected one of {INDEX_TYPES}")
+
+
+def configure_search(index, nprobe=IVF_NPROBE, ef_search=HNSW_EF_SEARCH):
+    """Apply query-time accuracy/speed knobs to an index, whatever its type."""
+    ivf = faiss.try_extract_index_ivf(index)
+    if ivf is not None:
+        ivf.nprobe = min(nprobe, ivf.nlist)
+    if isinstance(index, faiss.IndexHNSW):
+        index.hnsw.efSearch = ef_search
+    return index
+
+
+def filtered_search_params(index, candidate_ids, nprobe=IVF_NPROBE, ef_search=HNSW_EF_SEARCH):
+    """
+    Return (params, selector) restricting a search to `candidate_ids`.
+
+    The selector must be kept alive for the duration of the search call.
+    """
+    selector = faiss.IDSelectorBatch(np.ascontiguousarray(candidate_ids, dtype="int64"))
+    ivf = faiss.try_extract_index_ivf(index)
+    if ivf is not None:
+        params = faiss.SearchParametersIVF(sel=selector, nprobe=min(nprobe, ivf.nlist))
+    elif isinstance(index, faiss.IndexHNSW):
+        # Filtering prunes the graph walk, so widen the beam to keep recall up
+        params = faiss.SearchParametersHNSW(sel=selector, efSearch=ef_search * 4)
+    else:
+        params = faiss.SearchParameters(sel=selector)
+    return params, selector
+
+
+def enable_reconstruct(index):
+    """
+    Let `index.reconstruct(row_id)` work on IVF indexes, which need an id -> list map for it.
+
+    The map costs 8 bytes per vector and is kept up to date by later adds.
+    """
+    ivf = faiss.try_extract_index_ivf(index)
+    if ivf is not None and ivf.direct_map.type == faiss.DirectMap.NoMap:
+        ivf.make_direct_map()
+    return index
+
+
+def build_index(vectors, index_type=VECTOR_INDEX_TYPE):
+    """Build, train (if needed) and fill a faiss index of the given type from an (n, dim) array."""
+    vectors = np.ascontiguousarray(vectors, dtype="float32")
+    n_vectors, dim = vectors.shape
+    description = factory_string(index_type, dim, n_vectors)
+    index = faiss.index_factory(dim, description)
+    if isinstance(index, faiss.IndexHNSW):
+        index.hnsw.efConstruction = HNSW_EF_CONSTRUCTION
+
+    if not index.is_trained:
+        train = vectors
+        if n_vectors > VECTOR_INDEX_MAX_TRAIN_POINTS:
+            sample = np.random.default_rng(0).choice(n_vectors, VECTOR_INDEX_MAX_TRAIN_POINTS, replace=False)
+            train = vectors[np.sort(sample)]
+        index.train(train)
+
+    index.add(vectors)
+    return configure_search(enable_reconstruct(index))
+
+
+def maybe_upgrade_index(index, index_type=VECTOR_INDEX_TYPE, threshold=VECTOR_INDEX_TRAIN_THRESHOLD):
+    """
+    Rebuild a flat index as the configured approximate index once it grows past `threshold`.
+
+    Row ids are preserved (vectors are re-added in their original order), so docstore
+    mappings built on top of the flat index stay valid. Indexes that are already
+    approximate, below the threshold, or configured as "flat" are returned unchanged.
+    """
+    if index_type == "flat" or index.ntotal < threshold or not isinstance(index, faiss.IndexFlat):
+        return index
+
+    start = time.perf_counter()
+    vectors = index.reconstruct_n(0, index.ntotal)
+    upgraded = build_index(vectors, index_type)
+    logger.info(
+        "Rebuilt %d-vector flat index as %s in %.1fs",
+        index.ntotal, factory_string(index_type, index.d, index.ntotal), time.perf_counter() - start
+    )
+    return upgraded
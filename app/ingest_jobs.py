@@ -0,0 +1,185 @@
+# app/ingest_jobs.py
+import io
+import time
+import hashlib
+import logging
+import threading
+from contextlib import nullcontext
+from concurrent.futures import ThreadPoolExecutor
+import pandas as pd
+from app.vector_db import IngestCancelled
+
+logger = logging.getLogger(__name__)
+
+QUEUED, RUNNING, DONE, FAILED, CANCELLED, SKIPPED = "queued", "running", "done", "failed", "cancelled", "skipped"
+ACTIVE_STATUSES = (QUEUED, RUNNING)
+RETRYABLE_STATUSES = (FAILED, CANCELLED)
+
+
+def content_hash(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+class IngestJob:
+    """One file being ingested into a VectorDB; fields are read by the UI while the worker updates them."""
+
+    def __init__(self, job_id, file_name, file_type, data):
+        self.id = job_id
+        self.file_name = file_name
+        self.file_type = file_type
+        self.status = QUEUED
+        self.progress = 0.0
+        self.message = "Waiting to start"
+        self.submitted_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.attempts = 0
+        # Rows earlier attempts left in the store; a retry of a text or PDF file skips that many chunks
+        self.rows_appended = 0
+        # File contents, kept only while the job may still run or be retried
+        self._data = data
+        self._cancel = threading.Event()
+
+    @property
+    def elapsed(self):
+        """Seconds spent running so far (or in total, once finished)."""
+        if self.started_at is None:
+            return 0.0
+        return (self.finished_at or time.time()) - self.started_at
+
+    def cancel(self):
+        self._cancel.set()
+
+    def report(self, fraction, message):
+        """Progress callback handed to VectorDB; doubles as the cancellation checkpoint."""
+        if fraction is not None:
+            self.progress = min(max(fraction, 0.0), 1.0)
+        self.message = message
+        if self._cancel.is_set():
+            raise IngestCancelled()
+
+
+class IngestJobManager:
+    """
+    Runs file ingestion on a background thread, one job at a time per VectorDB.
+
+    Jobs are keyed by a SHA-256 of the file contents, so re-submitting a file returns the
+    existing job whatever its state: Streamlit resubmits every file still in the uploader on
+    each rerun, and that must not re-embed an indexed file or restart a cancelled or failed
+    one. Those are only run again through `retry()`.
+    """
+
+    def __init__(self, vector_db, hold=None):
+        self.vector_db = vector_db
+        # Returns a context manager held while a job writes, e.g. to keep the store from being evicted
+        self._hold = hold or nullcontext
+        # A single worker serializes writes to the store; chat queries are not blocked
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="ingest")
+        self._jobs = {}
+        self._lock = threading.Lock()
+
+    def submit(self, file_name: str, data: bytes) -> IngestJob:
+        """Queue a CSV, TXT or PDF file for ingestion, unless a job for identical content already exists."""
+        job_id = content_hash(data)
+        with self._lock:
+            existing = self._jobs.get(job_id)
+            if existing is not None:
+                return existing
+            job = IngestJob(job_id, file_name, file_name.rsplit(".", 1)[-1].lower(), data)
+            self._jobs[job_id] = job
+        self._executor.submit(self._run, job)
+        return job
+
+    def cancel(self, job_id):
+        job = self._jobs.get(job_id)
+        if job is not None and job.status in ACTIVE_STATUSES:
+            job.cancel()
+
+    def retry(self, job_id):
+        """Queue a failed or cancelled job again; it resumes after what earlier attempts indexed."""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None or job.status not in RETRYABLE_STATUSES:
+                return job
+            job.status, job.progress, job.message = QUEUED, 0.0, "Waiting to retry"
+            job.started_at = job.finished_at = None
+            job._cancel = threading.Event()
+        self._executor.submit(self._run, job)
+        return job
+
+    def jobs(self):
+        """All jobs, most recently submitted first."""
+        return sorted(self._jobs.values(), key=lambda job: job.submitted_at, reverse=True)
+
+    def has_active_jobs(self):
+        return any(job.status in ACTIVE_STATUSES for job in self._jobs.values())
+
+    def clear(self, wait=False):
+        """
+        Cancel in-flight jobs, forget all indexed files and stop the worker thread (call alongside
+        clearing the VectorDB; the manager takes no new jobs afterwards).
+
+        With `wait`, returns only once the running job has stopped writing to the store.
+        """
+        with self._lock:
+            for job in self._jobs.values():
+                job.cancel()
+            self._jobs = {}
+        self._executor.shutdown(wait=wait, cancel_futures=True)
+
+    def _run(self, job: IngestJob):
+        if job._cancel.is_set():
+            job.status, job.message = CANCELLED, "Cancelled before start"
+            return
+
+        with self._hold():
+            # The store may have been cleared while this job waited for its hold
+            if job._cancel.is_set():
+                job.status, job.message = CANCELLED, "Cancelled before start"
+                return
+            self._ingest(job)
+
+    def _ingest(self, job: IngestJob):
+        data = job._data
+        job.status, job.started_at = RUNNING, time.time()
+        job.attempts += 1
+        # This is the only writer to the store, so the rows it gains are this job's
+        rows_before = len(self.vector_db)
+        try:
+            job.report(0.0, "Parsing file")
+            if job.file_type == "csv":
+                df = pd.read_csv(io.BytesIO(data))
+                added = self.vector_db.create_vector_db_from_csv(df, progress=job.report)
+                report = self.vector_db.last_dedup_report
+                job.message = (
+                    f"{report['rows_indexed']} new leads from {report['rows_in']} rows "
+                    f"({report['dedup_ratio']:.0%} duplicates)"
+                )
+            elif job.file_type == "txt":
+                text = data.decode("utf-8").strip()
+                added = self.vector_db.create_vector_db_from_text(
+                    text, source_name=job.file_name, progress=job.report, skip=job.rows_appended
+                )
+                job.message = "Indexed text"
+            elif job.file_type == "pdf":
+                added = self.vector_db.create_vector_db_from_pdf(
+                    data, source_name=job.file_name, progress=job.report, skip=job.rows_appended
+                )
+                job.message = "Indexed PDF pages"
+            else:
+                raise ValueError(f"Unsupported file type '{job.file_type}'")
+
+            if added:
+                job.status, job.progress = DONE, 1.0
+            else:
+                job.status, job.message = SKIPPED, "No new content to index"
+            job._data = None
+        except IngestCancelled:
+            job.status, job.message = CANCELLED, "Cancelled; retrying resumes after the chunks already indexed"
+        except Exception as e:
+            logger.error("Ingestion of '%s' failed: %s", job.file_name, str(e))
+            job.status, job.message = FAILED, str(e)
+        finally:
+            job.rows_appended += len(self.vector_db) - rows_before
+            job.finished_at = time.time()
+            logger.info("Ingest job '%s' %s in %.2fs", job.file_name, job.status, job.elapsed)
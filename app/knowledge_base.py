@@ -0,0 +1,165 @@
+# app/knowledge_base.py
+"""
+The FAQ knowledge base: one or more FAQ files or directories, indexed together and reloaded
+when they change.
+
+FAQ_PATHS lists files and/or directories (comma-separated); directories contribute their
+.txt and .md files, recursively. A watcher thread polls their modification times every
+FAQ_RELOAD_INTERVAL seconds. On a change, every file is re-split, which is cheap, but only
+chunks whose content hash is new get embedded. A section that didn't change splits into the
+same chunks, so its cached vectors are reused. A fresh VectorDB is then filled from the
+vectors and swapped in with a single reference assignment: queries in flight finish on the
+old index, and new ones see the new one. If a reload fails, the previous index stays in
+service.
+"""
+import os
+import hashlib
+import logging
+import time
+import threading
+from dotenv import load_dotenv
+from app.vector_db import VectorDB
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+FAQ_PATHS = [path.strip() for path in os.getenv("FAQ_PATHS", "data/company_faq.txt").split(",") if path.strip()]
+# Seconds between change checks; 0 disables watching (the files are still loaded once)
+FAQ_RELOAD_INTERVAL = float(os.getenv("FAQ_RELOAD_INTERVAL", 5))
+FAQ_EXTENSIONS = (".txt", ".md")
+
+
+def chunk_hash(text):
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class KnowledgeBase:
+    """FAQ files indexed into a VectorDB that is rebuilt incrementally and swapped atomically on change."""
+
+    def __init__(self, paths=None, reload_interval=FAQ_RELOAD_INTERVAL):
+        self.paths = list(paths or FAQ_PATHS)
+        self.reload_interval = reload_interval
+        self.vector_db = None
+        self.loaded_at = None
+        self.last_error = None
+        self.last_reload = {}
+        # chunk content hash -> embedding; holds only the chunks of the current index after each reload
+        self._vectors = {}
+        self._signature = None
+        self._reload_lock = threading.Lock()
+        self._watcher = None
+        self._stop = threading.Event()
+
+    def files(self):
+        """The FAQ files currently behind `paths`, in a stable order."""
+        found = []
+        for path in self.paths:
+            if os.path.isdir(path):
+                for root, dirs, names in os.walk(path):
+                    dirs.sort()
+                    found.extend(os.path.join(root, name) for name in sorted(names) if name.endswith(FAQ_EXTENSIONS))
+            elif os.path.isfile(path):
+                found.append(path)
+        return found
+
+    def _current_signature(self, files):
+        signature = []
+        for path in files:
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue  # deleted between listing and stat; the next poll sees it gone
+            signature.append((path, stat.st_mtime_ns, stat.st_size))
+        return tuple(signature)
+
+    def _read_documents(self, files, splitter):
+        documents = []
+        for path in files:
+            with open(path, encoding="utf-8") as f:
+                text = f.read()
+            if text.strip():
+                documents.extend(splitter.split_text(text, metadata={"source": path}))
+        return documents
+
+    def reload(self, force=False):
+        """
+        Re-index the FAQ files if any was added, removed or modified since the last load.
+
+        Returns True if a new index was swapped in.
+        """
+        with self._reload_lock:
+            files = self.files()
+            signature = self._current_signature(files)
+            if not force and signature == self._signature:
+                return False
+            if not files:
+                raise FileNotFoundError(f"No FAQ files found at {', '.join(self.paths)}")
+
+            new_db = VectorDB()
+            documents = self._read_documents(files, new_db.text_splitter)
+            if not documents:
+                raise ValueError("FAQ files are empty or contain only whitespace")
+
+            hashes = [chunk_hash(doc.page_content) for doc in documents]
+            missing = {h: doc.page_content for h, doc in zip(hashes, documents) if h not in self._vectors}
+            if missing:
+                vectors = new_db.bulk_embedder.embed_documents(list(missing.values()))
+                self._vectors.update(zip(missing, vectors))
+            new_db.add_embedded_documents(documents, [self._vectors[h] for h in hashes])
+
+            # Forget vectors of chunks that are no longer in any file
+            live = set(hashes)
+            self._vectors = {h: v for h, v in self._vectors.items() if h in live}
+            self.vector_db = new_db
+            self._signature = signature
+            self.loaded_at = time.time()
+            self.last_reload = {"files": len(files), "chunks": len(documents), "embedded": len(missing),
+                                "reused": len(documents) - len(missing)}
+            logger.info("FAQ knowledge base loaded: %s", self.last_reload)
+            return True
+
+    def _watch(self):
+        while not self._stop.wait(self.reload_interval):
+            try:
+                self.reload()
+                self.last_error = None
+            except Exception as e:
+                # Keep serving the previous index until the files are fixed
+                if str(e) != self.last_error:
+                    logger.error("FAQ reload failed, keeping the previous index: %s", str(e))
+                self.last_error = str(e)
+
+    def start_watching(self):
+        if self.reload_interval > 0 and self._watcher is None:
+            self._watcher = threading.Thread(target=self._watch, name="faq-watcher", daemon=True)
+            self._watcher.start()
+
+    def stop_watching(self):
+        self._stop.set()
+
+    def stats(self):
+        return {"paths": self.paths, "chunks": len(self.vector_db) if self.vector_db else 0,
+                "loaded_at": self.loaded_at, "last_reload": self.last_reload, "last_error": self.last_error}
+
+
+# Built once per process and shared by every session and API request
+_knowledge_base = None
+_knowledge_base_lock = threading.Lock()
+
+
+def get_knowledge_base():
+    """The process-wide FAQ knowledge base, loaded on first use and then kept current by its watcher."""
+    global _knowledge_base
+    with _knowledge_base_lock:
+        if _knowledge_base is None:
+            knowledge_base = KnowledgeBase()
+            try:
+                knowledge_base.reload(force=True)
+            except Exception as e:
+                logger.exception("Error initializing FAQ knowledge base: %s", str(e))
+                knowledge_base.last_error = str(e)
+            # Watch even after a failed load, so creating or fixing the files brings the FAQ online
+            knowledge_base.start_watching()
+            _knowledge_base = knowledge_base
+        return _knowledge_base
@@ -0,0 +1,70 @@
+# app/lexical_index.py
+import re
+import math
+import heapq
+
+_WORD_PATTERN = re.compile(r"\w+")
+_EMAIL_PATTERN = re.compile(r"[\w.+-]+@[\w-]+(?:\.[\w-]+)+")
+
+
+def tokenize(text):
+    """Lowercased word tokens, plus whole email addresses so exact email lookups match as one term."""
+    text = text.lower()
+    return _WORD_PATTERN.findall(text) + _EMAIL_PATTERN.findall(text)
+
+
+class BM25Index:
+    """In-memory BM25 inverted index over row ids, updated incrementally as documents are added."""
+
+    def __init__(self, k1=1.5, b=0.75):
+        self.k1 = k1
+        self.b = b
+        self.clear()
+
+    def clear(self):
+        self.postings = {}  # term -> {row id: term frequency}
+        self.doc_lengths = {}  # row id -> token count
+        self.total_length = 0
+
+    def __len__(self):
+        return len(self.doc_lengths)
+
+    def add(self, ids, texts):
+        """Index each text under its row id."""
+        for row_id, text in zip(ids, texts):
+            tokens = tokenize(text)
+            self.doc_lengths[row_id] = len(tokens)
+            self.total_length += len(tokens)
+            counts = {}
+            for token in tokens:
+                counts[token] = counts.get(token, 0) + 1
+            for token, tf in counts.items():
+                self.postings.setdefault(token, {})[row_id] = tf
+
+    def search(self, query, k=10, candidate_ids=None):
+        """
+        Return up to `k` (row id, score) pairs, best first.
+
+        Only documents sharing a term with the query are scored, so rare terms such as
+        company names or emails resolve in well under a millisecond. `candidate_ids`
+        optionally restricts scoring to a set of row ids.
+        """
+        n_docs = len(self.doc_lengths)
+        if not n_docs:
+            return []
+        avg_length = self.total_length / n_docs
+        allowed = set(int(i) for i in candidate_ids) if candidate_ids is not None else None
+
+        scores = {}
+        for term in set(tokenize(query)):
+            postings = self.postings.get(term)
+            if not postings:
+                continue
+            idf = math.log(1 + (n_docs - len(postings) + 0.5) / (len(postings) + 0.5))
+            for row_id, tf in postings.items():
+                if allowed is not None and row_id not in allowed:
+                    continue
+                norm = tf + self.k1 * (1 - self.b + self.b * self.doc_lengths[row_id] / avg_length)
+                scores[row_id] = scores.get(row_id, 0.0) + idf * tf * (self.k1 + 1) / norm
+
+        return heapq.nlargest(k, scores.items(), key=lambda item: item[1])
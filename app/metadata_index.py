@@ -0,0 +1,179 @@
+# app/metadata_index.py
+import re
+import numpy as np
+import pandas as pd
+
+# Categorical values too generic to treat as a filter when they show up in free text
+_IGNORED_TEXT_VALUES = {"none", "nan", "null", "n/a", "na", "yes", "no", "true", "false", "other", "unknown"}
+_RANGE_OPERATORS = ("$gt", "$gte", "$lt", "$lte")
+
+
+def _normalize(value):
+    return str(value).strip().lower()
+
+
+def split_metadata_columns(df, columns):
+    """
+    Split columns chosen as metadata into categorical and numeric ones by dtype.
+
+    Returns:
+        A (categorical_cols, numeric_cols) tuple of column name lists, in `columns` order
+    """
+    categorical_cols, numeric_cols = [], []
+    for col in columns:
+        series = df[col]
+        if pd.api.types.is_numeric_dtype(series) and not pd.api.types.is_bool_dtype(series):
+            numeric_cols.append(col)
+        else:
+            categorical_cols.append(col)
+    return categorical_cols, numeric_cols
+
+
+def detect_metadata_columns(df, max_categories=50):
+    """
+    Suggest categorical and numeric metadata columns for a dataframe, e.g. to offer as choices.
+
+    Numeric columns get a range index. Text columns qualify as categorical when values repeat
+    (at most `max_categories` distinct values, and fewer distinct values than half the rows);
+    free-text columns such as names, emails or notes are left out.
+
+    Returns:
+        A (categorical_cols, numeric_cols) tuple of column name lists
+    """
+    categorical_cols, numeric_cols = [], []
+    for col in df.columns:
+        series = df[col]
+        if pd.api.types.is_bool_dtype(series):
+            categorical_cols.append(col)
+        elif pd.api.types.is_numeric_dtype(series):
+            numeric_cols.append(col)
+        else:
+            distinct = series.dropna().nunique()
+            if 0 < distinct <= max_categories and distinct < max(2, len(df) / 2):
+                categorical_cols.append(col)
+    return categorical_cols, numeric_cols
+
+
+def _mentions_column(lowered, col):
+    """Whether a lowercased query names a column, singular or plural ("industry", "industries", "crm_systems")."""
+    name = re.sub(r"[_\-\s]+", " ", _normalize(col))
+    if name.endswith("y"):
+        pattern = re.escape(name[:-1]) + "(?:y|ies)"
+    else:
+        pattern = re.escape(name) + "(?:e?s)?"
+    return re.search(rf"(?<!\w){pattern}(?!\w)", lowered) is not None
+
+
+class MetadataIndex:
+    """Inverted indexes over categorical metadata and sorted range indexes over numeric metadata, keyed by vector row id."""
+
+    def __init__(self):
+        self.clear()
+
+    def clear(self):
+        self.categorical_cols = set()
+        self.numeric_cols = set()
+        self._postings = {}  # col -> {normalized value -> [row ids]}
+        self._ranges = {}  # col -> ([values], [row ids]) in insertion order
+        self._sorted = {}  # col -> (sorted values array, matching row ids array), rebuilt lazily
+
+    def register_columns(self, categorical_cols=(), numeric_cols=()):
+        self.categorical_cols.update(categorical_cols)
+        self.numeric_cols.update(numeric_cols)
+
+    def add(self, ids, metadatas):
+        """Index the registered columns of each metadata dict under its row id."""
+        for row_id, metadata in zip(ids, metadatas):
+            if not metadata:
+                continue
+            for col in self.categorical_cols:
+                value = metadata.get(col)
+                if value is None or (isinstance(value, float) and np.isnan(value)):
+                    continue
+                self._postings.setdefault(col, {}).setdefault(_normalize(value), []).append(row_id)
+            for col in self.numeric_cols:
+                try:
+                    value = float(metadata.get(col))
+                except (TypeError, ValueError):
+                    continue
+                if np.isnan(value):
+                    continue
+                values, row_ids = self._ranges.setdefault(col, ([], []))
+                values.append(value)
+                row_ids.append(row_id)
+                self._sorted.pop(col, None)
+
+    def _range_ids(self, col, bounds):
+        if col not in self._sorted:
+            values, row_ids = self._ranges.get(col, ([], []))
+            order = np.argsort(values, kind="stable")
+            self._sorted[col] = (np.asarray(values, dtype="float64")[order], np.asarray(row_ids, dtype="int64")[order])
+        values, row_ids = self._sorted[col]
+
+        lo, hi = 0, len(values)
+        if "$gte" in bounds:
+            lo = max(lo, np.searchsorted(values, float(bounds["$gte"]), side="left"))
+        if "$gt" in bounds:
+            lo = max(lo, np.searchsorted(values, float(bounds["$gt"]), side="right"))
+        if "$lte" in bounds:
+            hi = min(hi, np.searchsorted(values, float(bounds["$lte"]), side="right"))
+        if "$lt" in bounds:
+            hi = min(hi, np.searchsorted(values, float(bounds["$lt"]), side="left"))
+        return np.sort(row_ids[lo:hi]) if lo < hi else np.empty(0, dtype="int64")
+
+    def candidate_ids(self, filters):
+        """
+        Resolve structured filters to the sorted array of matching row ids.
+
+        Filters map a column to a value, a list of accepted values, or a dict of range
+        bounds using $gt/$gte/$lt/$lte, e.g. {"industry": "fintech", "employees": {"$gte": 50}}.
+        All filters must match. Returns None when `filters` is empty.
+        """
+        if not filters:
+            return None
+
+        result = None
+        for col, condition in filters.items():
+            if isinstance(condition, dict):
+                unknown = set(condition) - set(_RANGE_OPERATORS)
+                if unknown:
+                    raise ValueError(f"Unsupported filter operators for '{col}': {sorted(unknown)}")
+                ids = self._range_ids(col, condition)
+            else:
+                accepted = condition if isinstance(condition, (list, tuple, set)) else [condition]
+                postings = self._postings.get(col, {})
+                ids = np.unique(np.fromiter(
+                    (row_id for value in accepted for row_id in postings.get(_normalize(value), [])), dtype="int64"
+                ))
+            result = ids if result is None else np.intersect1d(result, ids, assume_unique=True)
+            if not len(result):
+                break
+        return result
+
+    def infer_filters(self, text):
+        """
+        Derive filters from a free-text query: categorical values mentioned as whole words
+        alongside their column's name (e.g. "leads in the fintech industry"), and
+        "N+ <column>" phrases (e.g. "50+ employees") for numeric columns.
+
+        A value alone isn't enough: "uk" or "retail" in a question about something else
+        would otherwise silently narrow the search.
+        """
+        lowered = text.lower()
+        filters = {}
+        for col, postings in self._postings.items():
+            if not _mentions_column(lowered, col):
+                continue
+            matches = [
+                value for value in postings
+                if len(value) >= 3 and value not in _IGNORED_TEXT_VALUES
+                and re.search(rf"(?<!\w){re.escape(value)}(?!\w)", lowered)
+            ]
+            if matches:
+                filters[col] = matches
+        for number, word in re.findall(r"(\d[\d,]*)\s*\+\s*([a-z_]+)", lowered):
+            stem = word.rstrip("s")
+            for col in self.numeric_cols:
+                if stem and stem in _normalize(col):
+                    filters[col] = {"$gte": float(number.replace(",", ""))}
+        return filters
@@ -0,0 +1,277 @@
+# app/namespaces.py
+import os
+import re
+import time
+import hashlib
+import logging
+import threading
+import weakref
+from collections import OrderedDict
+from contextlib import contextmanager
+from functools import lru_cache
+from dotenv import load_dotenv
+from app.vector_db import VectorDB
+from app.ingest_jobs import IngestJobManager
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Where evicted namespaces are written, one file per namespace
+NAMESPACE_DIR = os.getenv("NAMESPACE_DIR", "data/namespaces")
+# How many namespaces' indexes may be resident in memory at once
+NAMESPACE_MAX_RESIDENT = int(os.getenv("NAMESPACE_MAX_RESIDENT", 32))
+# Namespace used by callers that don't identify a tenant
+DEFAULT_NAMESPACE = os.getenv("DEFAULT_NAMESPACE", "default")
+# How long clear() waits for searches and cancelled ingestion to let go of a namespace
+NAMESPACE_CLEAR_TIMEOUT = float(os.getenv("NAMESPACE_CLEAR_TIMEOUT", 30))
+
+
+class NamespaceBusy(RuntimeError):
+    """Raised by clear() when a namespace is still in use after NAMESPACE_CLEAR_TIMEOUT."""
+
+
+def namespace_filename(namespace: str) -> str:
+    """File name for a namespace: readable for emails and plain ids, hashed to stay unique and safe."""
+    slug = re.sub(r"[^\w.@-]", "_", namespace).lstrip(".")[:64] or "_"
+    digest = hashlib.sha256(namespace.encode("utf-8")).hexdigest()[:12]
+    return f"{slug}-{digest}.pkl"
+
+
+class _Namespace:
+    def __init__(self, registry, namespace, vector_db, saved_version):
+        self.registry = registry
+        self.namespace = namespace
+        self.vector_db = vector_db
+        # The manager holds this entry (through `hold`), so a session keeping the manager keeps it revivable
+        self.ingest_jobs = IngestJobManager(vector_db, hold=self.hold)
+        self.saved_version = saved_version
+        self.last_used = time.time()
+        # Callers inside use(); a pinned namespace is never evicted
+        self.pins = 0
+
+    def hold(self):
+        """Keep the namespace resident, reviving it if it was evicted, for the duration of a `with` block."""
+        return self.registry.use(self.namespace)
+
+    @property
+    def dirty(self):
+        return self.vector_db.version != self.saved_version
+
+
+class NamespaceRegistry:
+    """
+    Lead stores keyed by tenant/user id, so each user only ever searches their own leads.
+
+    A namespace's VectorDB is loaded from NAMESPACE_DIR on first use. When more than
+    `max_resident` namespaces are in memory, the least recently used idle ones are written
+    back to disk (if they changed) and dropped. Namespaces that are pinned (see `use()`) or
+    have ingestion in flight are kept. Loading and saving happen outside the registry lock,
+    so other tenants are not blocked while one namespace is read or written.
+
+    An evicted namespace whose job manager is still referenced somewhere (e.g. kept in a
+    Streamlit session) is revived from memory on its next use instead of being reloaded from
+    its file, so there is never a second copy for writes to go to. Jobs pin their namespace
+    while they run.
+    """
+
+    def __init__(self, root=NAMESPACE_DIR, max_resident=NAMESPACE_MAX_RESIDENT):
+        self.root = root
+        self.max_resident = max_resident
+        self._resident = OrderedDict()  # namespace -> _Namespace, least recently used first
+        # Evicted namespaces that are still referenced elsewhere; dropped once nothing refers to them
+        self._detached = weakref.WeakValueDictionary()
+        # Namespaces being read from disk -> event set once the load finished (or failed)
+        self._loading = {}
+        self._lock = threading.RLock()
+        # Notified whenever a pin is released or a load finishes
+        self._changed = threading.Condition(self._lock)
+        os.makedirs(root, exist_ok=True)
+
+    def _path(self, namespace):
+        return os.path.join(self.root, namespace_filename(namespace))
+
+    def _acquire(self, namespace, pin=False) -> _Namespace:
+        if not namespace:
+            raise ValueError("A namespace (tenant or user id) is required")
+        while True:
+            with self._lock:
+                entry = self._resident.get(namespace)
+                if entry is None:
+                    entry = self._detached.pop(namespace, None)
+                    if entry is not None:
+                        logger.info("Revived evicted namespace '%s' from memory", namespace)
+                        self._resident[namespace] = entry
+                if entry is not None:
+                    self._resident.move_to_end(namespace)
+                    entry.last_used = time.time()
+                    if pin:
+                        entry.pins += 1
+                    evicted = self._evict()
+                    break
+                loading = self._loading.get(namespace)
+                loader = loading is None
+                if loader:
+                    loading = self._loading[namespace] = threading.Event()
+            if not loader:
+                # Another caller is reading this namespace from disk; take its result
+                loading.wait()
+                continue
+            entry = None
+            try:
+                entry = self._load(namespace)
+            finally:
+                with self._lock:
+                    del self._loading[namespace]
+                    if entry is not None:
+                        self._resident[namespace] = entry
+                    self._changed.notify_all()
+                loading.set()
+        self._save_evicted(evicted)
+        return entry
+
+    def _load(self, namespace):
+        path = self._path(namespace)
+        if os.path.exists(path):
+            start = time.perf_counter()
+            vector_db = VectorDB.load(path)
+            logger.info("Loaded namespace '%s' (%d rows) in %.2fs", namespace, len(vector_db), time.perf_counter() - start)
+        else:
+            vector_db = VectorDB()
+        return _Namespace(self, namespace, vector_db, vector_db.version)
+
+    def get(self, namespace) -> VectorDB:
+        """
+        The namespace's VectorDB, loading it (or creating an empty one) if it isn't resident.
+
+        The namespace may be evicted as soon as this returns; hold it with `use()` instead while
+        searching or iterating it.
+        """
+        return self._acquire(namespace).vector_db
+
+    @contextmanager
+    def use(self, namespace):
+        """Pin the namespace's VectorDB for the duration of the block so it can't be evicted mid-use."""
+        entry = self._acquire(namespace, pin=True)
+        try:
+            yield entry.vector_db
+        finally:
+            with self._lock:
+                entry.pins -= 1
+                self._changed.notify_all()
+
+    def ingest_jobs(self, namespace) -> IngestJobManager:
+        """The ingestion queue writing into the namespace's VectorDB; each running job pins the namespace."""
+        return self._acquire(namespace).ingest_jobs
+
+    def _save(self, namespace, entry):
+        if entry.dirty:
+            entry.saved_version = entry.vector_db.save(self._path(namespace))
+
+    def _evict(self):
+        """Detach least recently used idle namespaces over the limit; returns them for saving outside the lock."""
+        evicted = []
+        for namespace in list(self._resident):
+            if len(self._resident) <= self.max_resident:
+                break
+            entry = self._resident[namespace]
+            if entry.pins or entry.ingest_jobs.has_active_jobs():
+                continue
+            del self._resident[namespace]
+            self._detached[namespace] = entry
+            evicted.append((namespace, entry))
+        return evicted
+
+    def _save_evicted(self, evicted):
+        for namespace, entry in evicted:
+            # VectorDB.save snapshots under the store's own lock, so only this tenant waits on it
+            try:
+                self._save(namespace, entry)
+            except Exception as e:
+                logger.error("Could not save namespace '%s'; keeping it resident: %s", namespace, str(e))
+                with self._lock:
+                    if self._detached.get(namespace) is entry:
+                        del self._detached[namespace]
+                        self._resident[namespace] = entry
+                continue
+            logger.info("Evicted idle namespace '%s'", namespace)
+
+    def flush(self):
+        """Write every changed namespace still in memory to disk (e.g. on shutdown)."""
+        with self._lock:
+            entries = list(self._resident.items()) + list(self._detached.items())
+        for namespace, entry in entries:
+            self._save(namespace, entry)
+
+    def _entries(self, namespace):
+        return [entry for entry in (self._resident.get(namespace), self._detached.get(namespace)) if entry is not None]
+
+    def clear(self, namespace, timeout=NAMESPACE_CLEAR_TIMEOUT):
+        """
+        Delete a namespace's leads, in memory and on disk.
+
+        Ingestion into the namespace is cancelled and waited for first, so no job keeps writing
+        into the cleared store or saves it back over the deleted file. Raises NamespaceBusy if
+        the namespace is still pinned after `timeout` seconds.
+        """
+        with self._lock:
+            entries = self._entries(namespace)
+        for entry in entries:
+            # Outside the lock: the running job releases its pin through use(), which takes the lock
+            entry.ingest_jobs.clear(wait=True)
+        with self._lock:
+            idle = self._changed.wait_for(
+                lambda: namespace not in self._loading and not any(entry.pins for entry in self._entries(namespace)),
+                timeout
+            )
+            if not idle:
+                raise NamespaceBusy(f"Namespace '{namespace}' is still in use; try again shortly")
+            for entry in (self._resident.pop(namespace, None), self._detached.pop(namespace, None)):
+                if entry is not None:
+                    entry.ingest_jobs.clear()
+                    entry.vector_db.clear_collection()
+            path = self._path(namespace)
+            if os.path.exists(path):
+                os.remove(path)
+
+    def stats(self, namespace=None):
+        """
+        Per-namespace size stats for resident namespaces, plus on-disk size for all of them.
+
+        Evicted namespaces are reported by file name only, since their ids aren't kept in memory.
+        """
+        with self._lock:
+            stats = {}
+            for name, entry in self._resident.items():
+                if namespace is not None and name != namespace:
+                    continue
+                path = self._path(name)
+                stats[namespace_filename(name)] = {
+                    "namespace": name,
+                    "resident": True,
+                    "dirty": entry.dirty,
+                    "last_used": entry.last_used,
+                    "disk_bytes": os.path.getsize(path) if os.path.exists(path) else 0,
+                    **entry.vector_db.stats(),
+                }
+            if namespace is not None and not stats and os.path.exists(self._path(namespace)):
+                stats[namespace_filename(namespace)] = {
+                    "namespace": namespace,
+                    "resident": False,
+                    "disk_bytes": os.path.getsize(self._path(namespace)),
+                }
+            if namespace is None:
+                for filename in os.listdir(self.root):
+                    if filename.endswith(".pkl") and filename not in stats:
+                        stats[filename] = {
+                            "namespace": None,
+                            "resident": False,
+                            "disk_bytes": os.path.getsize(os.path.join(self.root, filename)),
+                        }
+            return list(stats.values())
+
+
+@lru_cache(maxsize=None)
+def get_namespace_registry():
+    """Process-wide registry, shared by every Streamlit session and API request."""
+    return NamespaceRegistry()
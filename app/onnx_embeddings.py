@@ -0,0 +1,146 @@
+# app/onnx_embeddings.py
+"""
+ONNX Runtime embedding backend for sentence-transformers models (all-MiniLM-L6-v2 by default).
+
+Runtime needs only `onnxruntime` and `tokenizers` (no torch). Exporting the model once
+additionally needs `optimum[exporters]`:
+
+    python -m app.onnx_embeddings --quantize
+"""
+import os
+import argparse
+import numpy as np
+from dotenv import load_dotenv
+from langchain_core.embeddings import Embeddings
+from app.embeddings import EMBEDDING_MODEL_NAME
+
+load_dotenv()
+
+# Where the exported model lives; defaults to models/<model name>-onnx
+ONNX_MODEL_DIR = os.getenv("ONNX_MODEL_DIR")
+ONNX_MAX_LENGTH = int(os.getenv("ONNX_MAX_LENGTH", 256))  # MiniLM's trained window
+ONNX_THREADS = int(os.getenv("ONNX_THREADS", 0))  # 0 = let onnxruntime decide
+FP32_MODEL_FILE = "model.onnx"
+INT8_MODEL_FILE = "model_quantized.onnx"
+# Written by export_onnx_model so a model directory can be matched to the model it holds
+MODEL_NAME_FILE = "model_name.txt"
+
+
+def _hub_id(model_name):
+    return model_name if "/" in model_name else f"sentence-transformers/{model_name}"
+
+
+def default_model_dir(model_name):
+    return ONNX_MODEL_DIR or os.path.join("models", f"{model_name.rsplit('/', 1)[-1]}-onnx")
+
+
+class OnnxEmbeddings(Embeddings):
+    """Mean-pooled, L2-normalised sentence embeddings from an exported ONNX model; same interface as HuggingFaceEmbeddings."""
+
+    def __init__(self, model_name=EMBEDDING_MODEL_NAME, model_dir=None, quantized=False, batch_size=64,
+                 max_length=ONNX_MAX_LENGTH):
+        model_dir = model_dir or default_model_dir(model_name)
+        model_path = os.path.join(model_dir, INT8_MODEL_FILE if quantized else FP32_MODEL_FILE)
+        if not os.path.exists(model_path):
+            raise FileNotFoundError(
+                f"ONNX model not found at {model_path}; export it with `python -m app.onnx_embeddings --model {model_name}`"
+            )
+        exported = _exported_model_name(model_dir)
+        if exported is not None and exported != _hub_id(model_name):
+            raise ValueError(f"{model_dir} holds an export of {exported}, not {_hub_id(model_name)}")
+        self.model_name = model_name
+
+        try:
+            import onnxruntime as ort
+            from tokenizers import Tokenizer
+        except ImportError as e:
+            raise ImportError("The ONNX embedding backend requires `pip install onnxruntime tokenizers`") from e
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if ONNX_THREADS:
+            options.intra_op_num_threads = ONNX_THREADS
+        self.session = ort.InferenceSession(model_path, sess_options=options, providers=["CPUExecutionProvider"])
+        self.input_names = {i.name for i in self.session.get_inputs()}
+
+        self.tokenizer = Tokenizer.from_file(os.path.join(model_dir, "tokenizer.json"))
+        self.tokenizer.enable_truncation(max_length=max_length)
+        self.tokenizer.enable_padding(pad_id=0, pad_token="[PAD]")
+        self.batch_size = batch_size
+
+    def _encode_batch(self, texts):
+        encodings = self.tokenizer.encode_batch(texts)
+        input_ids = np.array([e.ids for e in encodings], dtype=np.int64)
+        attention_mask = np.array([e.attention_mask for e in encodings], dtype=np.int64)
+        feeds = {"input_ids": input_ids, "attention_mask": attention_mask}
+        if "token_type_ids" in self.input_names:
+            feeds["token_type_ids"] = np.zeros_like(input_ids)
+
+        hidden = self.session.run(None, feeds)[0]  # (batch, seq, dim) last_hidden_state
+        mask = attention_mask[..., None].astype(np.float32)
+        pooled = (hidden * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+        return pooled / np.clip(np.linalg.norm(pooled, axis=1, keepdims=True), 1e-12, None)
+
+    def encode(self, texts, batch_size=None, **kwargs):
+        """Embed texts into an (n, dim) float32 array; mirrors SentenceTransformer.encode for BulkEmbedder."""
+        texts = list(texts)
+        if not texts:
+            return np.empty((0, 0), dtype=np.float32)
+        batch_size = batch_size or self.batch_size
+
+        # Batch texts of similar length together so padding stays short, then restore input order
+        order = np.argsort([len(t) for t in texts], kind="stable")
+        vectors = np.vstack([
+            self._encode_batch([texts[i] for i in order[start:start + batch_size]])
+            for start in range(0, len(texts), batch_size)
+        ]).astype(np.float32)
+        result = np.empty_like(vectors)
+        result[order] = vectors
+        return result
+
+    def embed_documents(self, texts):
+        return self.encode(texts).tolist()
+
+    def embed_query(self, text):
+        return self.encode([text])[0].tolist()
+
+
+def _exported_model_name(model_dir):
+    """The hub id recorded by export_onnx_model, or None for directories exported before it recorded one."""
+    path = os.path.join(model_dir, MODEL_NAME_FILE)
+    if not os.path.exists(path):
+        return None
+    with open(path, encoding="utf-8") as f:
+        return f.read().strip()
+
+
+def export_onnx_model(model_name, output_dir=None, quantize=True):
+    """Export a sentence-transformers model to ONNX (plus tokenizer.json), optionally with a dynamic int8 copy."""
+    from optimum.onnxruntime import ORTModelForFeatureExtraction
+    from transformers import AutoTokenizer
+
+    output_dir = output_dir or default_model_dir(model_name)
+    hub_id = _hub_id(model_name)
+    ORTModelForFeatureExtraction.from_pretrained(hub_id, export=True).save_pretrained(output_dir)
+    AutoTokenizer.from_pretrained(hub_id).save_pretrained(output_dir)
+    with open(os.path.join(output_dir, MODEL_NAME_FILE), "w", encoding="utf-8") as f:
+        f.write(hub_id)
+    print(f"Exported {hub_id} to {output_dir}/{FP32_MODEL_FILE}")
+
+    if quantize:
+        from onnxruntime.quantization import quantize_dynamic, QuantType
+        quantize_dynamic(
+            os.path.join(output_dir, FP32_MODEL_FILE),
+            os.path.join(output_dir, INT8_MODEL_FILE),
+            weight_type=QuantType.QInt8,
+        )
+        print(f"Wrote int8-quantized model to {output_dir}/{INT8_MODEL_FILE}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export the embedding model to ONNX")
+    parser.add_argument("--model", default=EMBEDDING_MODEL_NAME)
+    parser.add_argument("--output", help="Output directory (default: ONNX_MODEL_DIR or models/<model>-onnx)")
+    parser.add_argument("--quantize", action="store_true", help="Also write a dynamic int8 model")
+    args = parser.parse_args()
+    export_onnx_model(args.model, args.output, args.quantize)
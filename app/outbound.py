@@ -0,0 +1,251 @@
+# app/outbound.py
+"""
+Bulk first-touch opener generation for the leads in a namespace's lead store.
+
+    python -m app.outbound --namespace alice@example.com --output openers.jsonl
+
+Each lead gets the stage-1 chat prompt (`chat_messages`) with FAQ context retrieved for that lead. LLM calls
+run with bounded concurrency under a requests-per-minute limit, and every opener is appended
+to the output (JSONL or CSV) as soon as it is generated. The output doubles as the checkpoint:
+re-running with the same output skips leads already written, so an interrupted run resumes
+where it stopped. Failed leads are logged and retried on the next run.
+"""
+import os
+import csv
+import json
+import time
+import asyncio
+import hashlib
+import logging
+import argparse
+from dotenv import load_dotenv
+from app.chatbot import chat_messages, get_llm
+from app.prompt_cache import prefix_cache
+from app.prompts import outbound_opener_input
+from app.retriever import faq_context, get_faq_vectorstore
+from app.embeddings import get_bulk_embedder
+from app.namespaces import get_namespace_registry
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+OUTBOUND_CONCURRENCY = int(os.getenv("OUTBOUND_CONCURRENCY", 16))
+OUTBOUND_REQUESTS_PER_MINUTE = float(os.getenv("OUTBOUND_REQUESTS_PER_MINUTE", 600))
+OUTBOUND_MAX_RETRIES = int(os.getenv("OUTBOUND_MAX_RETRIES", 3))
+OUTBOUND_CONTEXT_TOKENS = int(os.getenv("OUTBOUND_CONTEXT_TOKENS", 300))
+# Leads whose FAQ context is embedded and retrieved together
+OUTBOUND_LEAD_BATCH = 256
+
+OUTPUT_FIELDS = ["lead_id", "lead", "opener", "generated_at"]
+
+
+def lead_id(text):
+    """Stable id for a lead, independent of import order, used to resume."""
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()[:16]
+
+
+class RateLimiter:
+    """Spaces calls evenly so no more than `per_minute` start in any minute."""
+
+    def __init__(self, per_minute):
+        self.interval = 60.0 / per_minute if per_minute else 0.0
+        self._next = 0.0
+        self._lock = asyncio.Lock()
+
+    async def wait(self):
+        if not self.interval:
+            return
+        async with self._lock:
+            now = asyncio.get_running_loop().time()
+            delay = self._next - now
+            self._next = max(now, self._next) + self.interval
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+
+class OpenerWriter:
+    """Appends results to a JSONL or CSV file, flushing each one so a crash loses at most the row in flight."""
+
+    def __init__(self, path):
+        self.path = path
+        self.format = "csv" if path.endswith(".csv") else "jsonl"
+
+    def completed_ids(self):
+        """Ids of leads already written by an earlier run."""
+        if not os.path.exists(self.path):
+            return set()
+        done = set()
+        with open(self.path, newline="", encoding="utf-8") as f:
+            if self.format == "csv":
+                for row in csv.DictReader(f):
+                    if row.get("lead_id") and row.get("generated_at"):
+                        done.add(row["lead_id"])
+            else:
+                for line in f:
+                    try:
+                        done.add(json.loads(line)["lead_id"])
+                    except (ValueError, KeyError):
+                        continue  # a line cut short by a crash; that lead is regenerated
+        return done
+
+    def __enter__(self):
+        new_file = not os.path.exists(self.path) or os.path.getsize(self.path) == 0
+        self._file = open(self.path, "a", newline="", encoding="utf-8")
+        if self.format == "csv":
+            self._csv = csv.DictWriter(self._file, fieldnames=OUTPUT_FIELDS)
+            if new_file:
+                self._csv.writeheader()
+        return self
+
+    def write(self, record):
+        if self.format == "csv":
+            self._csv.writerow(record)
+        else:
+            self._file.write(json.dumps(record, ensure_ascii=False) + "\n")
+        self._file.flush()
+
+    def __exit__(self, exc_type, exc, tb):
+        self._file.close()
+
+
+class OutboundRun:
+    """
+    One opener-generation pass over a namespace's leads.
+
+    Progress counters (`total`, `skipped`, `generated`, `failed`) are updated as the run goes,
+    so an API can report them while it runs; `cancel()` stops it after the calls in flight.
+    """
+
+    def __init__(self, namespace, output_path, concurrency=OUTBOUND_CONCURRENCY,
+                 requests_per_minute=OUTBOUND_REQUESTS_PER_MINUTE, max_retries=OUTBOUND_MAX_RETRIES, limit=None):
+        self.namespace = namespace
+        self.output_path = output_path
+        self.concurrency = concurrency
+        self.rate_limiter = RateLimiter(requests_per_minute)
+        self.max_retries = max_retries
+        self.limit = limit
+        self.status = "pending"
+        self.total = self.skipped = self.generated = self.failed = 0
+        self.started_at = self.finished_at = None
+        self._cancelled = False
+
+    def cancel(self):
+        self._cancelled = True
+
+    def progress(self):
+        elapsed = (self.finished_at or time.time()) - self.started_at if self.started_at else 0.0
+        return {
+            "namespace": self.namespace, "status": self.status, "output": self.output_path,
+            "total": self.total, "skipped": self.skipped, "generated": self.generated, "failed": self.failed,
+            "elapsed": round(elapsed, 1),
+            "leads_per_hour": round(self.generated / elapsed * 3600) if elapsed else 0,
+        }
+
+    def _pending_leads(self, done):
+        """Leads of the namespace not yet in the output, capped at `limit`."""
+        leads = []
+        with get_namespace_registry().use(self.namespace) as vector_db:
+            for _, text, _ in vector_db.iter_leads():
+                self.total += 1
+                key = lead_id(text)
+                if key in done:
+                    self.skipped += 1
+                    continue
+                leads.append((key, text))
+                if self.limit and len(leads) >= self.limit:
+                    break
+        return leads
+
+    def _build_prompts(self, batch):
+        """Stage-1 chat messages for a batch of (lead_id, text), embedding the leads for FAQ retrieval in one call."""
+        vectors = get_bulk_embedder().embed_documents([text for _, text in batch])
+        return [
+            (key, text, chat_messages(
+                1, [], outbound_opener_input.format(lead=text),
+                faq_context(text, token_budget=OUTBOUND_CONTEXT_TOKENS, query_vector=vector)
+            ))
+            for (key, text), vector in zip(batch, vectors)
+        ]
+
+    async def _generate(self, llm, messages):
+        for attempt in range(self.max_retries + 1):
+            await self.rate_limiter.wait()
+            try:
+                response = await llm.ainvoke(messages)
+                prefix_cache.record_response(response)
+                return response.content.strip()
+            except Exception as e:
+                if attempt == self.max_retries:
+                    raise
+                delay = 2 ** attempt
+                logger.warning("Opener generation failed (%s); retrying in %ds", str(e), delay)
+                await asyncio.sleep(delay)
+
+    async def _worker(self, llm, queue, writer):
+        while True:
+            item = await queue.get()
+            if item is None:
+                return
+            key, text, messages = item
+            if self._cancelled:
+                continue
+            try:
+                opener = await self._generate(llm, messages)
+            except Exception as e:
+                self.failed += 1
+                logger.error("Giving up on lead %s: %s", key, str(e))
+                continue
+            writer.write({"lead_id": key, "lead": text, "opener": opener, "generated_at": time.time()})
+            self.generated += 1
+
+    async def run(self, llm=None):
+        if llm is None:
+            llm = get_llm()
+        self.status, self.started_at = "running", time.time()
+        writer = OpenerWriter(self.output_path)
+        try:
+            await asyncio.to_thread(get_faq_vectorstore)
+            leads = await asyncio.to_thread(self._pending_leads, writer.completed_ids())
+            logger.info("Outbound run for '%s': %d leads, %d already done, %d to generate",
+                        self.namespace, self.total, self.skipped, len(leads))
+
+            # A bounded queue keeps prompt building just ahead of the LLM calls
+            queue = asyncio.Queue(maxsize=self.concurrency * 4)
+            with writer:
+                workers = [asyncio.create_task(self._worker(llm, queue, writer)) for _ in range(self.concurrency)]
+                for start in range(0, len(leads), OUTBOUND_LEAD_BATCH):
+                    if self._cancelled:
+                        break
+                    for item in await asyncio.to_thread(self._build_prompts, leads[start:start + OUTBOUND_LEAD_BATCH]):
+                        await queue.put(item)
+                for _ in workers:
+                    await queue.put(None)
+                await asyncio.gather(*workers)
+            self.status = "cancelled" if self._cancelled else "done"
+        except Exception as e:
+            logger.error("Outbound run for '%s' failed: %s", self.namespace, str(e))
+            self.status = "failed"
+            raise
+        finally:
+            self.finished_at = time.time()
+            logger.info("Outbound run for '%s' %s: %s", self.namespace, self.status, self.progress())
+        return self.progress()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate first-touch openers for a namespace's leads")
+    parser.add_argument("--namespace", required=True, help="Tenant/user id whose leads to use")
+    parser.add_argument("--output", required=True, help="Output .jsonl or .csv; re-run with the same file to resume")
+    parser.add_argument("--concurrency", type=int, default=OUTBOUND_CONCURRENCY)
+    parser.add_argument("--requests-per-minute", type=float, default=OUTBOUND_REQUESTS_PER_MINUTE)
+    parser.add_argument("--limit", type=int, help="Generate at most this many openers")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+    outbound = OutboundRun(args.namespace, args.output, args.concurrency, args.requests_per_minute, limit=args.limit)
+    print(json.dumps(asyncio.run(outbound.run()), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+# app/pdf_ingest.py
+import io
+import os
+import time
+import logging
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeoutError
+import PyPDF2
+from dotenv import load_dotenv
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+PDF_MAX_PAGES = int(os.getenv("PDF_MAX_PAGES", 200))
+PDF_MAX_SECONDS = float(os.getenv("PDF_MAX_SECONDS", 60))
+PDF_WORKERS = int(os.getenv("PDF_WORKERS", min(4, os.cpu_count() or 1)))
+PDF_PAGES_PER_TASK = int(os.getenv("PDF_PAGES_PER_TASK", 8))
+
+# Per-process reader, parsed once by the pool initializer rather than once per task
+_worker_reader = None
+
+
+def _init_worker(pdf_bytes):
+    global _worker_reader
+    _worker_reader = PyPDF2.PdfReader(io.BytesIO(pdf_bytes))
+
+
+def _extract_page_range(start, stop):
+    pages = []
+    for i in range(start, stop):
+        try:
+            pages.append((i, _worker_reader.pages[i].extract_text() or ""))
+        except Exception as e:
+            print(f"Error extracting text from PDF page {i + 1}: {e}")
+            pages.append((i, ""))
+    return pages
+
+
+def _read_bytes(pdf_file):
+    if isinstance(pdf_file, (bytes, bytearray)):
+        return bytes(pdf_file)
+    if isinstance(pdf_file, str):
+        with open(pdf_file, "rb") as f:
+            return f.read()
+    if hasattr(pdf_file, "seek"):
+        pdf_file.seek(0)
+    return pdf_file.read()
+
+
+def iter_pdf_pages(pdf_file, max_pages=PDF_MAX_PAGES, max_seconds=PDF_MAX_SECONDS,
+                   workers=PDF_WORKERS, pages_per_task=PDF_PAGES_PER_TASK, on_page_count=None):
+    """
+    Yield (page_number, text) for each page of a PDF, in page order.
+
+    Page ranges are extracted in parallel across a process pool. Extraction stops after
+    `max_pages` pages or once `max_seconds` have elapsed, whichever comes first, so one
+    huge document can't stall an upload.
+
+    Args:
+        pdf_file: A path, raw bytes or a file-like object (e.g. a Streamlit upload)
+        max_pages: Maximum number of pages to extract
+        max_seconds: Wall-clock budget for the whole document
+        workers: Number of extraction processes
+        pages_per_task: Pages handed to a worker per task
+        on_page_count: Optional callback receiving the number of pages that will be extracted
+
+    Yields:
+        (page_number, text) tuples with 1-based page numbers
+    """
+    pdf_bytes = _read_bytes(pdf_file)
+    total_pages = len(PyPDF2.PdfReader(io.BytesIO(pdf_bytes)).pages)
+    page_count = min(total_pages, max_pages)
+    if page_count < total_pages:
+        logger.warning("PDF has %d pages; only the first %d will be indexed", total_pages, page_count)
+    if on_page_count:
+        on_page_count(page_count)
+
+    ranges = [(start, min(start + pages_per_task, page_count)) for start in range(0, page_count, pages_per_task)]
+    deadline = time.monotonic() + max_seconds
+
+    # Small documents aren't worth the cost of spawning a pool
+    if workers <= 1 or len(ranges) <= 1:
+        _init_worker(pdf_bytes)
+        for start, stop in ranges:
+            if time.monotonic() > deadline:
+                logger.warning("PDF extraction hit the %.0fs limit at page %d of %d", max_seconds, start + 1, page_count)
+                return
+            for i, text in _extract_page_range(start, stop):
+                yield i + 1, text
+        return
+
+    pool = ProcessPoolExecutor(max_workers=min(workers, len(ranges)), initializer=_init_worker, initargs=(pdf_bytes,))
+    finished = False
+    try:
+        futures = [pool.submit(_extract_page_range, start, stop) for start, stop in ranges]
+        # Consume futures in submission order so pages stream out in document order
+        for (start, _), future in zip(ranges, futures):
+            try:
+                pages = future.result(timeout=max(0.0, deadline - time.monotonic()))
+            except FutureTimeoutError:
+                logger.warning("PDF extraction hit the %.0fs limit at page %d of %d", max_seconds, start + 1, page_count)
+                return
+            for i, text in pages:
+                yield i + 1, text
+        finished = True
+    finally:
+        if finished:
+            pool.shutdown(wait=True)
+        else:
+            _terminate_pool(pool)
+
+
+def _terminate_pool(pool):
+    """
+    Stop a pool we're abandoning (time limit, cancelled import, error downstream).
+
+    Cancelling futures doesn't interrupt a task already running, so a worker stuck on a
+    pathological page would keep burning a CPU after the upload gave up on it.
+    """
+    processes = list((pool._processes or {}).values())
+    for process in processes:
+        process.terminate()
+    pool.shutdown(wait=False, cancel_futures=True)
+    for process in processes:
+        process.join()
@@ -0,0 +1,69 @@
+# app/prompt_cache.py
+"""
+Prefix-cache metrics for chat prompts.
+
+Providers cache a prompt prefix (OpenAI: 1024+ identical leading tokens, kept for a few
+minutes) and local servers reuse the KV cache of a shared prefix, but only if the prefix is
+byte-identical. The rendered system message of every chat prompt, exactly as sent, is hashed
+here: a hash seen again within PROMPT_CACHE_TTL seconds counts as a prefix hit, so a change
+that formats a per-turn value into the system message shows up as a falling hit rate. Cached-token counts the
+provider reports back are added up alongside.
+"""
+import os
+import time
+import hashlib
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+# How long a provider keeps an unused prefix cached; hits older than this are counted as misses
+PROMPT_CACHE_TTL = float(os.getenv("PROMPT_CACHE_TTL", 300))
+
+
+def prefix_hash(text):
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()[:16]
+
+
+class PrefixCacheMetrics:
+    """Thread-safe counters of prefix hits and provider-reported cached prompt tokens."""
+
+    def __init__(self, ttl=PROMPT_CACHE_TTL):
+        self.ttl = ttl
+        self._last_seen = {}
+        self._lock = threading.Lock()
+        self.requests = self.prefix_hits = 0
+        self.prompt_tokens = self.cached_tokens = 0
+
+    def record_prefix(self, text):
+        """Count one prompt whose static prefix is `text`; returns True if it is a likely cache hit."""
+        key = prefix_hash(text)
+        now = time.monotonic()
+        with self._lock:
+            last_seen = self._last_seen.get(key)
+            hit = last_seen is not None and now - last_seen <= self.ttl
+            self._last_seen[key] = now
+            self.requests += 1
+            self.prefix_hits += hit
+        return hit
+
+    def record_response(self, response):
+        """Add the prompt and cached-token counts from a LangChain chat response, when the provider reports them."""
+        usage = getattr(response, "usage_metadata", None) or {}
+        with self._lock:
+            self.prompt_tokens += usage.get("input_tokens", 0)
+            self.cached_tokens += (usage.get("input_token_details") or {}).get("cache_read", 0) or 0
+
+    def stats(self):
+        with self._lock:
+            return {
+                "prompt_requests": self.requests,
+                "prefix_hits": self.prefix_hits,
+                "prefix_hit_rate": round(self.prefix_hits / self.requests, 3) if self.requests else 0.0,
+                "distinct_prefixes": len(self._last_seen),
+                "provider_prompt_tokens": self.prompt_tokens,
+                "provider_cached_tokens": self.cached_tokens,
+            }
+
+
+prefix_cache = PrefixCacheMetrics()
@@ -0,0 +1,233 @@
+# app/rescore.py
+"""
+Bulk re-scoring of stored conversations after a change to `calculate_lead_score` or the stage prompt.
+
+    python -m app.rescore --checkpoint data/rescore/checkpoint.json
+
+Conversations are streamed from Mongo in `_id` order through an aggregation cursor that
+carries only the last RESCORE_HISTORY_WINDOW messages of each. A conversation whose latest
+user message already has stage and intent labels (saved by chat_with_lead) is re-scored
+from them without any LLM call. Conversations without labels, or every conversation with
+--relabel, are classified with `classify_stage` / `detect_intent` on a bounded thread pool
+under a requests-per-minute limit. A classification that fails is counted as failed and
+left unchanged rather than stored as stage 1. Each batch is written back in one unordered
+bulk write.
+
+After every batch, the last processed `_id` is saved to the checkpoint file, so re-running
+after a crash or cancel resumes after it. A completed pass marks its checkpoint done, and
+the next run starts over from the first conversation. When the pass completes, the "current"
+pipeline snapshot is recounted. Daily rollups record what was seen on the day and are not
+rewritten.
+"""
+import os
+import json
+import time
+import asyncio
+import logging
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+from dotenv import load_dotenv
+from langchain.schema import HumanMessage, AIMessage
+from app.chatbot import classify_stage, detect_intent, calculate_lead_score
+from app.db import conversations_collection, rebuild_pipeline_snapshot
+from app.outbound import RateLimiter
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+RESCORE_BATCH_SIZE = int(os.getenv("RESCORE_BATCH_SIZE", 500))
+RESCORE_CONCURRENCY = int(os.getenv("RESCORE_CONCURRENCY", 16))
+# Each unlabelled conversation costs two LLM calls (stage and intent)
+RESCORE_REQUESTS_PER_MINUTE = float(os.getenv("RESCORE_REQUESTS_PER_MINUTE", 600))
+# Messages of history the classifiers see, matching what a live turn would use
+RESCORE_HISTORY_WINDOW = int(os.getenv("RESCORE_HISTORY_WINDOW", 40))
+RESCORE_CHECKPOINT = os.getenv("RESCORE_CHECKPOINT", "data/rescore/checkpoint.json")
+
+
+def _as_langchain(messages):
+    return [HumanMessage(content=m["message"]) if m["sender"] == "user" else AIMessage(content=m["message"])
+            for m in messages]
+
+
+class RescoreRun:
+    """
+    One re-scoring pass over the conversations collection.
+
+    Counters (`processed`, `reused`, `classified`, `skipped`, `failed`) are updated as the run
+    goes; `cancel()` stops it after the batch in flight, with that batch checkpointed.
+    """
+
+    def __init__(self, checkpoint_path=RESCORE_CHECKPOINT, batch_size=RESCORE_BATCH_SIZE,
+                 concurrency=RESCORE_CONCURRENCY, requests_per_minute=RESCORE_REQUESTS_PER_MINUTE,
+                 relabel=False, limit=None):
+        self.checkpoint_path = checkpoint_path
+        self.batch_size = batch_size
+        self.concurrency = concurrency
+        self.rate_limiter = RateLimiter(requests_per_minute)
+        self.relabel = relabel
+        self.limit = limit
+        self.status = "pending"
+        self.processed = self.reused = self.classified = self.skipped = self.failed = 0
+        self.last_id = None
+        self.started_at = self.finished_at = None
+        self._cancelled = False
+
+    def cancel(self):
+        self._cancelled = True
+
+    def progress(self):
+        elapsed = (self.finished_at or time.time()) - self.started_at if self.started_at else 0.0
+        return {
+            "status": self.status, "last_id": str(self.last_id) if self.last_id else None,
+            "processed": self.processed, "reused": self.reused, "classified": self.classified,
+            "skipped": self.skipped, "failed": self.failed, "elapsed": round(elapsed, 1),
+            "conversations_per_second": round(self.processed / elapsed, 1) if elapsed else 0,
+        }
+
+    def _load_checkpoint(self):
+        """Where to resume: the last `_id` of an interrupted pass, or None to start from the beginning."""
+        if not os.path.exists(self.checkpoint_path):
+            return None
+        from bson import ObjectId
+        with open(self.checkpoint_path) as f:
+            checkpoint = json.load(f)
+        # A finished pass is not resumed: the next run re-scores everything under the current rules
+        if checkpoint.get("status") not in ("running", "cancelled"):
+            return None
+        last_id = checkpoint.get("last_id")
+        return ObjectId(last_id) if last_id else None
+
+    def _save_checkpoint(self):
+        directory = os.path.dirname(self.checkpoint_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        # Write-then-rename so a crash mid-write never leaves a truncated checkpoint
+        tmp_path = f"{self.checkpoint_path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(self.progress(), f)
+        os.replace(tmp_path, self.checkpoint_path)
+
+    def _cursor(self, after):
+        """Conversations after `after` in _id order, each with its message count and last messages only."""
+        pipeline = [{"$match": {"_id": {"$gt": after}}}] if after else []
+        pipeline += [
+            {"$sort": {"_id": 1}},
+            {"$project": {
+                "stage": True, "intent": True, "score": True,
+                "total": {"$size": {"$ifNull": ["$messages", []]}},
+                "messages": {"$slice": [{"$ifNull": ["$messages", []]}, -RESCORE_HISTORY_WINDOW]},
+            }},
+        ]
+        if self.limit:
+            pipeline.append({"$limit": self.limit})
+        return conversations_collection.aggregate(pipeline, allowDiskUse=True, batchSize=self.batch_size)
+
+    async def _classify(self, executor, message, history):
+        loop = asyncio.get_running_loop()
+        await self.rate_limiter.wait()
+        stage_call = loop.run_in_executor(executor, classify_stage, message, history)
+        await self.rate_limiter.wait()
+        intent_call = loop.run_in_executor(executor, detect_intent, message, history)
+        return await stage_call, await intent_call
+
+    async def _rescore(self, executor, slots, conversation):
+        """The UpdateOne for one conversation, or None if it has no user message to score."""
+        from pymongo import UpdateOne
+
+        messages = conversation["messages"]
+        last_user = next((i for i in range(len(messages) - 1, -1, -1) if messages[i]["sender"] == "user"), None)
+        if last_user is None:
+            self.skipped += 1
+            return None
+        message = messages[last_user]
+        update = {"rescored_at": time.time()}
+        if not self.relabel and message.get("stage") is not None and message.get("intent"):
+            stage, intent = message["stage"], message["intent"]
+            self.reused += 1
+        else:
+            async with slots:
+                stage, intent = await self._classify(
+                    executor, message["message"], _as_langchain(messages[:last_user])
+                )
+            self.classified += 1
+            # Position in the full array: the window is the tail of `total` messages
+            position = conversation["total"] - len(messages) + last_user
+            update.update({f"messages.{position}.stage": stage, f"messages.{position}.intent": intent})
+        score = calculate_lead_score(stage, intent)
+        update.update(stage=stage, intent=intent, score=score)
+        return UpdateOne({"_id": conversation["_id"]}, {"$set": update})
+
+    async def _run_batch(self, executor, slots, batch):
+        results = await asyncio.gather(
+            *(self._rescore(executor, slots, conversation) for conversation in batch), return_exceptions=True
+        )
+        writes = []
+        for conversation, result in zip(batch, results):
+            if isinstance(result, Exception):
+                self.failed += 1
+                logger.error("Could not re-score conversation %s: %s", conversation["_id"], str(result))
+            elif result is not None:
+                writes.append(result)
+        if writes:
+            await asyncio.to_thread(conversations_collection.bulk_write, writes, ordered=False)
+        self.processed += len(batch)
+        self.last_id = batch[-1]["_id"]
+        await asyncio.to_thread(self._save_checkpoint)
+        logger.info("Re-scored %d conversations (%d reused, %d classified, %d failed)",
+                    self.processed, self.reused, self.classified, self.failed)
+
+    async def run(self):
+        self.status, self.started_at = "running", time.time()
+        self.last_id = self._load_checkpoint()
+        if self.last_id:
+            logger.info("Resuming re-score after conversation %s", self.last_id)
+        slots = asyncio.Semaphore(self.concurrency)
+        executor = ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="rescore")
+        try:
+            cursor = self._cursor(self.last_id)
+            while not self._cancelled:
+                batch = await asyncio.to_thread(lambda: [c for _, c in zip(range(self.batch_size), cursor)])
+                if not batch:
+                    break
+                await self._run_batch(executor, slots, batch)
+            if self._cancelled:
+                self.status = "cancelled"
+            else:
+                await asyncio.to_thread(rebuild_pipeline_snapshot)
+                self.status = "done"
+            await asyncio.to_thread(self._save_checkpoint)
+        except Exception as e:
+            logger.error("Re-score failed after %s: %s", self.last_id, str(e))
+            self.status = "failed"
+            raise
+        finally:
+            # Drop queued calls, then wait out the ones in flight so none outlives the run
+            await asyncio.to_thread(executor.shutdown, wait=True, cancel_futures=True)
+            self.finished_at = time.time()
+            logger.info("Re-score %s: %s", self.status, self.progress())
+        return self.progress()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Re-score stored conversations with the current scoring rules")
+    parser.add_argument("--checkpoint", default=RESCORE_CHECKPOINT,
+                        help="Progress file; re-run with the same file to resume an interrupted pass")
+    parser.add_argument("--restart", action="store_true", help="Ignore an unfinished checkpoint and start from the beginning")
+    parser.add_argument("--relabel", action="store_true", help="Re-classify stage and intent even where labels are stored")
+    parser.add_argument("--batch-size", type=int, default=RESCORE_BATCH_SIZE)
+    parser.add_argument("--concurrency", type=int, default=RESCORE_CONCURRENCY)
+    parser.add_argument("--requests-per-minute", type=float, default=RESCORE_REQUESTS_PER_MINUTE)
+    parser.add_argument("--limit", type=int, help="Re-score at most this many conversations")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+    if args.restart and os.path.exists(args.checkpoint):
+        os.remove(args.checkpoint)
+    rescore = RescoreRun(args.checkpoint, args.batch_size, args.concurrency, args.requests_per_minute,
+                         relabel=args.relabel, limit=args.limit)
+    print(json.dumps(asyncio.run(rescore.run()), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+# app/retrieval_client.py
+import os
+import hashlib
+from functools import lru_cache
+from types import SimpleNamespace
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Set to e.g. http://127.0.0.1:8765 or unix:///tmp/sdr-retrieval.sock to use the shared retrieval service
+RETRIEVAL_SERVICE_URL = os.getenv("RETRIEVAL_SERVICE_URL")
+
+RETRIEVAL_SERVICE_TIMEOUT = float(os.getenv("RETRIEVAL_SERVICE_TIMEOUT", 10))
+
+
+class RetrievalClient:
+    """HTTP client for app.retrieval_service over TCP (http://host:port) or a Unix socket (unix:///path.sock)."""
+
+    def __init__(self, url, timeout=RETRIEVAL_SERVICE_TIMEOUT):
+        import httpx
+        if url.startswith("unix://"):
+            transport = httpx.HTTPTransport(uds=url[len("unix://"):])
+            self._http = httpx.Client(transport=transport, base_url="http://retrieval", timeout=timeout)
+        else:
+            self._http = httpx.Client(base_url=url, timeout=timeout)
+
+    def _post(self, path, **kwargs):
+        response = self._http.post(path, **kwargs)
+        response.raise_for_status()
+        return response.json()
+
+    def _get(self, path, **kwargs):
+        response = self._http.get(path, **kwargs)
+        response.raise_for_status()
+        return response.json()
+
+    def health(self):
+        return self._get("/health")
+
+    def embed(self, texts):
+        return self._post("/embed", json={"texts": list(texts)})["vectors"]
+
+    def context(self, query, n_results_csv=4, n_results_faq=4, token_budget=None, namespace=None):
+        payload = {"query": query, "n_results_csv": n_results_csv, "n_results_faq": n_results_faq, "namespace": namespace}
+        if token_budget is not None:
+            payload["token_budget"] = token_budget
+        return self._post("/context", json=payload)["context"]
+
+    def search(self, source, query, n_results=4, filters=None, namespace=None):
+        payload = {"query": query, "n_results": n_results, "filters": filters, "namespace": namespace}
+        return self._post(f"/search/{source}", json=payload)["results"]
+
+    def ingest(self, namespace, file_name, data: bytes):
+        return self._post("/ingest", params={"namespace": namespace, "file_name": file_name}, content=data)
+
+    def jobs(self, namespace):
+        return self._get("/jobs", params={"namespace": namespace})["jobs"]
+
+    def cancel_job(self, namespace, job_id):
+        self._post(f"/jobs/{job_id}/cancel", params={"namespace": namespace})
+
+    def retry_job(self, namespace, job_id):
+        self._post(f"/jobs/{job_id}/retry", params={"namespace": namespace})
+
+    def clear(self, namespace):
+        self._post("/clear", params={"namespace": namespace})
+
+    def namespace_stats(self, namespace=None):
+        return self._get("/namespaces", params={"namespace": namespace} if namespace else None)["namespaces"]
+
+
+class RemoteIngestJobs:
+    """IngestJobManager look-alike backed by the retrieval service, so the upload page works in either mode."""
+
+    def __init__(self, client, namespace):
+        self.client = client
+        self.namespace = namespace
+        self._submitted = set()
+
+    def submit(self, file_name, data):
+        # The service dedups by content hash too; this just saves re-uploading bytes every rerun
+        key = hashlib.sha256(data).hexdigest()
+        if key not in self._submitted:
+            self.client.ingest(self.namespace, file_name, data)
+            self._submitted.add(key)
+
+    def jobs(self):
+        return [SimpleNamespace(**job) for job in self.client.jobs(self.namespace)]
+
+    def cancel(self, job_id):
+        self.client.cancel_job(self.namespace, job_id)
+
+    def retry(self, job_id):
+        self.client.retry_job(self.namespace, job_id)
+
+    def has_active_jobs(self):
+        return any(job.status in ("queued", "running") for job in self.jobs())
+
+    def clear(self):
+        self.client.clear(self.namespace)
+        self._submitted = set()
+
+
+@lru_cache(maxsize=None)
+def get_retrieval_client(url=None):
+    return RetrievalClient(url or os.environ["RETRIEVAL_SERVICE_URL"])
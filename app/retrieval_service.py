@@ -0,0 +1,246 @@
+# app/retrieval_service.py
+"""
+Retrieval sidecar: one process owns the embedding model and the FAQ/lead indexes and serves
+embed, search and ingest to any number of app workers.
+
+    uvicorn app.retrieval_service:app --uds /tmp/sdr-retrieval.sock
+    # or: uvicorn app.retrieval_service:app --host 127.0.0.1 --port 8765
+
+Point app workers at it with RETRIEVAL_SERVICE_URL=unix:///tmp/sdr-retrieval.sock.
+"""
+import os
+import asyncio
+import logging
+from contextlib import asynccontextmanager
+from typing import List, Optional
+from dotenv import load_dotenv
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.concurrency import run_in_threadpool
+from pydantic import BaseModel
+from app.embeddings import get_embeddings
+from app.namespaces import NamespaceBusy, get_namespace_registry
+from app.context import CONTEXT_TOKEN_BUDGET
+from app.retriever import build_context, hybrid_search
+from app.knowledge_base import get_knowledge_base
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Concurrent embed requests are coalesced into one model call of up to this many texts...
+EMBED_BATCH_MAX = int(os.getenv("RETRIEVAL_EMBED_BATCH_MAX", 64))
+# ...waiting at most this long for more requests to arrive
+EMBED_BATCH_WAIT_MS = float(os.getenv("RETRIEVAL_EMBED_BATCH_WAIT_MS", 5))
+
+
+class EmbeddingBatcher:
+    """Coalesces concurrent embedding requests into batched forward passes."""
+
+    def __init__(self, embeddings, max_batch=EMBED_BATCH_MAX, max_wait_ms=EMBED_BATCH_WAIT_MS):
+        self.embeddings = embeddings
+        self.max_batch = max_batch
+        self.max_wait = max_wait_ms / 1000
+        self._queue = asyncio.Queue()
+        self._task = None
+
+    def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+
+    async def embed(self, texts):
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((list(texts), future))
+        return await future
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._queue.get()]
+            size = len(batch[0][0])
+            deadline = loop.time() + self.max_wait
+            while size < self.max_batch:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    item = await asyncio.wait_for(self._queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+                batch.append(item)
+                size += len(item[0])
+
+            texts = [text for item_texts, _ in batch for text in item_texts]
+            try:
+                vectors = await loop.run_in_executor(None, self.embeddings.embed_documents, texts)
+            except Exception as e:
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+            offset = 0
+            for item_texts, future in batch:
+                if not future.done():
+                    future.set_result(vectors[offset:offset + len(item_texts)])
+                offset += len(item_texts)
+
+
+class RetrievalState:
+    """Everything the service owns: the shared model, the FAQ index and the per-tenant lead stores."""
+
+    def __init__(self):
+        self.knowledge_base = None
+        self.namespaces = None
+        self.batcher = None
+
+
+state = RetrievalState()
+
+
+@asynccontextmanager
+async def lifespan(app):
+    logger.info("Loading embedding model and indexes...")
+    state.batcher = EmbeddingBatcher(await run_in_threadpool(get_embeddings))
+    state.batcher.start()
+    state.namespaces = get_namespace_registry()
+    state.knowledge_base = await run_in_threadpool(get_knowledge_base)
+    logger.info("Retrieval service ready")
+    yield
+    state.knowledge_base.stop_watching()
+    await state.batcher.stop()
+    await run_in_threadpool(state.namespaces.flush)
+
+
+app = FastAPI(title="AI SDR retrieval service", lifespan=lifespan)
+
+
+class EmbedRequest(BaseModel):
+    texts: List[str]
+
+
+class ContextRequest(BaseModel):
+    query: str
+    namespace: str
+    n_results_csv: int = 4
+    n_results_faq: int = 4
+    token_budget: int = CONTEXT_TOKEN_BUDGET
+
+
+class SearchRequest(BaseModel):
+    query: str
+    namespace: Optional[str] = None
+    n_results: int = 4
+    filters: Optional[dict] = None
+
+
+@app.get("/health")
+def health():
+    faq_db = state.knowledge_base.vector_db
+    return {"status": "ok", "faq_chunks": len(faq_db) if faq_db else 0}
+
+
+@app.get("/faq")
+def faq_stats():
+    return state.knowledge_base.stats()
+
+
+@app.post("/faq/reload")
+async def reload_faq():
+    """Pick up FAQ file changes now instead of at the next poll."""
+    try:
+        reloaded = await run_in_threadpool(state.knowledge_base.reload)
+    except Exception as e:
+        raise HTTPException(status_code=422, detail=f"FAQ reload failed, previous index kept: {e}")
+    return {"reloaded": reloaded, **state.knowledge_base.stats()}
+
+
+@app.post("/embed")
+async def embed(request: EmbedRequest):
+    return {"vectors": await state.batcher.embed(request.texts)}
+
+
+def _with_namespace(namespace, search, *args):
+    """Run `search(vector_db, *args)` with the namespace pinned, so it can't be evicted mid-search."""
+    with state.namespaces.use(namespace) as vector_db:
+        return search(vector_db, *args)
+
+
+@app.post("/context")
+async def context(request: ContextRequest):
+    (query_vector,) = await state.batcher.embed([request.query])
+    text = await run_in_threadpool(
+        _with_namespace, request.namespace, lambda vector_db: build_context(
+            request.query, vector_db, state.knowledge_base.vector_db,
+            request.n_results_csv, request.n_results_faq, request.token_budget, query_vector
+        )
+    )
+    return {"context": text}
+
+
+@app.post("/search/{source}")
+async def search(source: str, request: SearchRequest):
+    if source == "leads":
+        if not request.namespace:
+            raise HTTPException(status_code=400, detail="'namespace' is required to search leads")
+        (query_vector,) = await state.batcher.embed([request.query])
+        results = await run_in_threadpool(
+            _with_namespace, request.namespace, hybrid_search,
+            request.query, request.n_results, request.filters, query_vector
+        )
+        return {"results": results}
+    vector_db = state.knowledge_base.vector_db if source == "faq" else None
+    if vector_db is None:
+        raise HTTPException(status_code=404, detail=f"Unknown or unavailable source '{source}'")
+    (query_vector,) = await state.batcher.embed([request.query])
+    results = await run_in_threadpool(hybrid_search, vector_db, request.query, request.n_results, request.filters, query_vector)
+    return {"results": results}
+
+
+def _job_dict(job):
+    return {
+        "id": job.id, "file_name": job.file_name, "status": job.status, "progress": job.progress,
+        "message": job.message, "elapsed": job.elapsed, "submitted_at": job.submitted_at,
+    }
+
+
+@app.post("/ingest")
+async def ingest(request: Request, namespace: str, file_name: str):
+    """Queue a file for ingestion into a namespace; the raw file bytes are the request body."""
+    data = await request.body()
+    ingest_jobs = await run_in_threadpool(state.namespaces.ingest_jobs, namespace)
+    return _job_dict(ingest_jobs.submit(file_name, data))
+
+
+@app.get("/jobs")
+def jobs(namespace: str):
+    return {"jobs": [_job_dict(job) for job in state.namespaces.ingest_jobs(namespace).jobs()]}
+
+
+@app.post("/jobs/{job_id}/cancel")
+def cancel_job(job_id: str, namespace: str):
+    state.namespaces.ingest_jobs(namespace).cancel(job_id)
+    return {"status": "ok"}
+
+
+@app.post("/jobs/{job_id}/retry")
+def retry_job(job_id: str, namespace: str):
+    job = state.namespaces.ingest_jobs(namespace).retry(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Unknown job '{job_id}'")
+    return _job_dict(job)
+
+
+@app.post("/clear")
+def clear(namespace: str):
+    try:
+        state.namespaces.clear(namespace)
+    except NamespaceBusy as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    return {"status": "ok"}
+
+
+@app.get("/namespaces")
+def namespaces(namespace: Optional[str] = None):
+    return {"namespaces": state.namespaces.stats(namespace)}
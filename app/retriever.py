@@ -1,124 +1,246 @@
 # app/retriever.py
 import os
 import logging
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
-from langchain_community.vectorstores import FAISS
-from langchain_community.embeddings import HuggingFaceEmbeddings
-from langchain_community.document_loaders import TextLoader
-from langchain.text_splitter import CharacterTextSplitter
-import streamlit as st
-from app.vector_db import VectorDB
-from sentence_transformers import SentenceTransformer
+from app.knowledge_base import get_knowledge_base
+from app.namespaces import get_namespace_registry, DEFAULT_NAMESPACE
+from app.embeddings import get_embeddings
+from app.context import assemble_context, CONTEXT_TOKEN_BUDGET
+from app.retrieval_client import RETRIEVAL_SERVICE_URL, get_retrieval_client
 
 load_dotenv()
 
 # Initialize logger
 logger = logging.getLogger(__name__)
 
-# Initialize FAQ vector store (only once)
-def initialize_faq_vectorstore():
-    if "faq_vectorstore" not in st.session_state:
-        logger.info("Starting FAQ vector store initialization...")
+RETRIEVAL_WORKERS = int(os.getenv("RETRIEVAL_WORKERS", 4))
+
+
+def get_faq_vectorstore():
+    """
+    The current FAQ VectorDB, or None if it could not be built.
+
+    The knowledge base swaps in a new index when the FAQ files change, so look it up per query
+    rather than holding on to it.
+    """
+    return get_knowledge_base().vector_db
+
+
+# Rank offset from the original RRF paper; damps the influence of any single list's top hit
+RRF_K = 60
+
+
+def reciprocal_rank_fusion(ranked_lists, k=RRF_K):
+    """Fuse ranked lists of ids into one list of (id, score), best first, by reciprocal rank."""
+    scores = {}
+    for ranked in ranked_lists:
+        for rank, item_id in enumerate(ranked):
+            scores[item_id] = scores.get(item_id, 0.0) + 1.0 / (k + rank + 1)
+    return sorted(scores.items(), key=lambda item: item[1], reverse=True)
+
+
+def hybrid_search(vector_db, query: str, n_results: int, filters=None, query_vector=None):
+    """
+    Run dense and BM25 retrieval over a VectorDB and fuse them with reciprocal rank fusion.
+
+    Returns a dict shaped like VectorDB.query_vector_db, or None if the store is empty.
+    """
+    depth = max(n_results * 4, 10)
+    dense = vector_db.query_vector_db(query_text=query, n_results=depth, filters=filters, query_vector=query_vector)
+    lexical = vector_db.lexical_search(query_text=query, n_results=depth, filters=filters)
+    if dense is None or lexical is None:
+        return None
+
+    by_id = {}
+    for results in (dense, lexical):
+        for row_id, doc, metadata in zip(results["ids"][0], results["documents"][0], results["metadatas"][0]):
+            by_id[row_id] = (doc, metadata)
+    similarities = dict(zip(dense["ids"][0], dense["similarities"][0]))
+    lexical_scores = dict(zip(lexical["ids"][0], lexical["scores"][0]))
+
+    fused = reciprocal_rank_fusion([dense["ids"][0], lexical["ids"][0]])[:n_results]
+    return {
+        "ids": [[row_id for row_id, _ in fused]],
+        "documents": [[by_id[row_id][0] for row_id, _ in fused]],
+        "metadatas": [[by_id[row_id][1] for row_id, _ in fused]],
+        "scores": [[score for _, score in fused]],
+        "similarities": [[similarities.get(row_id) for row_id, _ in fused]],
+        "lexical_scores": [[lexical_scores.get(row_id) for row_id, _ in fused]],
+    }
+
+
+def _result_chunks(results, formatter):
+    """Turn a hybrid_search result into chunk dicts for the context assembler."""
+    if not results or isinstance(results, Exception):
+        return []
+    return [
+        {"text": formatter(i, doc, metadata), "score": score, "similarity": similarity, "lexical_score": lexical_score}
+        for i, (doc, metadata, score, similarity, lexical_score) in enumerate(zip(
+            results["documents"][0], results["metadatas"][0], results["scores"][0],
+            results["similarities"][0], results["lexical_scores"][0]
+        ))
+    ]
+
+
+def _format_faq_chunk(i, doc, metadata):
+    return doc
+
+
+# Chunk bookkeeping added by the splitter; not useful to the LLM
+_HIDDEN_METADATA = {"start_index", "end_index"}
+
+
+def _format_lead_chunk(i, doc, metadata):
+    # Numbered by assemble_context, after irrelevant and duplicate leads are dropped
+    line = doc
+    if metadata:
+        # CSV metadata columns are already part of the row text; only append what isn't
+        metadata_str = " | ".join(
+            f"{k}: {v}" for k, v in metadata.items()
+            if v and k not in _HIDDEN_METADATA and str(v) not in doc
+        )
+        if metadata_str:
+            line += f" ({metadata_str})"
+    return line
+
+
+# FAISS releases the GIL during search, so a thread pool searches indexes truly in parallel
+_search_pool = ThreadPoolExecutor(max_workers=RETRIEVAL_WORKERS, thread_name_prefix="retrieval")
+
+
+def search_indexes(query: str, sources: dict, query_vector=None):
+    """
+    Embed `query` once and search every index in `sources` with that vector in parallel.
+
+    Args:
+        query: The user's input message
+        sources: Maps a source name to a (vector_db, n_results, filters) tuple
+        query_vector: Precomputed embedding of `query`, if the caller already has one
+
+    Returns:
+        A (results_by_source, merged) tuple. `results_by_source` maps each name to its
+        hybrid_search result (None for empty stores); `merged` is a list of
+        (score, source, document, metadata) tuples across all sources, best first.
+    """
+    if not sources:
+        return {}, []
+    if query_vector is None:
+        query_vector = get_embeddings().embed_query(query)
+
+    futures = {
+        name: _search_pool.submit(hybrid_search, vector_db, query, n_results, filters, query_vector)
+        for name, (vector_db, n_results, filters) in sources.items()
+    }
+    results_by_source = {}
+    for name, future in futures.items():
         try:
-            faq_file = "data/company_faq.txt"
-            logger.info(f"Checking if FAQ file exists at: {os.path.abspath(faq_file)}")
-
-            if not os.path.exists(faq_file):
-                raise FileNotFoundError(f"FAQ file not found at {faq_file}")
-            
-            # Load the FAQ document
-            logger.info("Loading FAQ file...")
-            loader = TextLoader(faq_file)
-            docs = loader.load()
-            if not docs or not docs[0].page_content.strip():
-                raise ValueError("FAQ file is empty or contains only whitespace")
-            
-            logger.info("Loaded FAQ document: %s", docs[0].page_content[:100] + "..." if len(docs[0].page_content) > 100 else docs[0].page_content)
-            
-            # Split the document
-            logger.info("Splitting FAQ document...")
-            text_splitter = CharacterTextSplitter(chunk_size=500, chunk_overlap=50)
-            split_docs = text_splitter.split_documents(docs)
-            if not split_docs:
-                raise ValueError("No document chunks created after splitting")
-            logger.info("Split FAQ documents: %s", [doc.page_content[:100] + "..." if len(doc.page_content) > 100 else doc.page_content for doc in split_docs])
-            
-            # Initialize embeddings
-            logger.info("Initializing embeddings...")
-            embeddings = HuggingFaceEmbeddings(
-                model_name="all-MiniLM-L6-v2",
-                model_kwargs={"device": "cpu"}
-            )
-
-            # Create FAISS vector store
-            logger.info("Creating FAISS vector store...")
-            st.session_state.faq_vectorstore = FAISS.from_documents(split_docs, embeddings)
-            logger.info("FAQ vector store initialized successfully")
+            results_by_source[name] = future.result()
         except Exception as e:
-            logger.error(f"Error initializing FAQ vector store: {str(e)}")
-            st.session_state.faq_vectorstore = None
-            raise  # Raise the exception to see the full stack trace in the logs
+            logger.error("Retrieval from '%s' failed for query '%s': %s", name, query, str(e))
+            results_by_source[name] = e
+
+    merged = []
+    for name, results in results_by_source.items():
+        if not results or isinstance(results, Exception):
+            continue
+        for doc, metadata, score in zip(results["documents"][0], results["metadatas"][0], results["scores"][0]):
+            merged.append((score, name, doc, metadata))
+    merged.sort(key=lambda item: item[0], reverse=True)
+    return results_by_source, merged
 
-def retrieve_relevant_chunks(query: str, n_results_csv=2, n_results_faq=2) -> str:
+
+def retrieve_relevant_chunks(query: str, n_results_csv=4, n_results_faq=4, token_budget=CONTEXT_TOKEN_BUDGET,
+                             namespace=None) -> str:
     """
     Retrieve relevant chunks from both the FAQ vector store and CSV vector database.
+
+    When RETRIEVAL_SERVICE_URL is set this is a thin client of the shared retrieval service
+    (app.retrieval_service); otherwise the indexes live in this process. Nothing here depends
+    on Streamlit, so the Streamlit app and the API share it.
     
     Args:
         query: The user's input message
-        n_results_csv: Number of relevant CSV chunks to return (default: 2)
-        n_results_faq: Number of relevant FAQ chunks to return (default: 2)
+        n_results_csv: Maximum number of CSV chunks to consider (default: 4)
+        n_results_faq: Maximum number of FAQ chunks to consider (default: 4)
+        token_budget: Maximum prompt tokens for the combined context
+        namespace: Tenant/user id whose leads are searched (see app.namespaces); DEFAULT_NAMESPACE if omitted
     
     Returns:
         A formatted string containing combined context from FAQ and CSV
     """
-    # Initialize FAQ vector store if not already done
-    initialize_faq_vectorstore()
-    
-    # 1. Retrieve from FAQ (FAISS)
-    faq_context = ""
-    if "faq_vectorstore" in st.session_state and st.session_state.faq_vectorstore is not None:
-        faq_results = st.session_state.faq_vectorstore.similarity_search(query, k=n_results_faq)
-        faq_chunks = [doc.page_content for doc in faq_results]
-        logger.info("Retrieved FAQ chunks for query '%s': %s", query, faq_chunks)
-        faq_context = "FAQ Information:\n" + "\n".join(faq_chunks) if faq_chunks else "No relevant FAQ information found."
-    else:
-        faq_context = "FAQ Information: Not available (vector store not initialized)."
+    if RETRIEVAL_SERVICE_URL:
+        try:
+            return get_retrieval_client().context(query, n_results_csv, n_results_faq, token_budget, namespace=namespace)
+        except Exception as e:
+            logger.error("Retrieval service error for query '%s': %s", query, str(e))
+            return "FAQ Information: Not available (retrieval service unreachable).\n\nLead Information: Not available."
+
+    with get_namespace_registry().use(namespace or DEFAULT_NAMESPACE) as vector_db:
+        return build_context(
+            query, vector_db, get_faq_vectorstore(),
+            n_results_csv=n_results_csv, n_results_faq=n_results_faq, token_budget=token_budget
+        )
+
+
+def faq_context(query: str, n_results_faq=4, token_budget=CONTEXT_TOKEN_BUDGET, query_vector=None) -> str:
+    """Context from the FAQ store alone, e.g. for prompts about a lead rather than from one."""
+    faq_db = get_faq_vectorstore()
+    if faq_db is None:
+        return "FAQ Information: Not available (vector store not initialized)."
+    results = hybrid_search(faq_db, query, n_results_faq, query_vector=query_vector)
+    context, _ = assemble_context([
+        {"name": "faq", "header": "FAQ Information:", "empty": "No relevant FAQ information found.",
+         "chunks": _result_chunks(results, _format_faq_chunk)},
+    ], token_budget=token_budget)
+    return context
+
+
+def build_context(query: str, vector_db, faq_db, n_results_csv=4, n_results_faq=4,
+                  token_budget=CONTEXT_TOKEN_BUDGET, query_vector=None) -> str:
+    """
+    Build the prompt context for `query` from a lead store and an FAQ store.
+
+    Candidates below the relevance threshold are dropped, near-duplicates are removed and
+    the best remaining chunks are packed into `token_budget` tokens (see app.context).
+    """
+    # Pre-filter leads by any lead attributes named in the query
+    filters = vector_db.metadata_index.infer_filters(query)
+    sources = {"leads": (vector_db, n_results_csv, filters)}
+    if faq_db is not None:
+        sources["faq"] = (faq_db, n_results_faq, None)
+    if query_vector is None:
+        query_vector = get_embeddings().embed_query(query)
+    results_by_source, _ = search_indexes(query, sources, query_vector=query_vector)
+
+    # 1. FAQ candidates
+    faq_empty = "No relevant FAQ information found."
+    if faq_db is None:
+        faq_empty = "FAQ Information: Not available (vector store not initialized)."
         logger.warning("FAQ retrieval failed: Vector store not initialized")
-    
-    # 2. Retrieve from CSV (ChromaDB)
-    csv_context = ""
-    if "vector_db" not in st.session_state:
-        st.session_state.vector_db = VectorDB()
-    
-    vector_db = st.session_state.vector_db
+    faq_chunks = _result_chunks(results_by_source.get("faq"), _format_faq_chunk)
+    logger.info("Retrieved FAQ chunks for query '%s': %s", query, [chunk["text"] for chunk in faq_chunks])
 
+    # 2. Lead candidates
+    lead_empty = "Lead Information: No relevant lead information found."
+    lead_chunks = []
     try:
-        # Query the CSV vector database
-        csv_results = vector_db.query_vector_db(query_text=query, n_results=n_results_csv)
-        
-        if csv_results and csv_results.get("documents") and csv_results["documents"][0]:
-            documents = csv_results["documents"][0]
-            metadatas = csv_results["metadatas"][0] if csv_results.get("metadatas") else None
-            
-            context_lines = []
-            for i, doc in enumerate(documents):
-                line = f"Lead {i + 1}: {doc}"
-                if metadatas and metadatas[i]:
-                    metadata_str = " | ".join(f"{k}: {v}" for k, v in metadatas[i].items() if v)
-                    if metadata_str:
-                        line += f" ({metadata_str})"
-                context_lines.append(line)
-            
-            csv_context = "Lead Information:\n" + "\n".join(context_lines)
-            logger.info("Retrieved CSV chunks for query '%s': %s", query, documents)
-        else:
-            csv_context = "Lead Information: No relevant lead information found."
-            logger.info("No CSV chunks retrieved for query '%s'", query)
-    
+        csv_results = results_by_source.get("leads")
+        if isinstance(csv_results, Exception):
+            raise csv_results
+        if filters and not (csv_results and csv_results["documents"][0]):
+            logger.info("No leads matched inferred filters %s; falling back to unfiltered search", filters)
+            csv_results = hybrid_search(vector_db, query, n_results_csv, query_vector=query_vector)
+        lead_chunks = _result_chunks(csv_results, _format_lead_chunk)
+        logger.info("Retrieved CSV chunks for query '%s': %s", query, [chunk["text"] for chunk in lead_chunks])
     except Exception as e:
-        csv_context = f"Lead Information: Error retrieving lead context: {str(e)}"
+        lead_empty = f"Lead Information: Error retrieving lead context: {str(e)}"
         logger.error("CSV retrieval error for query '%s': %s", query, str(e))
-    
-    # Combine both contexts
-    combined_context = f"{faq_context}\n\n{csv_context}"
+
+    # Combine both contexts within the token budget
+    combined_context, _ = assemble_context([
+        {"name": "faq", "header": "FAQ Information:", "empty": faq_empty, "chunks": faq_chunks},
+        {"name": "leads", "header": "Lead Information:", "empty": lead_empty, "chunks": lead_chunks,
+         "prefix": "Lead {n}: "},
+    ], token_budget=token_budget)
     return combined_context
@@ -0,0 +1,172 @@
+# app/text_splitter.py
+import os
+import re
+from functools import lru_cache
+from dotenv import load_dotenv
+from langchain.docstore.document import Document
+from app.embeddings import get_embeddings
+
+load_dotenv()
+
+# all-MiniLM-L6-v2 reads at most 256 tokens including [CLS] and [SEP]; the rest is silently truncated
+CHUNK_TOKENS = int(os.getenv("CHUNK_TOKENS", 250))
+CHUNK_OVERLAP_TOKENS = int(os.getenv("CHUNK_OVERLAP_TOKENS", 25))
+# Sections longer than this are tokenized in paragraph-aligned blocks to bound memory
+SPLIT_BLOCK_CHARS = 50000
+# CSV rows tokenized per encode_batch call
+SPLIT_ROW_BATCH = 1024
+
+_PARAGRAPH_BREAK = re.compile(r"\n[ \t]*\n\s*")
+# A paragraph whose first line is a markdown heading or a short "Label:" line starts a new section
+_HEADER_PATTERN = re.compile(r"^(?:#{1,6}[ \t]+(?P<heading>[^\n]+?)|(?P<label>[^\n.!?]{1,80}):)[ \t]*$")
+_SENTENCE_END = ".!?"
+
+
+def _paragraphs(text):
+    """Yield (start, end) character spans of the blank-line separated paragraphs of `text`."""
+    start = 0
+    for match in _PARAGRAPH_BREAK.finditer(text):
+        if match.start() > start:
+            yield start, match.start()
+        start = match.end()
+    if start < len(text):
+        yield start, len(text)
+
+
+def _header(text, start, end):
+    first_line = text[start:end].split("\n", 1)[0].strip()
+    match = _HEADER_PATTERN.match(first_line)
+    if not match:
+        return None
+    return (match.group("heading") or match.group("label")).strip()
+
+
+class TokenTextSplitter:
+    """
+    Splits text into chunks of at most `chunk_tokens` embedding-model tokens.
+
+    Chunks never cross a section header and prefer to end at a paragraph or sentence
+    break. Each chunk carries its character offsets in the source text (`start_index`,
+    `end_index`) and, for prose, the header of the section it came from (`section`).
+    """
+
+    def __init__(self, tokenizer, chunk_tokens=CHUNK_TOKENS, chunk_overlap=CHUNK_OVERLAP_TOKENS):
+        if chunk_overlap >= chunk_tokens:
+            raise ValueError("chunk_overlap must be smaller than chunk_tokens")
+        self.tokenizer = tokenizer
+        self.chunk_tokens = chunk_tokens
+        self.chunk_overlap = chunk_overlap
+
+    def _break_before(self, text, offsets, start, end):
+        """Token index in (start, end] to end a chunk at: the last paragraph break, else the last sentence end."""
+        sentence_break = None
+        for i in range(end, start + self.chunk_tokens // 2, -1):
+            gap = text[offsets[i - 1][1]:offsets[i][0]]
+            if "\n" in gap:
+                return i
+            if sentence_break is None and gap and text[offsets[i - 1][1] - 1] in _SENTENCE_END:
+                sentence_break = i
+        return sentence_break or end
+
+    def _windows(self, text, offsets):
+        """Yield (start_char, end_char) spans covering `text` in windows of at most `chunk_tokens` tokens."""
+        n = len(offsets)
+        start = 0
+        while start < n:
+            end = min(start + self.chunk_tokens, n)
+            if end < n:
+                end = self._break_before(text, offsets, start, end)
+            yield offsets[start][0], offsets[end - 1][1]
+            if end >= n:
+                return
+            start = max(end - self.chunk_overlap, start + 1)
+            # Don't start a chunk on a word-piece continuation
+            while start < end and offsets[start][0] == offsets[start - 1][1]:
+                start += 1
+
+    def _sections(self, text, section=None):
+        """Yield (start, end, header) blocks of `text`, split at headers and capped at SPLIT_BLOCK_CHARS."""
+        block_start = block_end = None
+        for start, end in _paragraphs(text):
+            header = _header(text, start, end)
+            if block_start is not None and (header or end - block_start > SPLIT_BLOCK_CHARS):
+                yield block_start, block_end, section
+                block_start = None
+            if header:
+                section = header
+            if block_start is None:
+                block_start = start
+            block_end = end
+            # A single paragraph too long for one block is cut at whitespace
+            while block_end - block_start > SPLIT_BLOCK_CHARS:
+                cut = text.rfind(" ", block_start, block_start + SPLIT_BLOCK_CHARS)
+                cut = cut if cut > block_start else block_start + SPLIT_BLOCK_CHARS
+                yield block_start, cut, section
+                block_start = cut
+        if block_start is not None:
+            yield block_start, block_end, section
+
+    def split_text(self, text, metadata=None, section=None):
+        """
+        Yield Documents for `text`, one section block at a time.
+
+        Args:
+            text: The text to split
+            metadata: Metadata copied onto every chunk
+            section: Header in effect before the first header in `text` (e.g. from the previous PDF page)
+        """
+        for block_start, block_end, header in self._sections(text, section):
+            block = text[block_start:block_end]
+            offsets = self.tokenizer.encode(block, add_special_tokens=False).offsets
+            for start, end in self._windows(block, offsets):
+                chunk_metadata = dict(metadata or {})
+                chunk_metadata.update(start_index=block_start + start, end_index=block_start + end)
+                if header:
+                    chunk_metadata["section"] = header
+                yield Document(page_content=block[start:end], metadata=chunk_metadata)
+
+    def split_rows(self, texts, metadatas=None, keys=None):
+        """
+        Yield (Document, key) pairs for short texts such as CSV rows, tokenizing SPLIT_ROW_BATCH rows at a time.
+
+        Rows that fit in one chunk (nearly all lead rows) become a single Document; `key` is
+        the row's entry in `keys`, or None.
+        """
+        for batch_start in range(0, len(texts), SPLIT_ROW_BATCH):
+            batch = texts[batch_start:batch_start + SPLIT_ROW_BATCH]
+            encodings = self.tokenizer.encode_batch(batch, add_special_tokens=False)
+            for i, (text, encoding) in enumerate(zip(batch, encodings), start=batch_start):
+                metadata = metadatas[i] if metadatas and i < len(metadatas) else None
+                key = keys[i] if keys is not None else None
+                for start, end in self._windows(text, encoding.offsets):
+                    chunk_metadata = dict(metadata or {})
+                    chunk_metadata.update(start_index=start, end_index=end)
+                    yield Document(page_content=text[start:end], metadata=chunk_metadata), key
+
+    def count_tokens(self, text):
+        return len(self.tokenizer.encode(text, add_special_tokens=False).ids)
+
+
+def embedding_tokenizer(embeddings=None):
+    """
+    A `tokenizers.Tokenizer` matching the embedding model, with truncation and padding off.
+
+    Works for both backends: SentenceTransformer exposes a fast HF tokenizer, OnnxEmbeddings
+    a `tokenizers.Tokenizer` directly.
+    """
+    from tokenizers import Tokenizer
+
+    embeddings = embeddings or get_embeddings()
+    model = getattr(embeddings, "client", embeddings)
+    tokenizer = getattr(model.tokenizer, "backend_tokenizer", model.tokenizer)
+    # Copy so turning truncation off doesn't affect the model's own encoding
+    tokenizer = Tokenizer.from_str(tokenizer.to_str())
+    tokenizer.no_truncation()
+    tokenizer.no_padding()
+    return tokenizer
+
+
+@lru_cache(maxsize=None)
+def get_text_splitter(chunk_tokens=CHUNK_TOKENS, chunk_overlap=CHUNK_OVERLAP_TOKENS):
+    """Process-wide splitter sized to the embedding model's window."""
+    return TokenTextSplitter(embedding_tokenizer(), chunk_tokens, chunk_overlap)
@@ -0,0 +1,38 @@
+# app/tokens.py
+from functools import lru_cache
+
+# gpt-3.5-turbo (and the OpenRouter models we use) tokenize with cl100k_base
+TOKENIZER_ENCODING = "cl100k_base"
+
+
+@lru_cache(maxsize=None)
+def get_tokenizer():
+    """The tiktoken encoding, loaded on first use (loading it can mean a download)."""
+    import tiktoken
+    return tiktoken.get_encoding(TOKENIZER_ENCODING)
+
+
+def count_tokens(text: str) -> int:
+    """Number of model tokens in `text`."""
+    return len(get_tokenizer().encode(text)) if text else 0
+
+
+# Tokens a message adds to a rendered history beyond its content: the "User: "/"AI: " prefix and newline
+MESSAGE_OVERHEAD_TOKENS = 3
+
+
+@lru_cache(maxsize=256)
+def count_template_tokens(text: str) -> int:
+    """count_tokens for static prompt text (system prompts, template scaffolding), tokenized once per process."""
+    return count_tokens(text)
+
+
+def message_tokens(message) -> int:
+    """Tokens in a chat message's content, using the count stored with it by save_message when there is one."""
+    stored = getattr(message, "additional_kwargs", {}).get("tokens")
+    return stored if stored is not None else count_tokens(message.content)
+
+
+def history_tokens(history: list) -> int:
+    """Tokens of a history as rendered into a prompt, summed from per-message counts."""
+    return sum(message_tokens(message) + MESSAGE_OVERHEAD_TOKENS for message in history)
@@ -1,29 +1,117 @@
 # app/vector_db.py
 
 import pandas as pd
+import numpy as np
 import os
-import PyPDF2
+import pickle
+import threading
+import faiss
+from contextlib import contextmanager
 from dotenv import load_dotenv
 from langchain_community.vectorstores import FAISS
-from langchain_community.embeddings import HuggingFaceEmbeddings
 from langchain_community.document_loaders import TextLoader
 from langchain.docstore.document import Document
-from langchain.text_splitter import CharacterTextSplitter
+from app.embeddings import get_embeddings, get_bulk_embedder
+from app.text_splitter import get_text_splitter
+from app.pdf_ingest import iter_pdf_pages
+from app.index_factory import maybe_upgrade_index, filtered_search_params, configure_search, enable_reconstruct
+from app.metadata_index import MetadataIndex, split_metadata_columns
+from app.lexical_index import BM25Index
+from app.dedup import LeadDeduplicator
 
 load_dotenv()
 
+# Comma-separated CSV columns indexed as filterable lead metadata, e.g. "industry,country,employees".
+# Nothing is indexed unless listed here or passed to create_vector_db_from_csv.
+LEAD_METADATA_COLUMNS = [col.strip() for col in os.getenv("LEAD_METADATA_COLUMNS", "").split(",") if col.strip()]
+
+
+class IngestCancelled(Exception):
+    """Raised from an ingestion progress callback to stop ingesting between batches."""
+
+
+def _unit_rows(vectors):
+    """Vectors as a float32 array of L2-normalized rows."""
+    vectors = np.array(vectors, dtype="float32", ndmin=2)
+    faiss.normalize_L2(vectors)
+    return vectors
+
+
+class _ReadWriteLock:
+    """
+    Any number of readers or one writer. The writer may re-enter and read; waiting writers
+    hold off new readers so a steady stream of queries can't starve ingestion.
+    """
+
+    def __init__(self):
+        self._cond = threading.Condition(threading.Lock())
+        self._readers = 0
+        self._writer = None
+        self._writer_depth = 0
+        self._waiting_writers = 0
+
+    @contextmanager
+    def read(self):
+        me = threading.get_ident()
+        with self._cond:
+            shared = self._writer != me
+            if shared:
+                self._cond.wait_for(lambda: self._writer is None and not self._waiting_writers)
+                self._readers += 1
+        try:
+            yield
+        finally:
+            if shared:
+                with self._cond:
+                    self._readers -= 1
+                    if not self._readers:
+                        self._cond.notify_all()
+
+    @contextmanager
+    def write(self):
+        me = threading.get_ident()
+        with self._cond:
+            if self._writer != me:
+                self._waiting_writers += 1
+                self._cond.wait_for(lambda: self._writer is None and not self._readers)
+                self._waiting_writers -= 1
+                self._writer = me
+            self._writer_depth += 1
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._writer_depth -= 1
+                if not self._writer_depth:
+                    self._writer = None
+                    self._cond.notify_all()
+
+
 class VectorDB:
     def __init__(self):
         print("Initializing new FAISS-based VectorDB instance...")
 
-        # Initialize embeddings
-        self.embeddings = HuggingFaceEmbeddings(
-            model_name="all-MiniLM-L6-v2",
-            model_kwargs={"device": "cpu"}
-        )
+        # Embedding model and bulk embedder are shared by every VectorDB in the process
+        self.embeddings = get_embeddings()
+        self.bulk_embedder = get_bulk_embedder()
+        # Chunks by embedding-model tokens so no chunk overflows the model's window
+        self.text_splitter = get_text_splitter()
 
         # Initialize an empty FAISS store
         self.vectorstore = None
+        # Categorical/numeric metadata indexes used to pre-filter searches
+        self.metadata_index = MetadataIndex()
+        # BM25 index over the same row ids, for exact names/companies/emails dense vectors miss
+        self.lexical_index = BM25Index()
+        # Canonical lead rows seen so far, and the FAISS row ids each canonical lead was indexed under
+        self.deduplicator = LeadDeduplicator()
+        self._lead_rows = {}
+        self.last_dedup_report = None
+        # Bumped on every write, so owners can tell whether the store changed since it was last saved
+        self.version = 0
+        # Ingestion may run on a background job thread while chat threads query; queries share
+        # the read side, so FAISS and BM25 searches on one store run in parallel
+        self._lock = _ReadWriteLock()
         print("FAISS VectorDB initialized (empty)")
 
     def extract_chunks_from_csv(self, df):
@@ -33,11 +121,7 @@ class VectorDB:
     def extract_text_from_pdf(self, pdf_file):
         """Extract text from a PDF file."""
         try:
-            reader = PyPDF2.PdfReader(pdf_file)
-            text = ""
-            for page in reader.pages:
-                text += page.extract_text() or ""
-            return text.strip()
+            return "".join(text for _, text in iter_pdf_pages(pdf_file)).strip()
         except Exception as e:
             print(f"Error extracting text from PDF: {e}")
             return ""
@@ -50,77 +134,396 @@ class VectorDB:
             print(f"Error reading text from TXT: {e}")
             return ""
 
-    def _split_text_into_documents(self, text_list, metadatas=None, chunk_size=1000, chunk_overlap=100):
-        """Split text into smaller documents with optional metadata."""
-        text_splitter = CharacterTextSplitter(chunk_size=chunk_size, chunk_overlap=chunk_overlap)
-        documents = []
+    def _split_text_into_documents(self, text_list, metadatas=None, row_keys=None):
+        """
+        Split short texts (CSV rows) into token-sized documents with optional metadata.
 
-        for i, text in enumerate(text_list):
-            splits = text_splitter.create_documents([text])
-            for doc in splits:
-                if metadatas and i < len(metadatas):
-                    doc.metadata = metadatas[i]
-                documents.append(doc)
+        If `row_keys` is given, also returns the key of the source text for each document.
+        """
+        documents = []
+        document_keys = []
+        for doc, key in self.text_splitter.split_rows(text_list, metadatas, row_keys):
+            documents.append(doc)
+            document_keys.append(key)
 
+        if row_keys is not None:
+            return documents, document_keys
         return documents
 
-    def create_vector_db_from_csv(self, df, metadata_cols=None):
-        """Create FAISS vectorstore from CSV dataframe."""
-        chunks = self.extract_chunks_from_csv(df)
+    def create_vector_db_from_csv(self, df, metadata_cols=None, progress=None):
+        """
+        Add CSV dataframe rows to the FAISS vectorstore, indexing `metadata_cols` (default:
+        LEAD_METADATA_COLUMNS) as filterable metadata; numeric columns get range filters.
+
+        Exact and near-duplicate lead rows (within this file and against earlier imports) are
+        collapsed into one canonical row before indexing.
+        """
+        if metadata_cols is None:
+            metadata_cols = LEAD_METADATA_COLUMNS
+        missing = [col for col in metadata_cols if col not in df.columns]
+        if missing:
+            print(f"Metadata columns not in this CSV, skipped: {missing}")
+        metadata_cols = [col for col in metadata_cols if col in df.columns]
+        # Column types come from the whole upload, which still has rows when every lead is a duplicate
+        categorical_cols, numeric_cols = split_metadata_columns(df, metadata_cols)
+        df, row_keys, merges, report = self.deduplicator.deduplicate(df)
+        self.last_dedup_report = report
+        print(
+            f"Dedup: {report['rows_in']} rows -> {report['rows_indexed']} new leads "
+            f"({report['exact_duplicates']} exact, {report['near_duplicates']} near duplicates, "
+            f"ratio {report['dedup_ratio']:.1%})"
+        )
+        chunks = self.extract_chunks_from_csv(df) if len(df) else []
 
         metadatas = None
-        if metadata_cols and all(col in df.columns for col in metadata_cols):
-            metadatas = df[metadata_cols].to_dict('records')
+        if metadata_cols:
+            # NaN -> None so missing values are neither indexed nor shown in the prompt
+            metadatas = df[metadata_cols].astype(object).where(df[metadata_cols].notna(), None).to_dict('records')
+        with self._lock.write():
+            # Register first, so fields merged into earlier leads are indexed too
+            self.metadata_index.register_columns(categorical_cols, numeric_cols)
+            self._merge_lead_metadata(merges, metadata_cols)
 
         print("Splitting CSV data into documents...")
-        documents = self._split_text_into_documents(chunks, metadatas=metadatas)
+        documents, document_keys = self._split_text_into_documents(chunks, metadatas=metadatas, row_keys=row_keys)
 
         if not documents:
-            print("No documents created from CSV data")
-            return False
+            print("No new documents created from CSV data")
+            return bool(merges)
 
-        print("Creating FAISS vectorstore from CSV data...")
-        self.vectorstore = FAISS.from_documents(documents, self.embeddings)
-        print("FAISS vectorstore created from CSV data")
+        print("Adding CSV data to FAISS vectorstore...")
+        appended = 0
+
+        def record_leads(first_id, count):
+            # Leads are registered batch by batch, so a cancelled import knows which ones reached the index
+            nonlocal appended
+            with self._lock.write():
+                for offset, key in enumerate(document_keys[appended:appended + count]):
+                    self._lead_rows.setdefault(key, []).append(first_id + offset)
+            appended += count
+
+        try:
+            self.add_documents(documents, progress=progress, on_append=record_leads)
+        except Exception:
+            # Forget leads that never reached the index, so importing the file again indexes them
+            self.deduplicator.forget(set(document_keys) - set(self._lead_rows))
+            raise
+        print("CSV data added to FAISS vectorstore")
         return True
 
-    def create_vector_db_from_text(self, text, source_name="text_file"):
-        """Store text content in the vectorstore."""
+    def _reset_leads(self):
+        self.deduplicator.clear()
+        self._lead_rows = {}
+
+    def _merge_lead_metadata(self, merges, metadata_cols):
+        """Fill empty metadata fields of already-indexed leads from their newly imported duplicates."""
+        if not merges or not metadata_cols or self.vectorstore is None:
+            return
+        for key, fields in merges.items():
+            for row_id in self._lead_rows.get(key, []):
+                doc = self._get_document(row_id)
+                added = {
+                    col: value for col, value in fields.items()
+                    if col in metadata_cols and not doc.metadata.get(col) and not pd.isna(value)
+                }
+                if added:
+                    doc.metadata.update(added)
+                    self.metadata_index.add([row_id], [added])
+                    self.version += 1
+
+    def create_vector_db_from_text(self, text, source_name="text_file", progress=None, skip=0):
+        """
+        Add text content to the vectorstore.
+
+        `skip` drops that many leading chunks, e.g. the ones a cancelled import already indexed.
+        """
         if not text:
             return False
 
         print("Splitting text into documents...")
-        documents = self._split_text_into_documents([text])
+        documents = list(self.text_splitter.split_text(text, metadata={"source": source_name}))[skip:]
 
         if not documents:
             print("No documents created from text")
             return False
 
-        print(f"Creating FAISS vectorstore from {source_name} text...")
-        self.vectorstore = FAISS.from_documents(documents, self.embeddings)
-        print("FAISS vectorstore created from text data")
+        print(f"Adding {source_name} text to FAISS vectorstore...")
+        self.add_documents(documents, progress=progress)
+        print("Text data added to FAISS vectorstore")
+        return True
+
+    def create_vector_db_from_pdf(self, pdf_file, source_name="pdf_file", docs_per_batch=256, progress=None, skip=0):
+        """
+        Stream page-level chunks of a PDF into the vectorstore, tagged with source and page.
+
+        `skip` drops that many leading chunks, e.g. the ones a cancelled import already indexed.
+        """
+        print(f"Adding {source_name} pages to FAISS vectorstore...")
+        pending = []
+        added = 0
+        page_count = 0
+        section = None
+
+        def set_page_count(n):
+            nonlocal page_count
+            page_count = n
+
+        def flush(page_number):
+            self.add_documents(pending)
+            if progress:
+                progress(page_number / max(page_count, 1), f"Indexed {page_number} of {page_count} pages")
+
+        # Extraction and indexing errors propagate, so a partial import fails its job and a retry resumes it
+        for page_number, text in iter_pdf_pages(pdf_file, on_page_count=set_page_count):
+            if text.strip():
+                # Offsets are relative to the page; sections carry over page breaks
+                page_docs = list(self.text_splitter.split_text(
+                    text, metadata={"source": source_name, "page": page_number}, section=section
+                ))
+                if page_docs:
+                    section = page_docs[-1].metadata.get("section", section)
+                if skip:
+                    skipped, page_docs = page_docs[:skip], page_docs[skip:]
+                    skip -= len(skipped)
+                pending.extend(page_docs)
+            if len(pending) >= docs_per_batch:
+                flush(page_number)
+                added += len(pending)
+                pending = []
+
+        if pending:
+            flush(page_count)
+            added += len(pending)
+
+        if not added:
+            print("No documents created from PDF")
+            return False
+        print(f"Added {added} PDF chunks to FAISS vectorstore")
         return True
 
-    def query_vector_db(self, query_text, n_results=2):
-        """Query FAISS vectorstore."""
+    def add_documents(self, documents, progress=None, on_append=None):
+        """
+        Embed documents in ordered batches and append them to the FAISS vectorstore.
+
+        `progress`, if given, is called as progress(fraction, message) after each batch; it may
+        raise IngestCancelled to stop between batches (batches already appended stay indexed).
+        `on_append`, if given, is called as on_append(first_row_id, count) as each batch lands.
+        Returns the FAISS row id of the first appended document.
+        """
+        texts = [doc.page_content for doc in documents]
+        metadatas = [doc.metadata for doc in documents]
+        first_appended_id = None
+
+        offset = 0
+        for batch_texts, vectors in self.bulk_embedder.iter_embedded_batches(texts):
+            batch_metadatas = metadatas[offset:offset + len(batch_texts)]
+            offset += len(batch_texts)
+            first_id = self._append_embedded(batch_texts, vectors, batch_metadatas)
+            if first_appended_id is None:
+                first_appended_id = first_id
+            if on_append:
+                on_append(first_id, len(batch_texts))
+            if progress:
+                progress(offset / len(texts), f"Embedded {offset} of {len(texts)} chunks")
+        print(f"Appended {offset} documents to FAISS vectorstore")
+        return first_appended_id
+
+    def add_embedded_documents(self, documents, vectors):
+        """Append documents whose vectors were already computed (e.g. cached); returns the first row id."""
+        if not documents:
+            return None
+        return self._append_embedded(
+            [doc.page_content for doc in documents], vectors, [doc.metadata for doc in documents]
+        )
+
+    def _append_embedded(self, texts, vectors, metadatas):
+        # Unit vectors make L2 ranking cosine ranking, whatever the embedding model returns
+        text_embeddings = list(zip(texts, _unit_rows(vectors).tolist()))
+        with self._lock.write():
+            # FAISS assigns sequential row ids, so the batch occupies [first_id, first_id + len)
+            first_id = self.vectorstore.index.ntotal if self.vectorstore is not None else 0
+            if self.vectorstore is None:
+                self.vectorstore = FAISS.from_embeddings(text_embeddings, self.embeddings, metadatas=metadatas)
+            else:
+                self.vectorstore.add_embeddings(text_embeddings, metadatas=metadatas)
+            batch_ids = range(first_id, first_id + len(texts))
+            self.metadata_index.add(batch_ids, metadatas)
+            self.lexical_index.add(batch_ids, texts)
+            # Swap in an approximate index once the corpus is large enough to train one
+            self.vectorstore.index = maybe_upgrade_index(self.vectorstore.index)
+            self.version += 1
+        return first_id
+
+    def iter_leads(self):
+        """
+        Yield (lead_key, text, metadata) for each canonical CSV lead, in import order.
+
+        Leads split over several chunks are stitched back together from the chunk offsets.
+        """
+        with self._lock.read():
+            lead_rows = list(self._lead_rows.items())
+        for key, row_ids in lead_rows:
+            with self._lock.read():
+                docs = [self._get_document(row_id) for row_id in row_ids]
+            text, end = "", 0
+            for doc in docs:
+                start = doc.metadata.get("start_index", end)
+                text += doc.page_content[max(end - start, 0):]
+                end = max(end, doc.metadata.get("end_index", start + len(doc.page_content)))
+            metadata = {k: v for k, v in docs[0].metadata.items() if k not in ("start_index", "end_index")}
+            yield key, text, metadata
+
+    def _get_document(self, row_id):
+        return self.vectorstore.docstore.search(self.vectorstore.index_to_docstore_id[int(row_id)])
+
+    def _search(self, query_vector, k, candidate_ids=None):
+        """Vector search, optionally restricted to the given FAISS row ids. Returns (row id, doc, distance) triples."""
+        query_vector = _unit_rows([query_vector])
+        index = self.vectorstore.index
+        if candidate_ids is None:
+            distances, indices = index.search(query_vector, min(k, index.ntotal))
+        else:
+            params, selector = filtered_search_params(index, candidate_ids)
+            distances, indices = index.search(query_vector, min(k, len(candidate_ids)), params=params)
+
+        return [
+            (int(i), self._get_document(i), float(distance))
+            for distance, i in zip(distances[0], indices[0]) if i != -1
+        ]
+
+    @staticmethod
+    def _format_results(results, score_key="distances"):
+        """Chroma-style result dict; `score_key` names the third column ("distances": lower is better)."""
+        return {
+            "ids": [[row_id for row_id, _, _ in results]],
+            "documents": [[doc.page_content for _, doc, _ in results]],
+            "metadatas": [[doc.metadata if doc.metadata else None for _, doc, _ in results]],
+            score_key: [[score for _, _, score in results]],
+        }
+
+    def query_vector_db(self, query_text, n_results=2, filters=None, query_vector=None):
+        """
+        Query FAISS vectorstore.
+
+        `filters` narrows the candidate rows before the vector search, e.g.
+        {"industry": "fintech", "employees": {"$gte": 50}} (see MetadataIndex.candidate_ids).
+        Pass a precomputed `query_vector` to skip embedding `query_text` again.
+        """
         if not self.vectorstore:
             print("Vectorstore is empty; nothing to query")
             return None
 
         print(f"Querying FAISS vectorstore for '{query_text}'...")
-        results = self.vectorstore.similarity_search_with_score(query_text, k=n_results)
+        if query_vector is None:
+            query_vector = self.embeddings.embed_query(query_text)
+        with self._lock.read():
+            candidate_ids = self.metadata_index.candidate_ids(filters)
+            if candidate_ids is None:
+                results = self._search(query_vector, n_results)
+            elif len(candidate_ids):
+                print(f"Filters {filters} narrowed search to {len(candidate_ids)} of {self.vectorstore.index.ntotal} rows")
+                results = self._search(query_vector, n_results, candidate_ids)
+            else:
+                results = []
+            similarities = self._similarities(query_vector, [row_id for row_id, _, _ in results])
 
-        documents = []
-        metadatas = []
-        for doc, score in results:
-            documents.append(doc.page_content)
-            metadatas.append(doc.metadata if doc.metadata else None)
+        formatted = self._format_results(results)
+        formatted["similarities"] = [similarities]
+        return formatted
 
-        return {"documents": [documents], "metadatas": [metadatas]}
+    def _similarities(self, query_vector, row_ids):
+        """
+        Cosine similarity between the query and each stored row.
+
+        Computed from the stored vectors rather than the search distances: IVF-PQ/SQ8 distances
+        are approximate and don't map back to a cosine. Quantized rows decode to vectors that are
+        off the unit sphere, so each is normalized before the dot product.
+        """
+        if not row_ids:
+            return []
+        index = self.vectorstore.index
+        stored = _unit_rows(np.vstack([index.reconstruct(row_id) for row_id in row_ids]))
+        return (stored @ _unit_rows([query_vector])[0]).tolist()
+
+    def lexical_search(self, query_text, n_results=2, filters=None):
+        """Query the BM25 index; same result shape as query_vector_db, but with BM25 "scores" (higher is better)."""
+        if not self.vectorstore:
+            return None
+
+        with self._lock.read():
+            candidate_ids = self.metadata_index.candidate_ids(filters)
+            if candidate_ids is not None and not len(candidate_ids):
+                return self._format_results([], score_key="scores")
+            hits = self.lexical_index.search(query_text, k=n_results, candidate_ids=candidate_ids)
+            return self._format_results(
+                [(row_id, self._get_document(row_id), score) for row_id, score in hits], score_key="scores"
+            )
 
     def clear_collection(self):
         """Clear FAISS vectorstore (reset it)."""
         print("Clearing FAISS vectorstore...")
-        self.vectorstore = None
+        with self._lock.write():
+            self.vectorstore = None
+            self.metadata_index.clear()
+            self.lexical_index.clear()
+            self._reset_leads()
+            self.version += 1
         print("FAISS vectorstore cleared")
 
+    def __len__(self):
+        return self.vectorstore.index.ntotal if self.vectorstore is not None else 0
+
+    def stats(self):
+        """Row and lead counts plus the approximate in-memory size of the vectors."""
+        with self._lock.read():
+            index = self.vectorstore.index if self.vectorstore is not None else None
+            return {
+                "rows": index.ntotal if index is not None else 0,
+                "leads": len(self._lead_rows),
+                "index_type": type(index).__name__ if index is not None else None,
+                "vector_bytes": index.ntotal * index.d * 4 if index is not None else 0,
+            }
+
+    def save(self, path):
+        """
+        Write the index, docstore and metadata/BM25/dedup state to a single file.
+
+        The file is written next to `path` and renamed into place, so a crash mid-save
+        leaves the previous copy intact.
+        """
+        with self._lock.read():
+            state = {
+                "index": faiss.serialize_index(self.vectorstore.index) if self.vectorstore is not None else None,
+                "docstore": self.vectorstore.docstore if self.vectorstore is not None else None,
+                "index_to_docstore_id": self.vectorstore.index_to_docstore_id if self.vectorstore is not None else None,
+                "metadata_index": self.metadata_index,
+                "lexical_index": self.lexical_index,
+                "deduplicator": self.deduplicator,
+                "lead_rows": self._lead_rows,
+            }
+            tmp_path = f"{path}.tmp"
+            with open(tmp_path, "wb") as f:
+                pickle.dump(state, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, path)
+            return self.version
+
+    @classmethod
+    def load(cls, path):
+        """Rebuild a VectorDB written by save()."""
+        with open(path, "rb") as f:
+            state = pickle.load(f)
+        db = cls()
+        if state["index"] is not None:
+            db.vectorstore = FAISS(
+                embedding_function=db.embeddings,
+                # Query-time knobs follow the current config rather than whatever was saved
+                index=configure_search(enable_reconstruct(faiss.deserialize_index(state["index"]))),
+                docstore=state["docstore"],
+                index_to_docstore_id=state["index_to_docstore_id"],
+            )
+        db.metadata_index = state["metadata_index"]
+        db.lexical_index = state["lexical_index"]
+        db.deduplicator = state["deduplicator"]
+        db._lead_rows = state["lead_rows"]
+        return db
+
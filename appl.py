@@ -1,11 +1,8 @@
 import streamlit as st
-import pandas as pd
-from app.chatbot import chat_with_lead, get_session_history, get_full_session_history
-from app.vector_db import VectorDB
-from app.db import create_user, authenticate_user, validate_token, refresh_access_token, revoke_refresh_token, conversations_collection, get_escalation_status
-from langchain.schema import HumanMessage, AIMessage
-from pymongo import MongoClient
-import os
+from app.chatbot import chat_with_lead
+from app.retrieval_client import RETRIEVAL_SERVICE_URL, RemoteIngestJobs, get_retrieval_client
+from app.db import get_messages_page, create_user, authenticate_user, validate_token, refresh_access_token, revoke_refresh_token, delete_conversation, get_escalation_status, get_pipeline_rollups, INTENTS, SCORE_BUCKETS
+import html
 from dotenv import load_dotenv
 
 import logging
@@ -18,8 +15,6 @@ logging.basicConfig(
 
 
 load_dotenv()
-MONGO_URI = os.getenv("MONGODB_URI")
-client = MongoClient(MONGO_URI)
 
 
 st.set_page_config(page_title="AI SDR Assistant", page_icon="🤖")
@@ -173,8 +168,8 @@ if "user_id" not in st.session_state:
     st.session_state.user_id = None
 if "messages" not in st.session_state:
     st.session_state.messages = []
-if "uploaded_files" not in st.session_state:
-    st.session_state.uploaded_files = []
+    st.session_state.rendered_messages = []
+    st.session_state.history_cursor = None
 if "login_processed" not in st.session_state:
     st.session_state.login_processed = False
 if "page" not in st.session_state:
@@ -292,6 +287,42 @@ def validate_session():
             return False
     return False
 
+# Chat history paging
+HISTORY_PAGE_SIZE = 20
+
+
+def render_message(role, content):
+    css_class, label = ("user-message", "User message") if role == "user" else ("ai-message", "AI message")
+    return f'<div class="{css_class}" role="log" aria-label="{label}">{html.escape(content)}</div>'
+
+
+def reset_chat_history():
+    st.session_state.messages = []
+    st.session_state.rendered_messages = []
+    # Position of the oldest loaded message; None until the first page is loaded, 0 once everything is
+    st.session_state.history_cursor = None
+
+
+def load_history_page(before=None):
+    """Prepend one page of older messages (or load the latest page) from Mongo."""
+    try:
+        page, cursor = get_messages_page(st.session_state.user_id, before=before, limit=HISTORY_PAGE_SIZE)
+    except Exception as e:
+        st.error(f"Failed to load chat history: {e}")
+        return
+    messages = [{"role": "user" if msg["sender"] == "user" else "ai", "content": msg["message"]} for msg in page]
+    st.session_state.messages = messages + st.session_state.messages
+    st.session_state.rendered_messages = (
+        [render_message(msg["role"], msg["content"]) for msg in messages] + st.session_state.rendered_messages
+    )
+    st.session_state.history_cursor = cursor or 0
+
+
+def append_message(role, content):
+    st.session_state.messages.append({"role": role, "content": content})
+    st.session_state.rendered_messages.append(render_message(role, content))
+
+
 # Page functions
 def show_chat_page():
     st.subheader("Chat with AI SDR")
@@ -299,35 +330,19 @@ def show_chat_page():
     if success and escalated:
         st.info("Your conversation has been escalated to a human agent!", icon="📞")
     
-    def load_chat_history():
-        try:
-            history = get_full_session_history(st.session_state.user_id)
-            st.session_state.messages = []
-            for msg in history:
-                if isinstance(msg, HumanMessage):
-                    st.session_state.messages.append({"role": "user", "content": msg.content})
-                elif isinstance(msg, AIMessage):
-                    st.session_state.messages.append({"role": "ai", "content": msg.content})
-        except Exception as e:
-            st.error(f"Failed to load chat history: {e}")
-            st.session_state.messages = []
-
-    if not st.session_state.messages:
-        load_chat_history()
-
-    st.markdown('<div class="chat-container">', unsafe_allow_html=True)
-    for msg in st.session_state.messages:
-        if msg["role"] == "user":
-            st.markdown(
-                f'<div class="user-message" role="log" aria-label="User message">{msg["content"]}</div>',
-                unsafe_allow_html=True
-            )
-        else:
-            st.markdown(
-                f'<div class="ai-message" role="log" aria-label="AI message">{msg["content"]}</div>',
-                unsafe_allow_html=True
-            )
-    st.markdown('</div>', unsafe_allow_html=True)
+    if st.session_state.history_cursor is None and not st.session_state.messages:
+        load_history_page()
+
+    if st.session_state.history_cursor:
+        if st.button("⬆️ Load older messages"):
+            load_history_page(before=st.session_state.history_cursor)
+            st.rerun()
+
+    # One element for the whole transcript, built from per-message HTML cached in session state
+    st.markdown(
+        '<div class="chat-container">' + "".join(st.session_state.rendered_messages) + '</div>',
+        unsafe_allow_html=True
+    )
 
     with st.form(key="chat_form", clear_on_submit=True):
         cols = st.columns([4, 1])
@@ -342,34 +357,42 @@ def show_chat_page():
             submit = st.form_submit_button("➤", use_container_width=True)
     
     if submit and user_input:
-        st.session_state.messages.append({"role": "user", "content": user_input})
+        append_message("user", user_input)
         st.success("Message sent!", icon="✅")
         placeholder = st.empty()
         placeholder.markdown("**AI is typing...**")
         with st.spinner("AI SDR is thinking..."):
             response = chat_with_lead(st.session_state.user_id, user_input)
         placeholder.empty()
-        st.session_state.messages.append({"role": "ai", "content": response})
+        append_message("ai", response)
         if st.session_state.access_token and st.session_state.refresh_token:
             st.query_params["access_token"] = st.session_state.access_token
             st.query_params["refresh_token"] = st.session_state.refresh_token
         st.rerun()
 
+def get_namespace_registry():
+    # Loads FAISS and the embedding stack, so only import it once a page needs lead stores
+    from app.namespaces import get_namespace_registry
+    return get_namespace_registry()
+
+
 def show_upload_page():
     st.subheader("Upload Leads")
-    
+
+    # Each user's leads live in their own namespace, shared across their sessions
+    if RETRIEVAL_SERVICE_URL:
+        if "ingest_jobs" not in st.session_state:
+            st.session_state.ingest_jobs = RemoteIngestJobs(get_retrieval_client(), st.session_state.user_id)
+    else:
+        st.session_state.ingest_jobs = get_namespace_registry().ingest_jobs(st.session_state.user_id)
+    ingest_jobs = st.session_state.ingest_jobs
+
     def reset_vector_db():
-        if "vector_db" in st.session_state:
-            st.session_state.vector_db.clear_collection()
-            del st.session_state.vector_db
-        try:
-            st.session_state.vector_db = VectorDB()
-        except Exception as e:
-            st.error(f"Error initializing vector DB: {e}")
-            st.session_state.vector_db = None
-    
-    if "vector_db" not in st.session_state:
-        reset_vector_db()
+        # Waits for a running import to stop; fails if the store is still busy
+        if RETRIEVAL_SERVICE_URL:
+            ingest_jobs.clear()
+        else:
+            get_namespace_registry().clear(st.session_state.user_id)
 
     uploaded_files = st.file_uploader(
         "📂 Upload files with leads (CSV, TXT, or PDF)",
@@ -377,43 +400,92 @@ def show_upload_page():
         accept_multiple_files=True
     )
 
+    # Files stay in the uploader across reruns; submit() is keyed by content hash, so a file
+    # that already has a job (indexed, running, cancelled or failed) is not parsed again
     if uploaded_files:
         for uploaded_file in uploaded_files:
-            file_type = uploaded_file.name.split(".")[-1].lower()
+            ingest_jobs.submit(uploaded_file.name, uploaded_file.getvalue())
+
+    if RETRIEVAL_SERVICE_URL:
+        namespace_stats = get_retrieval_client().namespace_stats(st.session_state.user_id)
+    else:
+        namespace_stats = get_namespace_registry().stats(st.session_state.user_id)
+    if namespace_stats and namespace_stats[0].get("rows"):
+        stats = namespace_stats[0]
+        st.caption(f"Your lead store: {stats['rows']} chunks from {stats['leads']} leads ({stats['vector_bytes'] / 1e6:.1f} MB of vectors)")
+
+    if ingest_jobs.jobs():
+        show_ingest_jobs()
+        if st.button("Clear Uploaded Files"):
             try:
-                if file_type == "csv":
-                    df = pd.read_csv(uploaded_file)
-                    st.session_state.vector_db.create_vector_db_from_csv(df)
-                    st.session_state.uploaded_files.append(uploaded_file.name)
-                    st.success(f"📊 CSV '{uploaded_file.name}' uploaded and saved to vector DB!")
-                elif file_type == "txt":
-                    text = st.session_state.vector_db.extract_text_from_txt(uploaded_file)
-                    if text:
-                        st.session_state.vector_db.create_vector_db_from_text(text, source_name=f"txt_{uploaded_file.name}")
-                        st.session_state.uploaded_files.append(uploaded_file.name)
-                        st.success(f"📝 TXT '{uploaded_file.name}' uploaded and saved to vector DB!")
-                    else:
-                        st.error(f"❌ Failed to process TXT '{uploaded_file.name}'.")
-                elif file_type == "pdf":
-                    text = st.session_state.vector_db.extract_text_from_pdf(uploaded_file)
-                    if text:
-                        st.session_state.vector_db.create_vector_db_from_text(text, source_name=f"pdf_{uploaded_file.name}")
-                        st.session_state.uploaded_files.append(uploaded_file.name)
-                        st.success(f"📄 PDF '{uploaded_file.name}' uploaded and saved to vector DB!")
-                    else:
-                        st.error(f"❌ Failed to process PDF '{uploaded_file.name}'.")
+                reset_vector_db()
             except Exception as e:
-                st.error(f"❌ Error processing '{uploaded_file.name}': {e}")
-    
-    if st.session_state.uploaded_files:
-        st.write("**Uploaded Files**")
-        file_data = [{"File Name": fname} for fname in st.session_state.uploaded_files]
-        st.table(file_data)
-        if st.button("Clear Uploaded Files"):
-            st.session_state.uploaded_files = []
-            reset_vector_db()
-            st.success("Uploaded files cleared!")
-            st.rerun()
+                st.error(f"Could not clear uploaded files: {e}")
+            else:
+                st.success("Uploaded files cleared!")
+                st.rerun()
+
+
+INGEST_STATUS_ICONS = {"queued": "⏳", "running": "⚙️", "done": "✅", "failed": "❌", "cancelled": "🚫", "skipped": "➖"}
+
+
+@st.fragment(run_every=1)
+def show_ingest_jobs():
+    """Job table; refreshes itself every second without rerunning the rest of the page."""
+    manager = st.session_state.get("ingest_jobs")
+    if manager is None:
+        return
+    st.write("**Uploaded Files**")
+    for job in manager.jobs():
+        cols = st.columns([3, 4, 1, 1])
+        cols[0].write(f"{INGEST_STATUS_ICONS.get(job.status, '')} {job.file_name}")
+        if job.status == "running":
+            cols[1].progress(job.progress, text=job.message)
+        else:
+            cols[1].caption(job.message)
+        cols[2].caption(f"{job.elapsed:.1f}s")
+        if job.status in ("queued", "running"):
+            if cols[3].button("Cancel", key=f"cancel_{job.id}"):
+                manager.cancel(job.id)
+        elif job.status in ("failed", "cancelled"):
+            if cols[3].button("Retry", key=f"retry_{job.id}"):
+                manager.retry(job.id)
+
+
+STAGE_NAMES = {
+    1: "Introduction", 2: "Qualification", 3: "Value Proposition", 4: "Needs Analysis",
+    5: "Solution Presentation", 6: "Objection Handling", 7: "Close", 8: "End Conversation",
+}
+
+
+def show_pipeline_page():
+    """Funnel analytics read from the rollup documents, never from the conversations themselves."""
+    st.subheader("Pipeline")
+    days = st.selectbox("Period", [7, 30, 90], index=1, format_func=lambda d: f"Last {d} days")
+    current, daily = get_pipeline_rollups(days)
+
+    st.markdown("**Where conversations are now**")
+    cols = st.columns(3)
+    cols[0].metric("Conversations", current.get("conversations", 0))
+    cols[1].metric("Interested", current.get("intents", {}).get("interest", 0))
+    cols[2].metric("Frustrated", current.get("intents", {}).get("frustration", 0))
+    stages = current.get("stages", {})
+    st.bar_chart({"conversations": {f"{n}. {name}": stages.get(str(n), 0) for n, name in STAGE_NAMES.items()}})
+
+    st.markdown(f"**Turns over the last {days} days**")
+    if not daily:
+        st.info("No analyzed turns in this period yet.")
+        return
+    cols = st.columns(2)
+    cols[0].metric("Turns", sum(doc.get("turns", 0) for doc in daily))
+    cols[1].metric("New conversations", sum(doc.get("new_conversations", 0) for doc in daily))
+    st.line_chart({
+        intent: {doc["day"]: doc.get("intents", {}).get(intent, 0) for doc in daily}
+        for intent in INTENTS
+    })
+    st.bar_chart({
+        "turns": {bucket: sum(doc.get("scores", {}).get(bucket, 0) for doc in daily) for bucket in SCORE_BUCKETS}
+    })
 
 
 # Main app UI
@@ -425,18 +497,26 @@ def show_main_app():
             st.session_state.page = "chat"
         if st.button("Upload Files", key="nav_upload"):
             st.session_state.page = "upload"
+        if st.button("Pipeline", key="nav_pipeline"):
+            st.session_state.page = "pipeline"
         
         with st.expander("Manage Data"):
             if st.button("🗑️ Clear Vector DB"):
-                if "vector_db" in st.session_state:
-                    st.session_state.vector_db.clear_collection()
-                    del st.session_state.vector_db
-                st.session_state.uploaded_files = []
-                st.success("Vector DB cleared!")
-                st.rerun()
+                # Only this user's namespace is cleared; other users' leads are untouched
+                try:
+                    if RETRIEVAL_SERVICE_URL:
+                        get_retrieval_client().clear(st.session_state.user_id)
+                    else:
+                        get_namespace_registry().clear(st.session_state.user_id)
+                except Exception as e:
+                    st.error(f"Could not clear the vector DB: {e}")
+                else:
+                    st.session_state.pop("ingest_jobs", None)
+                    st.success("Vector DB cleared!")
+                    st.rerun()
             if st.button("🗑️ Clear Chat History"):
-                st.session_state.messages = []
-                conversations_collection.delete_many({"user_id": st.session_state.user_id})
+                reset_chat_history()
+                delete_conversation(st.session_state.user_id)
                 st.success("Chat history cleared!")
                 st.rerun()
         if st.button("Logout"):
@@ -452,6 +532,8 @@ def show_main_app():
         show_chat_page()
     elif st.session_state.page == "upload":
         show_upload_page()
+    elif st.session_state.page == "pipeline":
+        show_pipeline_page()
     
 
 # Render appropriate page
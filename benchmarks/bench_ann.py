@@ -0,0 +1,77 @@
+# benchmarks/bench_ann.py
+"""Recall@k and single-query latency of approximate indexes against the exact flat baseline.
+
+Run from the repo root:
+    python -m benchmarks.bench_ann --rows 1000000 --types flat hnsw ivfpq ivfsq8
+"""
+import argparse
+import json
+import time
+import numpy as np
+
+from app.index_factory import INDEX_TYPES, build_index
+
+DIM = 384  # all-MiniLM-L6-v2
+
+
+def clustered_vectors(n, dim=DIM, n_clusters=256, seed=0):
+    """Gaussian blobs around random centres; closer to real embedding spaces than uniform noise."""
+    rng = np.random.default_rng(seed)
+    centres = rng.standard_normal((n_clusters, dim)).astype("float32")
+    labels = rng.integers(0, n_clusters, n)
+    return centres[labels] + 0.35 * rng.standard_normal((n, dim)).astype("float32")
+
+
+def measure(index, queries, k):
+    latencies = []
+    ids = np.empty((len(queries), k), dtype="int64")
+    for i, q in enumerate(queries):
+        start = time.perf_counter()
+        _, ids[i] = index.search(q[None, :], k)
+        latencies.append((time.perf_counter() - start) * 1000)
+    return ids, np.array(latencies)
+
+
+def run(rows, types, k, n_queries):
+    # Queries are held-out points from the corpus's own clusters, like real lookups of indexed leads
+    vectors = clustered_vectors(rows + n_queries)
+    corpus, queries = vectors[:rows], vectors[rows:]
+    results = []
+    truth = None
+    for index_type in ["flat"] + [t for t in types if t != "flat"]:
+        start = time.perf_counter()
+        index = build_index(corpus, index_type)
+        build_seconds = time.perf_counter() - start
+        ids, latencies = measure(index, queries, k)
+        if truth is None:
+            truth = ids
+        recall = np.mean([len(set(a) & set(b)) / k for a, b in zip(ids, truth)])
+        row = {
+            "index": index_type, "rows": rows, "k": k,
+            "build_seconds": round(build_seconds, 2),
+            f"recall@{k}": round(float(recall), 4),
+            "p50_ms": round(float(np.percentile(latencies, 50)), 3),
+            "p99_ms": round(float(np.percentile(latencies, 99)), 3),
+        }
+        results.append(row)
+        print(row)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=200000)
+    parser.add_argument("--types", nargs="+", default=list(INDEX_TYPES), choices=INDEX_TYPES)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--output", help="Optional path to write results as JSON")
+    args = parser.parse_args()
+
+    results = run(args.rows, args.types, args.k, args.queries)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,50 @@
+# benchmarks/bench_embedding.py
+"""Rows/sec of bulk embedding against worker count.
+
+Run from the repo root:
+    python -m benchmarks.bench_embedding --rows 20000 --workers 1 2 4 8
+"""
+import argparse
+import json
+import os
+import time
+
+from app.embeddings import BulkEmbedder, EMBEDDING_MODEL_NAME
+from benchmarks.synthetic import generate_lead_texts
+
+
+def run(rows, workers, batch_size):
+    from sentence_transformers import SentenceTransformer
+
+    texts = generate_lead_texts(rows)
+    model = SentenceTransformer(EMBEDDING_MODEL_NAME, device="cpu")
+    results = []
+    for n in workers:
+        # min_parallel_texts=0 so every worker count > 1 actually uses the pool
+        with BulkEmbedder(model=model, batch_size=batch_size, num_workers=n, min_parallel_texts=0) as embedder:
+            embedder.embed_documents(texts[:batch_size])  # warm up the pool
+            start = time.perf_counter()
+            vectors = embedder.embed_documents(texts)
+            elapsed = time.perf_counter() - start
+        assert len(vectors) == len(texts)
+        results.append({"workers": n, "rows": rows, "seconds": round(elapsed, 3), "rows_per_sec": round(rows / elapsed, 1)})
+        print(f"workers={n:<3} rows={rows} time={elapsed:.2f}s rows/sec={rows / elapsed:.1f}")
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=10000)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, os.cpu_count() or 1])
+    parser.add_argument("--batch-size", type=int, default=64)
+    parser.add_argument("--output", help="Optional path to write results as JSON")
+    args = parser.parse_args()
+
+    results = run(args.rows, sorted(set(args.workers)), args.batch_size)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+# benchmarks/bench_onnx.py
+"""Parity and speed of the ONNX embedding backends against the PyTorch model.
+
+Export the model first (python -m app.onnx_embeddings --quantize), then run from the repo root:
+    python -m benchmarks.bench_onnx --rows 5000
+
+Each backend is loaded in a fresh subprocess so import time and RSS are measured cleanly.
+Exits non-zero if any backend's cosine similarity to PyTorch drops below --min-cosine.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import numpy as np
+
+from benchmarks.synthetic import generate_lead_texts
+
+_PROBE = r"""
+import json
+import resource
+import sys
+import time
+import numpy as np
+start = time.perf_counter()
+from app.embeddings import get_embeddings
+embeddings = get_embeddings(backend=sys.argv[1])
+load_seconds = time.perf_counter() - start
+texts = json.load(open(sys.argv[2]))
+queries = texts[:200]
+embeddings.embed_query(queries[0])  # warm up
+latencies = []
+for q in queries:
+    t = time.perf_counter()
+    embeddings.embed_query(q)
+    latencies.append((time.perf_counter() - t) * 1000)
+t = time.perf_counter()
+vectors = np.asarray(embeddings.embed_documents(texts), dtype="float32")
+bulk_seconds = time.perf_counter() - t
+np.save(sys.argv[3], vectors)
+print(json.dumps({
+    "load_seconds": round(load_seconds, 2),
+    "query_p50_ms": round(float(np.percentile(latencies, 50)), 2),
+    "query_p99_ms": round(float(np.percentile(latencies, 99)), 2),
+    "rows_per_sec": round(len(texts) / bulk_seconds, 1),
+    "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+}))
+"""
+
+
+def run_backend(backend, texts_path, vectors_path):
+    out = subprocess.run(
+        [sys.executable, "-c", _PROBE, backend, texts_path, vectors_path],
+        check=True, capture_output=True, text=True
+    )
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=2000)
+    parser.add_argument("--backends", nargs="+", default=["torch", "onnx", "onnx-int8"])
+    parser.add_argument("--min-cosine", type=float, default=0.98)
+    parser.add_argument("--output", help="Optional path to write results as JSON")
+    args = parser.parse_args()
+
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        texts_path = os.path.join(tmp, "texts.json")
+        with open(texts_path, "w") as f:
+            json.dump(generate_lead_texts(args.rows), f)
+
+        backends = ["torch"] + [b for b in args.backends if b != "torch"]
+        reference = None
+        failed = False
+        for backend in backends:
+            vectors_path = os.path.join(tmp, f"{backend}.npy")
+            row = {"backend": backend, **run_backend(backend, texts_path, vectors_path)}
+            vectors = np.load(vectors_path)
+            if reference is None:
+                reference = vectors
+            # Both sides are unit-norm, so the row-wise dot product is the cosine similarity
+            cosine = (vectors * reference).sum(axis=1)
+            row["cosine_min"] = round(float(cosine.min()), 4)
+            row["cosine_mean"] = round(float(cosine.mean()), 4)
+            failed |= row["cosine_min"] < args.min_cosine
+            results.append(row)
+            print(row)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+    if failed:
+        sys.exit(f"Parity check failed: cosine similarity below {args.min_cosine}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,198 @@
+# benchmarks/bench_retrieval.py
+"""Ingestion and retrieval through VectorDB on synthetic lead CSVs, PDFs and FAQ corpora.
+
+For each corpus reports ingestion throughput, peak RSS, index build time, query latency
+(p50/p99 for query embedding, vector search and the hybrid vector+BM25 search the chat uses)
+and recall@k of the store's index against exact search over the same vectors.
+
+Each corpus runs in a fresh subprocess so peak RSS belongs to that corpus alone. Everything
+runs on CPU with the local embedding model; no network or API keys are needed.
+
+Run from the repo root:
+    python -m benchmarks.bench_retrieval --rows 100000 --pages 200 --faq-sections 2000
+    VECTOR_INDEX_TYPE=hnsw python -m benchmarks.bench_retrieval --corpora csv --train-threshold 20000
+"""
+import argparse
+import json
+import os
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+import numpy as np
+
+from benchmarks.synthetic import generate_document, generate_faq, generate_lead_rows, write_lead_csv, write_pdf
+
+CORPORA = ("csv", "pdf", "faq")
+
+
+def percentiles(latencies):
+    return {"p50_ms": round(float(np.percentile(latencies, 50)), 3), "p99_ms": round(float(np.percentile(latencies, 99)), 3)}
+
+
+def make_queries(corpus, size, n_queries, seed=1):
+    """Queries shaped like chat messages about the corpus: a lead's attributes, or a sentence from a document."""
+    rng = random.Random(seed)
+    if corpus == "csv":
+        rows = generate_lead_rows(size)
+        return [
+            f"{row['title']} at {row['company']} in {row['industry']} using {row['current_crm']}"
+            for row in rng.sample(rows, min(n_queries, len(rows)))
+        ]
+    # Same text write_pdf lays out over `size` pages
+    text = generate_faq(size) if corpus == "faq" else generate_document(max(1, size * 3))
+    sentences = [s.strip() for s in text.replace("\n", " ").split(".") if len(s.split()) >= 4]
+    return [rng.choice(sentences) for _ in range(n_queries)]
+
+
+def ingest(vector_db, corpus, size, tmp):
+    """Build `vector_db` from a generated corpus file; returns the ingestion wall time in seconds."""
+    if corpus == "csv":
+        import pandas as pd
+        from app.metadata_index import detect_metadata_columns
+        # "None" is a CRM value here, not a missing cell
+        df = pd.read_csv(write_lead_csv(os.path.join(tmp, "leads.csv"), size), keep_default_na=False)
+        categorical_cols, numeric_cols = detect_metadata_columns(df)
+        start = time.perf_counter()
+        vector_db.create_vector_db_from_csv(df, metadata_cols=categorical_cols + numeric_cols)
+    elif corpus == "pdf":
+        path = write_pdf(os.path.join(tmp, "document.pdf"), size)
+        start = time.perf_counter()
+        with open(path, "rb") as f:
+            vector_db.create_vector_db_from_pdf(f, source_name="document.pdf")
+    else:
+        text = generate_faq(size)
+        start = time.perf_counter()
+        vector_db.create_vector_db_from_text(text, source_name="faq.txt")
+    return time.perf_counter() - start
+
+
+def stored_vectors(vector_db):
+    """All vectors in the store, in row-id order: reconstructed from the index, or re-embedded if it can't."""
+    import faiss
+
+    index = vector_db.vectorstore.index
+    try:
+        return index.reconstruct_n(0, index.ntotal)
+    except RuntimeError:
+        base = faiss.extract_index_ivf(index) if "IVF" in type(index).__name__ else index
+        try:
+            base.make_direct_map()
+            return index.reconstruct_n(0, index.ntotal)
+        except (RuntimeError, AttributeError):
+            texts = [vector_db._get_document(i).page_content for i in range(index.ntotal)]
+            return np.asarray(vector_db.bulk_embedder.embed_documents(texts), dtype="float32")
+
+
+def run_corpus(corpus, size, n_queries, k):
+    """One corpus end to end, in this process; returns its result row."""
+    import faiss
+    from app.index_factory import VECTOR_INDEX_TYPE, build_index
+    from app.retriever import hybrid_search
+    from app.vector_db import VectorDB
+
+    vector_db = VectorDB()
+    with tempfile.TemporaryDirectory() as tmp:
+        ingest_seconds = ingest(vector_db, corpus, size, tmp)
+    ingest_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    stats = vector_db.stats()
+
+    vectors = stored_vectors(vector_db)
+    start = time.perf_counter()
+    build_index(vectors, VECTOR_INDEX_TYPE)
+    build_seconds = time.perf_counter() - start
+
+    queries = make_queries(corpus, size, n_queries)
+    vector_db.embeddings.embed_query(queries[0])  # warm up
+    embed_ms, search_ms, hybrid_ms, query_vectors, found = [], [], [], [], []
+    for query in queries:
+        t = time.perf_counter()
+        query_vector = vector_db.embeddings.embed_query(query)
+        embed_ms.append((time.perf_counter() - t) * 1000)
+        t = time.perf_counter()
+        results = vector_db._search(query_vector, k)
+        search_ms.append((time.perf_counter() - t) * 1000)
+        t = time.perf_counter()
+        hybrid_search(vector_db, query, k, query_vector=query_vector)
+        hybrid_ms.append((time.perf_counter() - t) * 1000)
+        query_vectors.append(query_vector)
+        found.append({row_id for row_id, _, _ in results})
+
+    exact = faiss.IndexFlatL2(vectors.shape[1])
+    exact.add(vectors)
+    _, truth = exact.search(np.asarray(query_vectors, dtype="float32"), min(k, len(vectors)))
+    recall = np.mean([len(hits & set(ids.tolist())) / len(ids) for hits, ids in zip(found, truth)])
+
+    return {
+        "corpus": corpus,
+        "size": size,
+        "units": {"csv": "rows", "pdf": "pages", "faq": "sections"}[corpus],
+        "chunks": stats["rows"],
+        "index_type": stats["index_type"],
+        "ingest_seconds": round(ingest_seconds, 2),
+        "units_per_sec": round(size / ingest_seconds, 1),
+        "chunks_per_sec": round(stats["rows"] / ingest_seconds, 1),
+        "index_build_seconds": round(build_seconds, 3),
+        "ingest_peak_rss_mb": round(ingest_rss, 1),
+        "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+        "vector_mb": round(stats["vector_bytes"] / 2**20, 1),
+        "k": k,
+        f"recall@{k}": round(float(recall), 4),
+        "embed_query": percentiles(embed_ms),
+        "vector_search": percentiles(search_ms),
+        "hybrid_search": percentiles(hybrid_ms),
+    }
+
+
+def run(corpora, sizes, n_queries, k, train_threshold=None):
+    env = dict(os.environ)
+    # Use the cached model only, so a missing download fails fast instead of timing network fetches
+    env.setdefault("HF_HUB_OFFLINE", "1")
+    # Large PDFs would otherwise be cut at the upload page limit
+    env["PDF_MAX_PAGES"] = str(max(sizes["pdf"], int(env.get("PDF_MAX_PAGES", 0) or 0)))
+    env["PDF_MAX_SECONDS"] = env.get("PDF_MAX_SECONDS", "3600")
+    if train_threshold is not None:
+        env["VECTOR_INDEX_TRAIN_THRESHOLD"] = str(train_threshold)
+    results = []
+    for corpus in corpora:
+        out = subprocess.run(
+            [sys.executable, "-m", "benchmarks.bench_retrieval", "--child", corpus,
+             "--size", str(sizes[corpus]), "--queries", str(n_queries), "--k", str(k)],
+            check=True, capture_output=True, text=True, env=env
+        )
+        row = json.loads(out.stdout.strip().splitlines()[-1])
+        results.append(row)
+        print(row)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--corpora", nargs="+", default=list(CORPORA), choices=CORPORA)
+    parser.add_argument("--rows", type=int, default=20000, help="Lead rows in the CSV corpus")
+    parser.add_argument("--pages", type=int, default=50, help="Pages in the PDF corpus")
+    parser.add_argument("--faq-sections", type=int, default=500, help="Sections in the FAQ corpus")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--train-threshold", type=int, help="Override VECTOR_INDEX_TRAIN_THRESHOLD for the run")
+    parser.add_argument("--output", help="Optional path to write results as JSON")
+    # Internal: run a single corpus in this process and print its result row
+    parser.add_argument("--child", choices=CORPORA, help=argparse.SUPPRESS)
+    parser.add_argument("--size", type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(run_corpus(args.child, args.size, args.queries, args.k)))
+        return
+
+    sizes = {"csv": args.rows, "pdf": args.pages, "faq": args.faq_sections}
+    results = run(args.corpora, sizes, args.queries, args.k, args.train_threshold)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
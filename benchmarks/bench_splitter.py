@@ -0,0 +1,84 @@
+# benchmarks/bench_splitter.py
+"""Token-aware splitter against the previous character splitter on lead rows and long documents.
+
+Reports throughput and how well chunks fit the embedding model's window: tokens per chunk
+and the share of chunks the model would truncate.
+
+Run from the repo root:
+    python -m benchmarks.bench_splitter --rows 100000 --sections 20000
+"""
+import argparse
+import json
+import time
+import numpy as np
+from langchain.text_splitter import CharacterTextSplitter
+
+from app.text_splitter import TokenTextSplitter, embedding_tokenizer
+from benchmarks.synthetic import generate_document, generate_lead_texts
+
+MODEL_WINDOW = 254  # 256 minus [CLS] and [SEP]
+
+
+def character_split_rows(texts):
+    # What VectorDB did before: one splitter pass per row
+    splitter = CharacterTextSplitter(chunk_size=1000, chunk_overlap=100)
+    return [doc.page_content for text in texts for doc in splitter.create_documents([text])]
+
+
+def character_split_text(text):
+    return [doc.page_content for doc in CharacterTextSplitter(chunk_size=1000, chunk_overlap=100).create_documents([text])]
+
+
+def measure(name, corpus, split, tokenizer):
+    start = time.perf_counter()
+    chunks = split()
+    elapsed = time.perf_counter() - start
+    lengths = np.array([len(e.ids) for e in tokenizer.encode_batch(chunks, add_special_tokens=False)])
+    result = {
+        "splitter": name,
+        "corpus": corpus,
+        "seconds": round(elapsed, 3),
+        "chunks": len(chunks),
+        "chunks_per_sec": round(len(chunks) / elapsed, 1),
+        "tokens_p50": int(np.percentile(lengths, 50)),
+        "tokens_max": int(lengths.max()),
+        "truncated_pct": round(float(np.mean(lengths > MODEL_WINDOW)) * 100, 2),
+        "window_fill_pct": round(float(np.mean(np.minimum(lengths, MODEL_WINDOW))) / MODEL_WINDOW * 100, 1),
+    }
+    print(
+        f"{name:<10} {corpus:<9} chunks={result['chunks']:<8} time={elapsed:.2f}s "
+        f"tokens p50={result['tokens_p50']} max={result['tokens_max']} "
+        f"truncated={result['truncated_pct']}% fill={result['window_fill_pct']}%"
+    )
+    return result
+
+
+def run(rows, sections):
+    tokenizer = embedding_tokenizer()
+    splitter = TokenTextSplitter(tokenizer)
+    lead_texts = generate_lead_texts(rows)
+    document = generate_document(sections)
+
+    return [
+        measure("character", "csv rows", lambda: character_split_rows(lead_texts), tokenizer),
+        measure("token", "csv rows", lambda: [doc.page_content for doc, _ in splitter.split_rows(lead_texts)], tokenizer),
+        measure("character", "document", lambda: character_split_text(document), tokenizer),
+        measure("token", "document", lambda: [doc.page_content for doc in splitter.split_text(document)], tokenizer),
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=50000)
+    parser.add_argument("--sections", type=int, default=10000)
+    parser.add_argument("--output", help="Optional path to write results as JSON")
+    args = parser.parse_args()
+
+    results = run(args.rows, args.sections)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
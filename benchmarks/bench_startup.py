@@ -0,0 +1,79 @@
+# benchmarks/bench_startup.py
+"""Cold-start profile: how long importing each entry point takes, and which packages it pays for.
+
+Each module is imported in a fresh interpreter under `python -X importtime`; the report sums
+self time per top-level package and lists the slowest ones. `appl` is imported through its
+dependencies only (Streamlit pages can't be imported outside `streamlit run`), which is what
+stands between launching the app and a usable login page.
+
+Run from the repo root:
+    python -m benchmarks.bench_startup --top 15
+"""
+import argparse
+import json
+import subprocess
+import sys
+import time
+from collections import defaultdict
+
+# What each entry point imports before it can serve its first request
+TARGETS = {
+    "appl": "import streamlit, app.chatbot, app.db, app.retrieval_client",
+    "api.main": "import api.main",
+    "app.retrieval_service": "import app.retrieval_service",
+    "app.chatbot": "import app.chatbot",
+}
+
+
+def profile(statement):
+    """Run `statement` under -X importtime; return (wall seconds, {package: self µs}, total µs, error)."""
+    start = time.perf_counter()
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", statement], capture_output=True, text=True)
+    wall = time.perf_counter() - start
+
+    packages = defaultdict(int)
+    total = 0
+    for line in proc.stderr.splitlines():
+        # import time: self [us] | cumulative | imported package
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, _, name = (part.strip() for part in line[len("import time:"):].split("|"))
+        packages[name.split(".")[0]] += int(self_us)
+        total += int(self_us)
+    error = proc.stderr.strip().splitlines()[-1] if proc.returncode else None
+    return wall, dict(packages), total, error
+
+
+def run(targets, top):
+    results = []
+    for name in targets:
+        wall, packages, total, error = profile(TARGETS[name])
+        slowest = sorted(packages.items(), key=lambda item: item[1], reverse=True)[:top]
+        print(f"\n{name}: {wall:.2f}s wall, {total / 1e6:.2f}s in imports" + (f" (FAILED: {error})" if error else ""))
+        for package, us in slowest:
+            print(f"  {package:<32} {us / 1e3:9.1f} ms  {us / total:6.1%}" if total else f"  {package}")
+        results.append({
+            "target": name,
+            "wall_seconds": round(wall, 3),
+            "import_seconds": round(total / 1e6, 3),
+            "error": error,
+            "packages_ms": {package: round(us / 1e3, 1) for package, us in slowest},
+        })
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--target", action="append", choices=sorted(TARGETS), help="Entry point to profile (repeatable); default all")
+    parser.add_argument("--top", type=int, default=10, help="Packages to list per entry point")
+    parser.add_argument("--output", help="Optional path to write results as JSON")
+    args = parser.parse_args()
+
+    results = run(args.target or list(TARGETS), args.top)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+# benchmarks/synthetic.py
+import random
+
+FIRST_NAMES = ["Ava", "Liam", "Noah", "Emma", "Mia", "Ethan", "Priya", "Arjun", "Sofia", "Lucas", "Chen", "Fatima"]
+LAST_NAMES = ["Smith", "Patel", "Garcia", "Kim", "Nguyen", "Johnson", "Mehta", "Rossi", "Müller", "Okafor"]
+INDUSTRIES = ["fintech", "healthcare", "retail", "logistics", "edtech", "manufacturing", "saas", "insurance"]
+TITLES = ["CEO", "CTO", "VP Sales", "Head of Growth", "Sales Manager", "RevOps Lead", "Founder"]
+CRMS = ["HubSpot", "Salesforce", "Zoho", "Excel/Spreadsheets", "None"]
+SECTION_TITLES = ["Overview", "Pricing", "Integrations", "Security", "Onboarding", "Support", "Case Study", "Roadmap"]
+WORDS = ["pipeline", "automation", "follow-up", "reporting", "dashboard", "integration", "leads", "quota", "demo"]
+
+
+def generate_lead_rows(n, seed=0):
+    """Return `n` synthetic lead rows as dicts with CRM-export style columns."""
+    rng = random.Random(seed)
+    rows = []
+    for i in range(n):
+        first, last = rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES)
+        company = f"{rng.choice(LAST_NAMES)} {rng.choice(['Labs', 'Systems', 'Group', 'Tech', 'Partners'])} {i % 997}"
+        rows.append({
+            "name": f"{first} {last}",
+            "email": f"{first.lower()}.{last.lower()}{i}@example.com",
+            "company": company,
+            "title": rng.choice(TITLES),
+            "industry": rng.choice(INDUSTRIES),
+            "employees": rng.choice([5, 12, 25, 50, 120, 300, 800, 2500]),
+            "current_crm": rng.choice(CRMS),
+            "notes": " ".join(rng.choice(WORDS) for _ in range(rng.randint(5, 15))),
+        })
+    return rows
+
+
+def generate_lead_texts(n, seed=0):
+    """Return `n` lead rows flattened the same way `VectorDB.extract_chunks_from_csv` does."""
+    return [" | ".join(str(v) for v in row.values()) for row in generate_lead_rows(n, seed)]
+
+
+def generate_document(n_sections, seed=0):
+    """Return a long prose document with "Title:" section headers, like the FAQ and uploaded TXT/PDF files."""
+    rng = random.Random(seed)
+    sections = []
+    for i in range(n_sections):
+        paragraphs = [
+            " ".join(
+                f"{rng.choice(INDUSTRIES).capitalize()} teams use {' '.join(rng.choice(WORDS) for _ in range(rng.randint(4, 12)))}."
+                for _ in range(rng.randint(2, 8))
+            )
+            for _ in range(rng.randint(1, 5))
+        ]
+        sections.append(f"{rng.choice(SECTION_TITLES)} {i}:\n" + "\n\n".join(paragraphs))
+    return "\n\n".join(sections)
+
+
+def write_lead_csv(path, n, seed=0):
+    """Write `n` synthetic lead rows to a CSV file, as a CRM export would be uploaded."""
+    import csv
+
+    rows = generate_lead_rows(n, seed)
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.DictWriter(f, fieldnames=list(rows[0]))
+        writer.writeheader()
+        writer.writerows(rows)
+    return path
+
+
+def generate_faq(n_sections, seed=0):
+    """Return an FAQ corpus in the layout of data/company_faq.txt: "Topic:" headers over Q/A paragraphs."""
+    rng = random.Random(seed)
+    sections = []
+    for i in range(n_sections):
+        topic = f"{rng.choice(SECTION_TITLES)} {i}"
+        answers = []
+        for _ in range(rng.randint(1, 4)):
+            feature = " ".join(rng.choice(WORDS) for _ in range(rng.randint(2, 4)))
+            answers.append(
+                f"Q: How does {feature} work for {rng.choice(INDUSTRIES)} teams?\n"
+                f"A: {rng.choice(CRMS)} users get {feature} "
+                f"{' '.join(rng.choice(WORDS) for _ in range(rng.randint(6, 20)))}."
+            )
+        sections.append(f"{topic}:\n" + "\n\n".join(answers))
+    return "\n\n".join(sections)
+
+
+def _pdf_escape(line):
+    return line.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)").encode("latin-1", "replace")
+
+
+def write_pdf(path, n_pages, seed=0, lines_per_page=45, chars_per_line=90):
+    """
+    Write an `n_pages` PDF of `generate_document` prose, one Helvetica text block per page.
+
+    The file is assembled by hand (no PDF library needed) and is readable by PyPDF2.
+    """
+    import textwrap
+
+    lines = []
+    for paragraph in generate_document(max(1, n_pages * 3), seed).split("\n"):
+        lines.extend(textwrap.wrap(paragraph, chars_per_line) or [""])
+    pages = [lines[i:i + lines_per_page] for i in range(0, lines_per_page * n_pages, lines_per_page)]
+
+    # Objects: 1 catalog, 2 page tree, 3 font, then a (page, content stream) pair per page
+    objects = [b"<< /Type /Catalog /Pages 2 0 R >>", None, b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"]
+    page_refs = []
+    for page_lines in pages:
+        stream = b"BT /F1 10 Tf 12 TL 50 800 Td " + b" ".join(b"(" + _pdf_escape(line) + b") Tj T*" for line in page_lines) + b" ET"
+        page_refs.append(f"{len(objects) + 1} 0 R")
+        objects.append(
+            f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] /Resources << /Font << /F1 3 0 R >> >> "
+            f"/Contents {len(objects) + 2} 0 R >>".encode()
+        )
+        objects.append(b"<< /Length " + str(len(stream)).encode() + b" >>\nstream\n" + stream + b"\nendstream")
+    objects[1] = f"<< /Type /Pages /Kids [{' '.join(page_refs)}] /Count {len(page_refs)} >>".encode()
+
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += f"{number} 0 obj\n".encode() + body + b"\nendobj\n"
+    xref = len(out)
+    out += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode()
+    out += b"".join(f"{offset:010d} 00000 n \n".encode() for offset in offsets)
+    out += f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n".encode()
+    with open(path, "wb") as f:
+        f.write(out)
+    return path
@@ -0,0 +1,21 @@
+import pytest
+
+from app import vector_db as vector_db_module
+from app.embeddings import BulkEmbedder
+from app.text_splitter import TokenTextSplitter
+from tests.fakes import HashEmbeddings, WordTokenizer
+
+
+@pytest.fixture
+def embeddings():
+    return HashEmbeddings()
+
+
+@pytest.fixture
+def make_vector_db(monkeypatch, embeddings):
+    """Builds real VectorDBs on hashed bag-of-words embeddings and a word tokenizer, without model downloads."""
+    bulk_embedder = BulkEmbedder(model=embeddings, batch_size=4, min_parallel_texts=8)
+    monkeypatch.setattr(vector_db_module, "get_embeddings", lambda: embeddings)
+    monkeypatch.setattr(vector_db_module, "get_bulk_embedder", lambda: bulk_embedder)
+    monkeypatch.setattr(vector_db_module, "get_text_splitter", lambda: TokenTextSplitter(WordTokenizer(), 64, 8))
+    return vector_db_module.VectorDB
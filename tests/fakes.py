@@ -0,0 +1,51 @@
+import re
+import zlib
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+_WORD = re.compile(r"\w+|[^\w\s]")
+
+
+class WordEncoding:
+    def __init__(self, text):
+        self.offsets = [(m.start(), m.end()) for m in _WORD.finditer(text)]
+        self.ids = list(range(len(self.offsets)))
+
+
+class WordTokenizer:
+    """One token per word or punctuation mark, with the character offsets a `tokenizers.Tokenizer` reports."""
+
+    def encode(self, text, add_special_tokens=True):
+        return WordEncoding(text)
+
+    def encode_batch(self, texts, add_special_tokens=True):
+        return [WordEncoding(text) for text in texts]
+
+
+class HashEmbeddings(Embeddings):
+    """
+    Unit-norm bag-of-words vectors, so texts sharing words are close. Serves as both the query
+    model (embed_query/embed_documents) and the SentenceTransformer-like `encode` BulkEmbedder calls.
+    """
+
+    def __init__(self, dim=64):
+        self.dim = dim
+        self.encoded = []  # batch sizes passed to encode()
+
+    def _vector(self, text):
+        vector = np.zeros(self.dim, dtype="float32")
+        for word in re.findall(r"\w+", text.lower()):
+            vector[zlib.crc32(word.encode("utf-8")) % self.dim] += 1.0
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def encode(self, texts, batch_size=32, show_progress_bar=False, convert_to_numpy=True):
+        self.encoded.append(len(texts))
+        return np.stack([self._vector(text) for text in texts])
+
+    def embed_documents(self, texts):
+        return [self._vector(text).tolist() for text in texts]
+
+    def embed_query(self, text):
+        return self._vector(text).tolist()
@@ -0,0 +1,69 @@
+import time
+import threading
+import pytest
+from fastapi.testclient import TestClient
+import api.main as main
+
+
+class FakeRetrievalClient:
+    def __init__(self, faq_chunks=12, up=True):
+        self.faq_chunks, self.up = faq_chunks, up
+
+    def health(self):
+        if not self.up:
+            raise ConnectionError("connection refused")
+        return {"status": "ok", "faq_chunks": self.faq_chunks}
+
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setattr(main, "readiness", {"models_warm": False, "faq_index": False, "warmup_seconds": None, "error": None})
+    return TestClient(main.app)
+
+
+def test_warm_up_with_retrieval_service_skips_local_models(monkeypatch, client):
+    import app.chatbot
+    import app.embeddings
+    monkeypatch.setattr(main, "RETRIEVAL_SERVICE_URL", "http://127.0.0.1:8765")
+    monkeypatch.setattr(main, "get_retrieval_client", lambda: FakeRetrievalClient())
+    monkeypatch.setattr(app.chatbot, "get_llm", lambda: object())
+    monkeypatch.setattr(app.embeddings, "get_embeddings", lambda: pytest.fail("embedding model loaded locally"))
+
+    main.warm_up()
+    response = client.get("/ready")
+    assert response.status_code == 200
+    assert response.json()["retrieval_service"] is True
+    assert response.json()["faq_index"] is True
+
+
+def test_not_ready_while_retrieval_service_is_down(monkeypatch, client):
+    monkeypatch.setattr(main, "RETRIEVAL_SERVICE_URL", "http://127.0.0.1:8765")
+    monkeypatch.setattr(main, "get_retrieval_client", lambda: FakeRetrievalClient(up=False))
+    main.readiness["models_warm"] = True
+    response = client.get("/ready")
+    assert response.status_code == 503
+    assert "unreachable" in response.json()["error"]
+
+
+def test_not_ready_until_warm(client):
+    assert client.get("/ready").status_code == 503
+
+
+def test_health_is_served_while_models_warm(monkeypatch, client):
+    release = threading.Event()
+
+    def slow_warm_up():
+        release.wait(5)
+        main.readiness["models_warm"] = True
+
+    monkeypatch.setattr(main, "RETRIEVAL_SERVICE_URL", None)
+    monkeypatch.setattr(main, "warm_up", slow_warm_up)
+    with client:
+        assert client.get("/health").json()["status"] == "ok"
+        assert client.get("/ready").status_code == 503
+        release.set()
+        for _ in range(100):
+            if client.get("/ready").status_code == 200:
+                break
+            time.sleep(0.02)
+        assert client.get("/ready").status_code == 200
@@ -0,0 +1,134 @@
+import asyncio
+import threading
+
+import pytest
+from fastapi.testclient import TestClient
+
+import api.main as main
+from api.limiter import ChatLimiter, Overloaded
+
+
+def blocking_call(release):
+    release.wait(5)
+    return "reply"
+
+
+async def started(limiter, running):
+    while limiter.running < running:
+        await asyncio.sleep(0.01)
+
+
+def test_runs_call_in_a_slot():
+    async def scenario():
+        limiter = ChatLimiter(max_concurrency=1, max_queue=1, queue_timeout=1, timeout=1)
+        assert await limiter.run(lambda a, b: a + b, 1, 2) == 3
+        await asyncio.sleep(0)
+        assert limiter.stats()["running"] == 0
+        limiter.shutdown()
+
+    asyncio.run(scenario())
+
+
+def test_rejects_with_429_when_the_queue_is_full():
+    async def scenario():
+        limiter = ChatLimiter(max_concurrency=1, max_queue=1, queue_timeout=5, timeout=5)
+        release = threading.Event()
+        first = asyncio.create_task(limiter.run(blocking_call, release))
+        await started(limiter, 1)
+        queued = asyncio.create_task(limiter.run(lambda: "queued"))
+        await asyncio.sleep(0.05)
+        assert limiter.waiting == 1
+
+        with pytest.raises(Overloaded) as excinfo:
+            await limiter.run(lambda: "rejected")
+        assert excinfo.value.status_code == 429
+
+        release.set()
+        assert await first == "reply"
+        assert await queued == "queued"
+        limiter.shutdown()
+
+    asyncio.run(scenario())
+
+
+def test_gives_up_with_503_after_waiting_too_long():
+    async def scenario():
+        limiter = ChatLimiter(max_concurrency=1, max_queue=4, queue_timeout=0.05, timeout=5)
+        release = threading.Event()
+        first = asyncio.create_task(limiter.run(blocking_call, release))
+        await started(limiter, 1)
+
+        with pytest.raises(Overloaded) as excinfo:
+            await limiter.run(lambda: "late")
+        assert excinfo.value.status_code == 503
+        assert limiter.waiting == 0
+
+        release.set()
+        await first
+        limiter.shutdown()
+
+    asyncio.run(scenario())
+
+
+def test_timed_out_call_keeps_its_slot_until_it_returns():
+    async def scenario():
+        limiter = ChatLimiter(max_concurrency=1, max_queue=4, queue_timeout=0.05, timeout=0.05)
+        release = threading.Event()
+        with pytest.raises(asyncio.TimeoutError):
+            await limiter.run(blocking_call, release)
+        assert limiter.running == 1
+
+        # The abandoned call still occupies the only slot
+        with pytest.raises(Overloaded):
+            await limiter.run(lambda: "next")
+
+        release.set()
+        while limiter.running:
+            await asyncio.sleep(0.01)
+        limiter.queue_timeout = limiter.timeout = 1
+        assert await limiter.run(lambda: "next") == "next"
+        limiter.shutdown()
+
+    asyncio.run(scenario())
+
+
+class StubLimiter:
+    timeout = 1
+
+    def __init__(self, error):
+        self.error = error
+
+    async def run(self, func, *args):
+        raise self.error
+
+
+@pytest.mark.parametrize("error, status_code", [
+    (Overloaded(429, "Too many chats in progress; retry shortly"), 429),
+    (Overloaded(503, "Chat service is busy; retry shortly"), 503),
+    (asyncio.TimeoutError(), 504),
+])
+def test_chat_endpoint_maps_limiter_errors(monkeypatch, error, status_code):
+    monkeypatch.setattr(main, "limiter", StubLimiter(error))
+    main.app.dependency_overrides[main.current_user] = lambda: "rep@example.com"
+    try:
+        response = TestClient(main.app).post("/chat", json={"message": "hi"})
+    finally:
+        main.app.dependency_overrides.clear()
+    assert response.status_code == status_code
+    if status_code != 504:
+        assert response.headers["Retry-After"] == "1"
+
+
+def test_async_turns_share_the_slots():
+    async def scenario():
+        limiter = ChatLimiter(max_concurrency=1, max_queue=0, queue_timeout=1, timeout=1)
+        async with limiter.admit():
+            assert limiter.running == 1
+            with pytest.raises(Overloaded) as excinfo:
+                await limiter.run(lambda: "blocking chat")
+            assert excinfo.value.status_code == 429
+        assert limiter.running == 0
+        assert await limiter.run(lambda: "blocking chat") == "blocking chat"
+        limiter.shutdown()
+
+    asyncio.run(scenario())
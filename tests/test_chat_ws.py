@@ -0,0 +1,119 @@
+import asyncio
+import threading
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from langchain_core.messages import AIMessageChunk
+import api.chat_ws as chat_ws
+from api.limiter import ChatLimiter, Overloaded
+import app.retriever
+
+
+class FakeLLM:
+    async def astream(self, messages, **kwargs):
+        for token in ("Happy ", "to help."):
+            yield AIMessageChunk(content=token)
+
+
+@pytest.fixture
+def session(monkeypatch):
+    """A session whose Mongo writes block until `writes_released` is set."""
+    session = chat_ws.ChatSession("lead@example.com")
+    session.writes_released = threading.Event()
+    session.escalations = []
+
+    def escalate(user_id, history, stage, intent, message_count):
+        session.escalations.append(message_count)
+        return " (escalated)"
+
+    monkeypatch.setattr(app.retriever, "retrieve_relevant_chunks", lambda message, namespace=None: "")
+    monkeypatch.setattr(chat_ws, "get_llm", lambda: FakeLLM())
+    monkeypatch.setattr(chat_ws, "count_tokens", lambda text: len(text.split()))
+    monkeypatch.setattr(chat_ws, "save_message", lambda *args, **kwargs: session.writes_released.wait(5))
+    monkeypatch.setattr(chat_ws, "escalation_notice", escalate)
+    monkeypatch.setattr(chat_ws, "detect_intent", lambda message, history: "interest")
+    yield session
+    session.writes_released.set()
+
+
+def run_turn(session):
+    async def turn():
+        session._writer = asyncio.create_task(session._write_messages())
+        frames = []
+
+        async def send(frame):
+            frames.append(frame)
+
+        try:
+            return await asyncio.wait_for(session.turn("Tell me more", send), 1), frames
+        finally:
+            session.writes_released.set()
+            await session.close()
+
+    return asyncio.run(turn())
+
+
+def test_turn_does_not_wait_for_message_writes(session, monkeypatch):
+    monkeypatch.setattr(chat_ws, "analyze_stage", lambda message, history: 2)
+    reply, frames = run_turn(session)
+    assert reply == "Happy to help."
+    assert [frame["content"] for frame in frames] == ["Happy ", "to help."]
+    assert session.escalations == []
+
+
+def test_escalating_turn_flushes_writes_first(session, monkeypatch):
+    monkeypatch.setattr(chat_ws, "analyze_stage", lambda message, history: 7)
+    session.message_count = 10
+    session.writes_released.set()
+    reply, _ = run_turn(session)
+    assert reply.endswith("(escalated)")
+    assert session.escalations == [12]
+    assert session._pending_writes.empty()
+
+
+class SlowLLM:
+    async def astream(self, messages, **kwargs):
+        yield AIMessageChunk(content="Let me think")
+        await asyncio.sleep(5)
+        yield AIMessageChunk(content=" about that.")
+
+
+class RejectingLimiter:
+    timeout = 1
+
+    def admit(self):
+        raise Overloaded(429, "Too many chats in progress; retry shortly")
+
+
+@pytest.fixture
+def socket_app(session, monkeypatch):
+    monkeypatch.setattr(chat_ws, "validate_token", lambda token: (True, "lead@example.com"))
+    monkeypatch.setattr(chat_ws, "get_full_session_history", lambda user_id: [])
+    monkeypatch.setattr(chat_ws, "get_escalation_status", lambda user_id: (True, False))
+    monkeypatch.setattr(chat_ws, "analyze_stage", lambda message, history: 2)
+    session.writes_released.set()
+    app = FastAPI()
+    app.include_router(chat_ws.router)
+    return app
+
+
+def test_socket_turn_is_cut_off_at_the_chat_timeout(socket_app, monkeypatch):
+    monkeypatch.setattr(chat_ws, "get_llm", lambda: SlowLLM())
+    socket_app.state.chat_limiter = ChatLimiter(max_concurrency=1, timeout=0.2)
+    with TestClient(socket_app).websocket_connect("/ws/chat?token=t") as websocket:
+        websocket.send_json({"message": "Tell me more"})
+        assert websocket.receive_json() == {"type": "token", "content": "Let me think"}
+        assert websocket.receive_json() == {"type": "error", "status": 504, "detail": "Chat timed out"}
+        # The slot is free again and the connection still serves turns
+        assert socket_app.state.chat_limiter.running == 0
+        monkeypatch.setattr(chat_ws, "get_llm", lambda: FakeLLM())
+        websocket.send_json({"message": "Tell me more"})
+        frames = [websocket.receive_json() for _ in range(3)]
+        assert frames[-1]["type"] == "done"
+
+
+def test_socket_turn_rejected_when_the_worker_is_full(socket_app):
+    socket_app.state.chat_limiter = RejectingLimiter()
+    with TestClient(socket_app).websocket_connect("/ws/chat?token=t") as websocket:
+        websocket.send_json({"message": "Tell me more"})
+        assert websocket.receive_json()["status"] == 429
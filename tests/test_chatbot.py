@@ -0,0 +1,32 @@
+from langchain_core.messages import AIMessage
+import app.chatbot as chatbot
+import app.retriever
+
+
+class FakeLLM:
+    def invoke(self, messages):
+        return AIMessage(content="Happy to help with that.")
+
+
+def test_chat_turn_tokenizes_each_message_once(monkeypatch):
+    counted, saved = [], []
+
+    def count_tokens(text):
+        counted.append(text)
+        return len(text.split())
+
+    monkeypatch.setattr(app.retriever, "retrieve_relevant_chunks", lambda message, namespace=None: "Pricing: 49 per seat")
+    monkeypatch.setattr(chatbot, "get_full_session_history", lambda user_id: [])
+    monkeypatch.setattr(chatbot, "analyze_stage", lambda message, history: 2)
+    monkeypatch.setattr(chatbot, "detect_intent", lambda message, history: "neutral")
+    monkeypatch.setattr(chatbot, "get_llm", lambda: FakeLLM())
+    monkeypatch.setattr(chatbot, "count_tokens", count_tokens)
+    monkeypatch.setattr(chatbot, "count_template_tokens", lambda text: len(text.split()))
+    monkeypatch.setattr(chatbot, "save_message", lambda user_id, sender, message, **kwargs: saved.append((sender, kwargs)))
+    monkeypatch.setattr(chatbot, "get_escalation_status", lambda user_id: (True, True))
+
+    assert chatbot.chat_with_lead("lead@example.com", "What does it cost?") == "Happy to help with that."
+    assert counted.count("What does it cost?") == 1
+    assert saved[0] == ("user", {"stage": 2, "intent": "neutral", "score": chatbot.calculate_lead_score(2, "neutral"),
+                                 "tokens": 4})
+    assert saved[1] == ("ai", {"tokens": 5})
@@ -0,0 +1,65 @@
+import pytest
+import app.context
+from app.context import assemble_context
+
+
+@pytest.fixture(autouse=True)
+def word_tokens(monkeypatch):
+    monkeypatch.setattr(app.context, "count_tokens", lambda text: len(text.split()))
+
+
+def chunk(text, score, similarity=None, lexical_score=None):
+    return {"text": text, "score": score, "similarity": similarity, "lexical_score": lexical_score}
+
+
+def leads(*chunks):
+    return {"name": "leads", "header": "Leads:", "empty": "No leads.", "chunks": list(chunks), "prefix": "Lead {n}: "}
+
+
+def test_chunks_below_both_thresholds_are_dropped():
+    context, stats = assemble_context([leads(
+        chunk("Ada Lovelace, Analytical Engines", 0.9, similarity=0.7),
+        chunk("Grace Hopper, Compilers Inc", 0.8, similarity=0.1, lexical_score=6.0),
+        chunk("Alan Turing, Bletchley Labs", 0.7, similarity=0.1, lexical_score=0.5),
+    )], token_budget=100)
+    assert "Ada" in context and "Grace" in context and "Alan" not in context
+    assert stats["dropped_irrelevant"] == 1
+
+
+def test_near_duplicates_keep_the_higher_scored_chunk():
+    context, stats = assemble_context([leads(
+        chunk("Ada Lovelace CTO Analytical Engines London", 0.5, similarity=0.6),
+        chunk("Ada Lovelace, CTO at Analytical Engines (London)", 0.9, similarity=0.8),
+    )], token_budget=100)
+    assert context == "Leads:\nLead 1: Ada Lovelace, CTO at Analytical Engines (London)"
+    assert stats["dropped_duplicates"] == 1
+
+
+def test_budget_keeps_the_best_chunks_that_fit_and_counts_the_header_once():
+    faq = {"name": "faq", "header": "FAQ:", "empty": "No FAQ.", "chunks": [
+        chunk("Pricing starts at 49 dollars per seat", 0.95, similarity=0.9),
+    ]}
+    context, stats = assemble_context([faq, leads(
+        chunk("Ada Lovelace Analytical Engines", 0.9, similarity=0.8),
+        chunk("Grace Hopper Compilers Inc with a much longer description of the account", 0.8, similarity=0.7),
+        chunk("Alan Turing Bletchley", 0.7, similarity=0.6),
+    )], token_budget=23)
+    assert "Grace" not in context and "Alan" in context
+    assert stats["dropped_over_budget"] == 1
+    # 7 + 1 for the FAQ header; 6 + 1 header and 5 for the two leads (with their "Lead n:" prefixes)
+    assert (stats["faq"]["tokens"], stats["leads"]["tokens"], stats["total_tokens"]) == (8, 12, 20)
+
+
+def test_leads_are_numbered_after_filtering():
+    context, _ = assemble_context([leads(
+        chunk("Ada Lovelace", 0.9, similarity=0.8),
+        chunk("Grace Hopper", 0.8, similarity=0.1),
+        chunk("Alan Turing", 0.7, similarity=0.6),
+    )], token_budget=100)
+    assert context == "Leads:\nLead 1: Ada Lovelace\nLead 2: Alan Turing"
+
+
+def test_empty_section_uses_its_placeholder():
+    context, stats = assemble_context([leads(chunk("Ada Lovelace", 0.9, similarity=0.1))], token_budget=100)
+    assert context == "No leads."
+    assert stats["leads"] == {"chunks": 0, "tokens": 0}
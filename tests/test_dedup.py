@@ -0,0 +1,76 @@
+import pandas as pd
+from app.dedup import LeadDeduplicator
+
+COLUMNS = ["name", "company", "title", "city", "industry", "employees", "email", "crm", "phone"]
+
+
+def lead(name, company, email, phone=None, title="Head of Sales", city="London", industry="Fintech"):
+    return {"name": name, "company": company, "title": title, "city": city, "industry": industry,
+            "employees": 250, "email": email, "crm": "Salesforce", "phone": phone}
+
+
+LEADS = pd.DataFrame([
+    lead("Ada Lovelace", "Analytical Engines Ltd", "ada@engines.io"),
+    lead("Grace Hopper", "Compilers Inc", "grace@compilers.io", city="New York", industry="Software"),
+    lead("Alan Turing", "Bletchley Labs", "alan@bletchley.io", city="Manchester", industry="Research"),
+], columns=COLUMNS)
+
+
+def test_exact_duplicates_within_a_file_collapse():
+    rows = pd.concat([LEADS, LEADS.iloc[[0, 0]]], ignore_index=True)
+    # Case and whitespace differences still count as exact duplicates
+    rows.loc[len(rows)] = {**LEADS.iloc[1].to_dict(), "name": "GRACE   hopper"}
+    new_rows, keys, merges, report = LeadDeduplicator().deduplicate(rows)
+    assert list(new_rows["name"]) == ["Ada Lovelace", "Grace Hopper", "Alan Turing"]
+    assert keys == [0, 1, 2]
+    assert (report["exact_duplicates"], report["near_duplicates"]) == (3, 0)
+    assert report["dedup_ratio"] == round(3 / 6, 4)
+    assert merges == {}
+
+
+def test_near_duplicate_fills_empty_fields_of_the_canonical_row():
+    rows = pd.DataFrame([
+        lead("Ada Lovelace", "Analytical Engines Ltd", "ada@engines.io"),
+        lead("Ada Lovelace", "Analytical Engines Ltd.", "ada@engines.io", phone="+44 20 7946 0000"),
+    ], columns=COLUMNS)
+    new_rows, _, _, report = LeadDeduplicator().deduplicate(rows)
+    assert report["near_duplicates"] == 1
+    assert len(new_rows) == 1
+    assert new_rows.loc[0, "phone"] == "+44 20 7946 0000"
+
+
+def test_rows_with_different_emails_are_never_merged():
+    rows = pd.DataFrame([
+        lead("Sam Lee", "Acme Corp", "sam.lee@acme.com"),
+        lead("Sam Lee", "Acme Corp", "slee@acme.com"),
+    ], columns=COLUMNS)
+    new_rows, _, _, report = LeadDeduplicator().deduplicate(rows)
+    assert len(new_rows) == 2 and report["near_duplicates"] == 0
+
+
+def test_later_import_merges_into_leads_from_an_earlier_one():
+    dedup = LeadDeduplicator()
+    _, first_keys, _, _ = dedup.deduplicate(LEADS)
+
+    update = pd.DataFrame([
+        lead("Ada Lovelace", "Analytical Engines Ltd.", "ada@engines.io", phone="+44 20 7946 0000"),
+        lead("Katherine Johnson", "Langley Research", "kj@langley.gov", city="Hampton", industry="Aerospace"),
+    ], columns=COLUMNS)
+    new_rows, new_keys, merges, report = dedup.deduplicate(update)
+    assert list(new_rows["name"]) == ["Katherine Johnson"]
+    assert new_keys == [3]
+    assert merges[first_keys[0]]["phone"] == "+44 20 7946 0000"
+    assert report["near_duplicates"] == 1
+
+
+def test_forgotten_leads_are_new_on_the_next_import():
+    dedup = LeadDeduplicator()
+    _, keys, _, _ = dedup.deduplicate(LEADS)
+    # Only the first lead reached the index before the import was cancelled
+    dedup.forget(keys[1:])
+
+    new_rows, new_keys, merges, report = dedup.deduplicate(LEADS)
+    assert list(new_rows["name"]) == ["Grace Hopper", "Alan Turing"]
+    assert report["exact_duplicates"] == 1
+    assert list(merges) == [keys[0]]
+    assert not set(new_keys) & set(keys)
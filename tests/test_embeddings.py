@@ -0,0 +1,77 @@
+import numpy as np
+from langchain_core.documents import Document
+from app.embeddings import BulkEmbedder
+
+
+class PooledModel:
+    """A SentenceTransformer-like model; the "pool" encodes chunks in reverse to show results are re-ordered."""
+
+    def __init__(self):
+        self.calls = []
+
+    def _vectors(self, texts):
+        return np.array([[float(text.split()[-1]), 1.0] for text in texts], dtype="float32")
+
+    def encode(self, texts, batch_size=32, show_progress_bar=False, convert_to_numpy=True):
+        self.calls.append(("encode", len(texts), batch_size))
+        return self._vectors(texts)
+
+    def start_multi_process_pool(self, target_devices):
+        self.calls.append(("start", len(target_devices)))
+        return "pool"
+
+    def stop_multi_process_pool(self, pool):
+        self.calls.append(("stop",))
+
+    def encode_multi_process(self, texts, pool, batch_size=32, chunk_size=None):
+        self.calls.append(("pool", len(texts), batch_size, chunk_size))
+        chunks = [(start, texts[start:start + chunk_size]) for start in range(0, len(texts), chunk_size)]
+        results = {start: self._vectors(chunk) for start, chunk in reversed(chunks)}
+        return np.vstack([results[start] for start, _ in chunks])
+
+
+def texts(n):
+    return [f"lead {i}" for i in range(n)]
+
+
+def test_small_inputs_skip_the_pool():
+    model = PooledModel()
+    embedder = BulkEmbedder(model=model, batch_size=16, num_workers=4, min_parallel_texts=100)
+    vectors = embedder.embed_documents(texts(10))
+    assert [vector[0] for vector in vectors] == list(range(10))
+    assert model.calls == [("encode", 10, 16)]
+
+
+def test_large_inputs_fan_out_across_workers_in_input_order():
+    model = PooledModel()
+    with BulkEmbedder(model=model, batch_size=16, num_workers=4, min_parallel_texts=100) as embedder:
+        vectors = embedder.embed_documents(texts(1000))
+    assert [vector[0] for vector in vectors] == list(range(1000))
+    # One pool for the run, sized to the workers; chunks of len / (workers * 4)
+    assert model.calls == [("start", 4), ("pool", 1000, 16, 62), ("stop",)]
+
+
+def test_models_without_a_pool_encode_in_process(embeddings):
+    # Like OnnxEmbeddings, which already spreads one batch across all cores
+    embedder = BulkEmbedder(model=embeddings, batch_size=8, num_workers=4, min_parallel_texts=1)
+    assert not embedder.supports_pool
+    assert len(embedder.embed_documents(texts(20))) == 20
+    assert embeddings.encoded == [20]
+
+
+def test_batches_are_yielded_in_order():
+    embedder = BulkEmbedder(model=PooledModel(), batch_size=4, min_parallel_texts=8)
+    batches = list(embedder.iter_embedded_batches(texts(20), rows_per_batch=8))
+    assert [len(batch) for batch, _ in batches] == [8, 8, 4]
+    assert [vector[0] for _, vectors in batches for vector in vectors] == list(range(20))
+
+
+def test_vector_db_appends_and_reports_each_batch(make_vector_db):
+    vector_db = make_vector_db()
+    appended = []
+    documents = [Document(page_content=f"lead number {i}") for i in range(70)]
+    # The test embedder embeds 32 rows per batch (see conftest)
+    assert vector_db.add_documents(documents, on_append=lambda first_id, count: appended.append((first_id, count))) == 0
+    assert appended == [(0, 32), (32, 32), (64, 6)]
+    assert len(vector_db) == 70
+    assert vector_db._get_document(45).page_content == "lead number 45"
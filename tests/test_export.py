@@ -0,0 +1,98 @@
+import json
+from datetime import datetime
+
+import pytest
+from bson import ObjectId
+
+from app import export
+from app.export import ExportRun, NdjsonWriter
+
+IDS = [str(ObjectId(f"{i:024x}")) for i in range(1, 8)]
+
+
+class FakeConversations:
+    """Stands in for iter_conversations over seven conversations, optionally failing after `fail_after` records."""
+
+    def __init__(self, fail_after=None):
+        self.fail_after = fail_after
+        self.calls = []
+
+    def __call__(self, since=None, escalated=None, stage=None, after=None, max_messages=None, batch_size=None):
+        self.calls.append(after)
+        for n, _id in enumerate(_id for _id in IDS if after is None or ObjectId(_id) > after):
+            if self.fail_after is not None and n >= self.fail_after:
+                raise ConnectionError("cursor lost")
+            yield {"_id": _id, "user_id": f"lead{_id[-1]}@example.com", "stage": 2,
+                   "updated_at": datetime(2026, 3, 2), "messages": []}
+
+
+def exported_ids(path):
+    with open(path) as f:
+        return [json.loads(line)["_id"] for line in f]
+
+
+def checkpoint(path):
+    with open(f"{path}.checkpoint.json") as f:
+        return json.load(f)
+
+
+def test_full_export_and_rerun(tmp_path, monkeypatch):
+    output = str(tmp_path / "conversations.ndjson")
+    conversations = FakeConversations()
+    monkeypatch.setattr(export, "iter_conversations", conversations)
+
+    progress = ExportRun(output, batch_size=3).run()
+    assert progress["status"] == "done" and progress["rows"] == 7
+    assert exported_ids(output) == IDS
+    assert checkpoint(output)["written"]["bytes"] == (tmp_path / "conversations.ndjson").stat().st_size
+
+    assert ExportRun(output, batch_size=3).run()["rows"] == 7
+    assert len(conversations.calls) == 1
+
+
+def test_resume_drops_the_uncommitted_tail(tmp_path, monkeypatch):
+    output = str(tmp_path / "conversations.ndjson")
+    monkeypatch.setattr(export, "iter_conversations", FakeConversations(fail_after=5))
+    with pytest.raises(ConnectionError):
+        ExportRun(output, batch_size=2).run()
+    assert checkpoint(output)["status"] == "running"
+    assert checkpoint(output)["rows"] == 4
+    assert checkpoint(output)["last_id"] == IDS[3]
+    # A batch that was being written when the process died
+    with open(output, "a") as f:
+        f.write(json.dumps({"_id": IDS[4]}) + "\n{\"_id\": \"half a li")
+
+    conversations = FakeConversations()
+    monkeypatch.setattr(export, "iter_conversations", conversations)
+    progress = ExportRun(output, batch_size=2).run()
+    assert conversations.calls == [ObjectId(IDS[3])]
+    assert progress["rows"] == 7 and progress["last_id"] == IDS[-1]
+    assert exported_ids(output) == IDS
+
+
+def test_checkpoint_of_a_different_export_is_rejected(tmp_path, monkeypatch):
+    output = str(tmp_path / "conversations.ndjson")
+    monkeypatch.setattr(export, "iter_conversations", FakeConversations(fail_after=3))
+    with pytest.raises(ConnectionError):
+        ExportRun(output, batch_size=1, stage=2).run()
+    with pytest.raises(ValueError, match="different export"):
+        ExportRun(output, batch_size=1, stage=3).run()
+
+
+def test_ndjson_writer_truncates_to_the_checkpoint(tmp_path):
+    path = str(tmp_path / "out" / "conversations.ndjson")
+    writer = NdjsonWriter(path)
+    writer.write_batch([{"_id": "a"}])
+    committed = writer.commit()
+    writer.write_batch([{"_id": "b"}])
+    writer.close()
+
+    writer = NdjsonWriter(path, committed["bytes"])
+    writer.write_batch([{"_id": "c"}])
+    writer.close()
+    assert exported_ids(path) == ["a", "c"]
+
+
+def test_unknown_format_is_rejected(tmp_path):
+    with pytest.raises(ValueError):
+        ExportRun(str(tmp_path / "out.csv"), format="csv")
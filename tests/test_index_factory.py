@@ -0,0 +1,77 @@
+import functools
+import numpy as np
+import faiss
+import pytest
+from langchain_core.documents import Document
+from app import vector_db as vector_db_module
+from app.index_factory import (
+    build_index, configure_search, factory_string, filtered_search_params, maybe_upgrade_index,
+)
+
+
+def unit_vectors(n, dim=32, seed=0):
+    vectors = np.random.default_rng(seed).normal(size=(n, dim)).astype("float32")
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def flat(vectors):
+    index = faiss.IndexFlatL2(vectors.shape[1])
+    index.add(vectors)
+    return index
+
+
+def test_factory_strings():
+    assert factory_string("flat", 384, 10) == "Flat"
+    assert factory_string("hnsw", 384, 10).startswith("HNSW")
+    # 384 splits evenly into 48 sub-vectors; IVF lists scale with the corpus
+    assert factory_string("ivfpq", 384, 1_000_000) == "IVF4000,PQ48x8"
+    assert factory_string("ivfsq8", 384, 10_000) == "IVF256,SQ8"
+    with pytest.raises(ValueError):
+        factory_string("annoy", 384, 10)
+
+
+def test_small_or_flat_configured_indexes_are_not_upgraded():
+    index = flat(unit_vectors(100))
+    assert maybe_upgrade_index(index, "hnsw", threshold=1000) is index
+    assert maybe_upgrade_index(index, "flat", threshold=10) is index
+
+
+@pytest.mark.parametrize("index_type", ["hnsw", "ivfsq8"])
+def test_upgrade_keeps_row_ids(index_type):
+    vectors = unit_vectors(2000)
+    upgraded = maybe_upgrade_index(flat(vectors), index_type, threshold=1000)
+    assert not isinstance(upgraded, faiss.IndexFlat)
+    assert upgraded.ntotal == 2000
+    # Each vector still finds itself at its original row id
+    _, ids = upgraded.search(vectors[:50], 1)
+    assert (ids[:, 0] == np.arange(50)).mean() >= 0.95
+    # An upgraded index isn't rebuilt again as it grows
+    assert maybe_upgrade_index(upgraded, index_type, threshold=1000) is upgraded
+
+
+def test_filtered_search_only_returns_candidates():
+    vectors = unit_vectors(2000)
+    candidates = np.arange(0, 2000, 7)
+    for index in (flat(vectors), build_index(vectors, "hnsw"), build_index(vectors, "ivfsq8")):
+        params, selector = filtered_search_params(index, candidates)
+        _, ids = index.search(vectors[:5], 10, params=params)
+        found = ids[ids != -1]
+        assert len(found) and set(found.tolist()) <= set(candidates.tolist())
+
+
+def test_configure_search_caps_nprobe_at_the_list_count():
+    index = build_index(unit_vectors(2000), "ivfsq8")
+    configure_search(index, nprobe=10_000)
+    assert faiss.extract_index_ivf(index).nprobe == faiss.extract_index_ivf(index).nlist
+
+
+def test_vector_db_upgrades_once_past_the_threshold(make_vector_db, monkeypatch):
+    monkeypatch.setattr(vector_db_module, "maybe_upgrade_index",
+                        functools.partial(maybe_upgrade_index, index_type="hnsw", threshold=100))
+    vector_db = make_vector_db()
+    vector_db.add_embedded_documents([Document(page_content=f"row {i}") for i in range(60)], unit_vectors(60, 64))
+    assert vector_db.stats()["index_type"] == "IndexFlatL2"
+    vector_db.add_embedded_documents([Document(page_content=f"row {i}") for i in range(60, 120)], unit_vectors(60, 64, seed=1))
+    assert vector_db.stats()["index_type"] == "IndexHNSWFlat"
+    results = vector_db.query_vector_db("row 70", n_results=1, query_vector=unit_vectors(60, 64, seed=1)[10].tolist())
+    assert results["ids"][0] == [70] and results["documents"][0] == ["row 70"]
@@ -0,0 +1,151 @@
+import time
+import pytest
+from app.ingest_jobs import IngestJobManager, content_hash, CANCELLED, DONE, FAILED, ACTIVE_STATUSES
+
+
+class FakeVectorDB:
+    """Appends one row per line of a text file, reporting progress after each like VectorDB does."""
+
+    def __init__(self):
+        self.rows = []
+        self.calls = 0
+        self.after_append = None
+
+    def __len__(self):
+        return len(self.rows)
+
+    def create_vector_db_from_text(self, text, source_name="text_file", progress=None, skip=0):
+        self.calls += 1
+        if text.startswith("broken"):
+            raise ValueError("unreadable file")
+        lines = text.splitlines()[skip:]
+        for i, line in enumerate(lines, 1):
+            self.rows.append(line)
+            if self.after_append:
+                self.after_append(len(self.rows))
+            progress(i / len(lines), f"Embedded {i} of {len(lines)} chunks")
+        return bool(lines)
+
+
+def wait(job, timeout=5):
+    deadline = time.time() + timeout
+    while job.status in ACTIVE_STATUSES:
+        assert time.time() < deadline, f"job still {job.status}"
+        time.sleep(0.01)
+    return job
+
+
+@pytest.fixture
+def store():
+    return FakeVectorDB()
+
+
+@pytest.fixture
+def manager(store):
+    return IngestJobManager(store)
+
+
+TEXT = b"one\ntwo\nthree\nfour"
+
+
+def test_resubmitting_indexed_file_reuses_job(manager, store):
+    job = wait(manager.submit("faq.txt", TEXT))
+    assert job.status == DONE
+    assert manager.submit("faq.txt", TEXT) is job
+    assert store.calls == 1
+
+
+def test_cancelled_job_is_not_restarted_by_resubmit(manager, store):
+    store.after_append = lambda rows: rows == 2 and manager.cancel(content_hash(TEXT))
+    job = wait(manager.submit("faq.txt", TEXT))
+    assert job.status == CANCELLED
+    assert store.rows == ["one", "two"]
+
+    # A Streamlit rerun submits the same upload again
+    assert manager.submit("faq.txt", TEXT) is job
+    time.sleep(0.05)
+    assert job.status == CANCELLED
+    assert store.calls == 1
+
+
+def test_failed_job_is_not_reparsed_by_resubmit(manager, store):
+    job = wait(manager.submit("broken.txt", b"broken"))
+    assert job.status == FAILED
+    assert manager.submit("broken.txt", b"broken") is job
+    time.sleep(0.05)
+    assert store.calls == 1
+
+
+def test_retry_resumes_after_rows_already_indexed(manager, store):
+    store.after_append = lambda rows: rows == 2 and manager.cancel(content_hash(TEXT))
+    job = wait(manager.submit("faq.txt", TEXT))
+    assert job.status == CANCELLED
+
+    store.after_append = None
+    wait(manager.retry(job.id))
+    assert job.status == DONE
+    assert job.attempts == 2
+    assert store.rows == ["one", "two", "three", "four"]
+
+
+def test_retry_ignores_jobs_that_did_not_fail(manager, store):
+    job = wait(manager.submit("faq.txt", TEXT))
+    manager.retry(job.id)
+    time.sleep(0.05)
+    assert job.status == DONE
+    assert store.calls == 1
+    assert manager.retry("unknown") is None
+
+
+def test_clear_stops_the_worker_thread(manager, store):
+    wait(manager.submit("faq.txt", TEXT))
+    threads = list(manager._executor._threads)
+    manager.clear(wait=True)
+    assert threads and not any(thread.is_alive() for thread in threads)
+    with pytest.raises(RuntimeError):
+        manager.submit("other.txt", b"five")
+
+
+PAGES = [(n, f"Page {n} covers pricing tier {n} for fintech teams.") for n in range(1, 7)]
+
+
+def pdf_pages(fail_after=None):
+    def iter_pages(pdf_file, on_page_count=None):
+        on_page_count(len(PAGES))
+        for n, text in PAGES:
+            if fail_after is not None and n > fail_after:
+                raise ValueError("corrupt page stream")
+            yield n, text
+    return iter_pages
+
+
+def test_pdf_extraction_error_fails_the_import(make_vector_db, monkeypatch):
+    from app import vector_db as vector_db_module
+
+    vector_db = make_vector_db()
+    monkeypatch.setattr(vector_db_module, "iter_pdf_pages", pdf_pages(fail_after=4))
+    with pytest.raises(ValueError):
+        vector_db.create_vector_db_from_pdf(b"%PDF", docs_per_batch=2)
+    # The batches flushed before the error stay indexed, and nothing is appended twice
+    assert len(vector_db) == 4
+
+    monkeypatch.setattr(vector_db_module, "iter_pdf_pages", pdf_pages())
+    assert vector_db.create_vector_db_from_pdf(b"%PDF", docs_per_batch=2, skip=len(vector_db))
+    assert [doc.metadata["page"] for doc in map(vector_db._get_document, range(len(vector_db)))] == [1, 2, 3, 4, 5, 6]
+
+
+def test_failed_pdf_job_is_retried_from_where_it_stopped(make_vector_db, monkeypatch):
+    from app import vector_db as vector_db_module
+
+    vector_db = make_vector_db()
+    manager = IngestJobManager(vector_db)
+    monkeypatch.setattr(vector_db_module, "iter_pdf_pages", pdf_pages(fail_after=4))
+    job = wait(manager.submit("deck.pdf", b"%PDF deck"))
+    assert job.status == FAILED
+    assert "corrupt" in job.message
+
+    monkeypatch.setattr(vector_db_module, "iter_pdf_pages", pdf_pages())
+    wait(manager.retry(job.id))
+    assert job.status == DONE
+    assert len(vector_db) == len(PAGES)
+    manager.clear(wait=True)
@@ -0,0 +1,77 @@
+import time
+
+import pytest
+
+from app.knowledge_base import KnowledgeBase
+
+PRICING = "Pricing:\nQ: How much is a seat?\nA: Forty dollars per seat per month, billed yearly."
+SECURITY = "Security:\nQ: Is our data encrypted?\nA: Yes, at rest and in transit, with keys rotated monthly."
+ONBOARDING = "Onboarding:\nQ: How long does setup take?\nA: Most teams import their leads on the first day."
+
+
+@pytest.fixture
+def faq_dir(tmp_path):
+    (tmp_path / "pricing.txt").write_text(PRICING)
+    (tmp_path / "nested").mkdir()
+    (tmp_path / "nested" / "security.md").write_text(SECURITY)
+    (tmp_path / "nested" / "notes.csv").write_text("not,an,faq")
+    return tmp_path
+
+
+def test_directories_contribute_their_txt_and_md_files(make_vector_db, faq_dir):
+    knowledge_base = KnowledgeBase(paths=[str(faq_dir)], reload_interval=0)
+    assert knowledge_base.reload()
+    assert [path.rsplit("/", 1)[-1] for path in knowledge_base.files()] == ["pricing.txt", "security.md"]
+    assert knowledge_base.last_reload["files"] == 2
+    assert "encrypted" in knowledge_base.vector_db.query_vector_db("data encrypted", n_results=1)["documents"][0][0]
+
+
+def test_unchanged_files_are_not_reloaded(make_vector_db, faq_dir):
+    knowledge_base = KnowledgeBase(paths=[str(faq_dir)], reload_interval=0)
+    assert knowledge_base.reload()
+    vector_db = knowledge_base.vector_db
+    assert not knowledge_base.reload()
+    assert knowledge_base.vector_db is vector_db
+
+
+def test_only_changed_chunks_are_embedded_again(make_vector_db, embeddings, faq_dir):
+    knowledge_base = KnowledgeBase(paths=[str(faq_dir)], reload_interval=0)
+    knowledge_base.reload()
+    old_db, chunks = knowledge_base.vector_db, len(knowledge_base.vector_db)
+    embeddings.encoded.clear()
+
+    (faq_dir / "onboarding.txt").write_text(ONBOARDING)
+    assert knowledge_base.reload()
+    assert knowledge_base.last_reload["embedded"] == 1
+    assert knowledge_base.last_reload["reused"] == chunks
+    assert sum(embeddings.encoded) == 1
+    # The new index was swapped in whole; the old one, still held by queries in flight, is untouched
+    assert len(knowledge_base.vector_db) == chunks + 1
+    assert len(old_db) == chunks
+
+
+def test_failed_reload_keeps_the_previous_index(make_vector_db, faq_dir):
+    knowledge_base = KnowledgeBase(paths=[str(faq_dir / "pricing.txt")], reload_interval=0)
+    knowledge_base.reload()
+    vector_db = knowledge_base.vector_db
+
+    (faq_dir / "pricing.txt").write_text("   \n")
+    with pytest.raises(ValueError):
+        knowledge_base.reload()
+    assert knowledge_base.vector_db is vector_db
+    assert "Forty dollars" in vector_db.query_vector_db("seat price", n_results=1)["documents"][0][0]
+
+
+def test_watcher_picks_up_edits(make_vector_db, faq_dir):
+    knowledge_base = KnowledgeBase(paths=[str(faq_dir)], reload_interval=0.05)
+    knowledge_base.reload()
+    knowledge_base.start_watching()
+    try:
+        (faq_dir / "pricing.txt").write_text(PRICING.replace("Forty", "Fifty"))
+        deadline = time.monotonic() + 5
+        while "Fifty" not in knowledge_base.vector_db.query_vector_db("seat price", n_results=1)["documents"][0][0]:
+            assert time.monotonic() < deadline, "the edit was never picked up"
+            time.sleep(0.05)
+        assert knowledge_base.last_reload["embedded"] == 1
+    finally:
+        knowledge_base.stop_watching()
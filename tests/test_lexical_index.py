@@ -0,0 +1,49 @@
+from app.lexical_index import BM25Index, tokenize
+
+LEADS = [
+    "Ada Lovelace | Analytical Engines | CTO | ada@engines.io",
+    "Grace Hopper | Compilers Inc | VP Engineering | grace@compilers.io",
+    "Alan Turing | Bletchley Labs | Head of Research | alan@bletchley.io",
+]
+
+
+def index(texts=LEADS, start=0):
+    bm25 = BM25Index()
+    bm25.add(range(start, start + len(texts)), texts)
+    return bm25
+
+
+def test_tokenize_keeps_emails_whole():
+    assert "ada@engines.io" in tokenize("Contact ADA@engines.io today")
+
+
+def test_exact_name_ranks_first():
+    hits = index().search("Compilers Inc engineering", k=3)
+    assert hits[0][0] == 1
+    assert all(score > 0 for _, score in hits)
+    assert [score for _, score in hits] == sorted((score for _, score in hits), reverse=True)
+
+
+def test_email_lookup_ranks_its_row_first():
+    hits = index().search("alan@bletchley.io")
+    assert hits[0][0] == 2
+    # The whole-address term outweighs the ".io" every row shares
+    assert hits[0][1] > 3 * hits[1][1]
+
+
+def test_unknown_terms_and_empty_index_return_nothing():
+    assert index().search("zeppelin") == []
+    assert BM25Index().search("ada") == []
+
+
+def test_candidate_ids_restrict_scoring():
+    hits = index().search("ada grace alan", k=3, candidate_ids=[0, 2])
+    assert {row_id for row_id, _ in hits} == {0, 2}
+
+
+def test_incremental_adds_match_one_batch():
+    incremental = index(LEADS[:2])
+    incremental.add([2], LEADS[2:])
+    once = index()
+    assert incremental.search("head of research labs") == once.search("head of research labs")
+    assert len(incremental) == 3
@@ -0,0 +1,89 @@
+import pytest
+
+from app import db
+
+
+class FakeConversations:
+    """Evaluates the $match/$project pipeline get_messages_page sends, $slice included."""
+
+    def __init__(self, messages):
+        self.doc = {"user_id": "lead@example.com", "messages": messages}
+        self.pipelines = []
+
+    def aggregate(self, pipeline):
+        self.pipelines.append(pipeline)
+        match, project = pipeline[0]["$match"], pipeline[1]["$project"]
+        if self.doc["user_id"] != match["user_id"]:
+            return iter([])
+        messages = self.doc["messages"]
+        args = project["messages"]["$slice"][1:]
+        if len(args) == 1:
+            sliced = messages[args[0]:] if args[0] < 0 else messages[:args[0]]
+        else:
+            start, count = args
+            sliced = messages[start:start + count]
+        return iter([{"total": len(messages), "messages": sliced}])
+
+
+def conversation(n):
+    return [{"sender": "user" if i % 2 == 0 else "bot", "message": f"m{i}", "tokens": 2} for i in range(n)]
+
+
+@pytest.fixture
+def conversations(monkeypatch):
+    def install(n):
+        fake = FakeConversations(conversation(n))
+        monkeypatch.setattr(db, "conversations_collection", fake)
+        return fake
+    return install
+
+
+def texts(page):
+    return [message["message"] for message in page]
+
+
+def test_latest_page_and_cursor(conversations):
+    conversations(7)
+    page, cursor = db.get_messages_page("lead@example.com", limit=3)
+    assert texts(page) == ["m4", "m5", "m6"]
+    assert [message["_id"] for message in page] == ["4", "5", "6"]
+    assert cursor == 4
+
+
+def test_paging_back_to_the_start(conversations):
+    conversations(7)
+    seen = []
+    page, cursor = db.get_messages_page("lead@example.com", limit=3)
+    while True:
+        seen = texts(page) + seen
+        if cursor is None:
+            break
+        page, cursor = db.get_messages_page("lead@example.com", before=cursor, limit=3)
+    assert seen == [f"m{i}" for i in range(7)]
+    # The last page is the short one at the start of the conversation
+    assert texts(page) == ["m0"]
+
+
+def test_page_ending_exactly_at_the_first_message(conversations):
+    conversations(6)
+    page, cursor = db.get_messages_page("lead@example.com", before=3, limit=3)
+    assert texts(page) == ["m0", "m1", "m2"]
+    assert cursor is None
+
+
+def test_short_conversation_fits_one_page(conversations):
+    conversations(2)
+    page, cursor = db.get_messages_page("lead@example.com", limit=20)
+    assert texts(page) == ["m0", "m1"]
+    assert cursor is None
+
+
+def test_before_zero_does_not_query(conversations):
+    fake = conversations(4)
+    assert db.get_messages_page("lead@example.com", before=0, limit=3) == ([], None)
+    assert fake.pipelines == []
+
+
+def test_unknown_user_gets_an_empty_page(conversations):
+    conversations(4)
+    assert db.get_messages_page("someone@else.com", limit=3) == ([], None)
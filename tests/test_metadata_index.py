@@ -0,0 +1,86 @@
+import pandas as pd
+import pytest
+
+from app.metadata_index import MetadataIndex, detect_metadata_columns, split_metadata_columns
+
+LEADS = [
+    {"industry": "Fintech", "country": "UK", "employees": 40},
+    {"industry": "fintech", "country": "US", "employees": 120},
+    {"industry": "Healthcare", "country": "US", "employees": 55},
+    {"industry": "Retail", "country": None, "employees": "n/a"},
+]
+
+
+def index(leads=LEADS):
+    metadata_index = MetadataIndex()
+    metadata_index.register_columns(["industry", "country"], ["employees"])
+    metadata_index.add(range(len(leads)), leads)
+    return metadata_index
+
+
+def test_detect_metadata_columns_skips_free_text():
+    df = pd.DataFrame({
+        "name": [f"Lead {i}" for i in range(10)],
+        "industry": ["fintech", "retail"] * 5,
+        "employees": list(range(10)),
+    })
+    assert detect_metadata_columns(df) == (["industry"], ["employees"])
+
+
+def test_no_filters_means_no_restriction():
+    assert index().candidate_ids({}) is None
+
+
+def test_categorical_match_is_case_insensitive():
+    assert index().candidate_ids({"industry": "FINTECH"}).tolist() == [0, 1]
+
+
+def test_value_list_is_a_union():
+    assert index().candidate_ids({"industry": ["retail", "healthcare"]}).tolist() == [2, 3]
+
+
+def test_range_bounds():
+    metadata_index = index()
+    assert metadata_index.candidate_ids({"employees": {"$gte": 55}}).tolist() == [1, 2]
+    assert metadata_index.candidate_ids({"employees": {"$gt": 55}}).tolist() == [1]
+    assert metadata_index.candidate_ids({"employees": {"$lt": 55}}).tolist() == [0]
+    assert metadata_index.candidate_ids({"employees": {"$gte": 40, "$lte": 55}}).tolist() == [0, 2]
+    assert metadata_index.candidate_ids({"employees": {"$gt": 500}}).tolist() == []
+
+
+def test_range_index_picks_up_rows_added_after_a_query():
+    metadata_index = index()
+    assert metadata_index.candidate_ids({"employees": {"$gte": 100}}).tolist() == [1]
+    metadata_index.add([4], [{"industry": "retail", "employees": 300}])
+    assert metadata_index.candidate_ids({"employees": {"$gte": 100}}).tolist() == [1, 4]
+
+
+def test_filters_intersect():
+    filters = {"industry": "fintech", "country": "us", "employees": {"$gte": 50}}
+    assert index().candidate_ids(filters).tolist() == [1]
+    assert index().candidate_ids({"industry": "retail", "country": "uk"}).tolist() == []
+
+
+def test_unknown_operator_is_rejected():
+    with pytest.raises(ValueError):
+        index().candidate_ids({"employees": {"$ne": 5}})
+
+
+def test_split_metadata_columns_by_dtype():
+    df = pd.DataFrame({"name": ["Ada", "Grace"], "employees": [40, 120], "active": [True, False]})
+    assert split_metadata_columns(df, ["employees", "name", "active"]) == (["name", "active"], ["employees"])
+
+
+def test_infer_filters_from_query():
+    filters = index().infer_filters("Companies in the fintech industry with 50+ employees")
+    assert filters == {"industry": ["fintech"], "employees": {"$gte": 50.0}}
+
+
+def test_infer_filters_needs_the_column_named():
+    assert index().infer_filters("How does fintech pricing compare?") == {}
+    assert index().infer_filters("Which industries are healthcare or retail?") == {"industry": ["healthcare", "retail"]}
+
+
+def test_infer_filters_needs_whole_words():
+    # "uk" is shorter than three characters and "retailer" is not the value "retail"
+    assert index().infer_filters("any retailer in an industry based in the uk country") == {}
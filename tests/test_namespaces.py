@@ -0,0 +1,190 @@
+import gc
+import os
+import pickle
+import threading
+import pytest
+import app.namespaces as namespaces
+
+
+class FakeVectorDB:
+    """Just the VectorDB surface the registry uses: a row list, a version and pickle save/load."""
+
+    saves = []
+    on_save = None
+    on_load = None
+    loads = 0
+
+    def __init__(self, rows=None):
+        self.rows = list(rows or [])
+        self.version = 0
+
+    def __len__(self):
+        return len(self.rows)
+
+    def add(self, row):
+        self.rows.append(row)
+        self.version += 1
+
+    def create_vector_db_from_text(self, text, source_name="text_file", progress=None, skip=0):
+        for line in text.splitlines():
+            self.add(line)
+            progress(None, f"Indexed {line}")
+        return True
+
+    def save(self, path):
+        if FakeVectorDB.on_save:
+            FakeVectorDB.on_save()
+        with open(path, "wb") as f:
+            pickle.dump(self.rows, f)
+        FakeVectorDB.saves.append(path)
+        return self.version
+
+    @classmethod
+    def load(cls, path):
+        FakeVectorDB.loads += 1
+        if FakeVectorDB.on_load:
+            FakeVectorDB.on_load()
+        with open(path, "rb") as f:
+            return cls(pickle.load(f))
+
+    def clear_collection(self):
+        self.rows = []
+        self.version += 1
+
+    def stats(self):
+        return {"rows": len(self.rows)}
+
+
+@pytest.fixture
+def registry(monkeypatch, tmp_path):
+    monkeypatch.setattr(namespaces, "VectorDB", FakeVectorDB)
+    FakeVectorDB.saves, FakeVectorDB.on_save, FakeVectorDB.on_load, FakeVectorDB.loads = [], None, None, 0
+    return namespaces.NamespaceRegistry(root=str(tmp_path), max_resident=1)
+
+
+def test_least_recently_used_namespace_is_saved_and_evicted(registry):
+    registry.get("alice").add("lead a")
+    registry.get("bob")
+    assert list(registry._resident) == ["bob"]
+    assert len(FakeVectorDB.saves) == 1
+    gc.collect()
+    assert registry.get("alice").rows == ["lead a"]
+
+
+def test_pinned_namespace_is_not_evicted(registry):
+    with registry.use("alice") as alice:
+        registry.get("bob")
+        assert "alice" in registry._resident
+        alice.add("written while pinned")
+    registry.get("carol")
+    assert "alice" not in registry._resident
+    gc.collect()
+    assert registry.get("alice").rows == ["written while pinned"]
+
+
+def lock_checker(registry, results):
+    """Hook that records whether another tenant's request could take the registry lock right now."""
+    def try_lock():
+        acquired = registry._lock.acquire(timeout=1)
+        if acquired:
+            registry._lock.release()
+        results.append(acquired)
+
+    def check_lock():
+        thread = threading.Thread(target=try_lock)
+        thread.start()
+        thread.join()
+    return check_lock
+
+
+def test_save_runs_outside_the_registry_lock(registry):
+    lock_free_during_save = []
+    registry.get("alice").add("lead a")
+    FakeVectorDB.on_save = lock_checker(registry, lock_free_during_save)
+    registry.get("bob")
+    assert lock_free_during_save == [True]
+
+
+def test_load_runs_outside_the_registry_lock(registry):
+    registry.get("alice").add("lead a")
+    registry.get("bob")
+    gc.collect()
+    lock_free_during_load = []
+    FakeVectorDB.on_load = lock_checker(registry, lock_free_during_load)
+    assert registry.get("alice").rows == ["lead a"]
+    assert lock_free_during_load == [True]
+
+
+def test_concurrent_first_use_loads_once(registry):
+    registry.get("alice").add("lead a")
+    registry.get("bob")
+    gc.collect()
+    loading, release = threading.Event(), threading.Event()
+    FakeVectorDB.on_load = lambda: (loading.set(), release.wait(5))
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(registry.get("alice"))) for _ in range(3)]
+    for thread in threads:
+        thread.start()
+    assert loading.wait(5)
+    release.set()
+    for thread in threads:
+        thread.join()
+    assert FakeVectorDB.loads == 1
+    assert len({id(store) for store in results}) == 1
+
+
+def test_evicted_namespace_held_by_a_session_is_revived_not_reloaded(registry):
+    jobs = registry.ingest_jobs("alice")  # e.g. kept in st.session_state
+    alice = jobs.vector_db
+    registry.get("bob")
+    assert "alice" not in registry._resident
+
+    # A job submitted through the held manager revives and pins the same store while it writes
+    job = jobs.submit("notes.txt", b"late lead")
+    jobs._executor.shutdown(wait=True)
+    assert job.status == "done"
+    assert registry.get("alice") is alice
+    assert alice.rows == ["late lead"]
+
+    registry.get("bob")
+    registry.flush()
+    assert FakeVectorDB.load(registry._path("alice")).rows == ["late lead"]
+
+
+def test_clear_waits_for_the_running_job_to_stop(registry):
+    jobs = registry.ingest_jobs("alice")
+    store = jobs.vector_db
+    writing, release = threading.Event(), threading.Event()
+
+    def add(row):
+        store.rows.append(row)
+        store.version += 1
+        writing.set()
+        release.wait(5)
+    store.add = add
+
+    job = jobs.submit("notes.txt", b"one\ntwo\nthree")
+    assert writing.wait(5)
+    cleared = threading.Thread(target=registry.clear, args=("alice",))
+    cleared.start()
+    cleared.join(0.1)
+    assert cleared.is_alive()  # the job still holds the namespace
+
+    release.set()
+    cleared.join(5)
+    assert not cleared.is_alive()
+    assert job.status == "cancelled"
+    assert store.rows == []
+    registry.flush()
+    assert not os.path.exists(registry._path("alice"))
+    assert registry.get("alice") is not store
+
+
+def test_clear_refuses_a_namespace_still_in_use(registry):
+    with registry.use("alice") as alice:
+        alice.add("lead a")
+        with pytest.raises(namespaces.NamespaceBusy):
+            registry.clear("alice", timeout=0.05)
+        assert alice.rows == ["lead a"]
+    registry.clear("alice")
+    assert registry.get("alice").rows == []
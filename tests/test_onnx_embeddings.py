@@ -0,0 +1,31 @@
+import os
+import pytest
+import app.onnx_embeddings as onnx_embeddings
+from app.embeddings import get_embeddings
+from app.onnx_embeddings import OnnxEmbeddings, MODEL_NAME_FILE
+
+
+@pytest.fixture
+def models_dir(monkeypatch, tmp_path):
+    monkeypatch.setattr(onnx_embeddings, "ONNX_MODEL_DIR", None)
+    monkeypatch.chdir(tmp_path)
+    return tmp_path / "models"
+
+
+def export_stub(model_dir, hub_id=None):
+    """The files OnnxEmbeddings checks before loading anything."""
+    os.makedirs(model_dir)
+    (model_dir / "model.onnx").write_bytes(b"")
+    if hub_id:
+        (model_dir / MODEL_NAME_FILE).write_text(hub_id)
+
+
+def test_configured_model_picks_its_own_export(models_dir):
+    with pytest.raises(FileNotFoundError, match="paraphrase-MiniLM-L3-v2-onnx.*--model paraphrase-MiniLM-L3-v2"):
+        get_embeddings.__wrapped__("paraphrase-MiniLM-L3-v2", "onnx")
+
+
+def test_export_of_another_model_is_refused(models_dir):
+    export_stub(models_dir / "shared", "sentence-transformers/all-MiniLM-L6-v2")
+    with pytest.raises(ValueError, match="all-MiniLM-L6-v2, not sentence-transformers/paraphrase-MiniLM-L3-v2"):
+        OnnxEmbeddings("paraphrase-MiniLM-L3-v2", model_dir=str(models_dir / "shared"))
@@ -0,0 +1,126 @@
+import time
+import asyncio
+import logging
+import pytest
+from fastapi.testclient import TestClient
+import api.main as main
+import app.db
+import app.outbound
+
+
+class FakeRunStore:
+    """The outbound_runs collection helpers of app.db, over a dict shared like Mongo is by all workers."""
+
+    def __init__(self):
+        self.runs = {}
+
+    def claim(self, user_id, run_id, progress):
+        run = self.runs.get(user_id)
+        if run and run["progress"]["status"] == "running":
+            return False
+        self.runs[user_id] = {"run_id": run_id, "progress": progress, "cancel_requested": False}
+        return True
+
+    def update(self, user_id, run_id, progress):
+        run = self.runs.get(user_id)
+        if not run or run["run_id"] != run_id:
+            return False
+        run["progress"] = progress
+        return run["cancel_requested"]
+
+    def cancel(self, user_id):
+        run = self.runs.get(user_id)
+        if not run or run["progress"]["status"] != "running":
+            return False
+        run["cancel_requested"] = True
+        return True
+
+
+class FakeOutboundRun:
+    fail = False
+
+    def __init__(self, namespace, output_path, limit=None):
+        self.output_path = output_path
+        self.status = "pending"
+        self._cancelled = False
+
+    def cancel(self):
+        self._cancelled = True
+
+    def progress(self):
+        return {"status": self.status, "output": self.output_path}
+
+    async def run(self):
+        self.status = "running"
+        if self.fail:
+            raise RuntimeError("LLM client unavailable")
+        while not self._cancelled:
+            await asyncio.sleep(0.01)
+        self.status = "cancelled"
+        return self.progress()
+
+
+@pytest.fixture
+def store(monkeypatch, tmp_path):
+    store = FakeRunStore()
+    monkeypatch.setattr(app.db, "claim_outbound_run", store.claim)
+    monkeypatch.setattr(app.db, "update_outbound_run", store.update)
+    monkeypatch.setattr(app.db, "request_outbound_cancel", store.cancel)
+    monkeypatch.setattr(app.db, "get_outbound_run", store.runs.get)
+    monkeypatch.setattr(app.outbound, "OutboundRun", FakeOutboundRun)
+    monkeypatch.setattr(main, "OUTBOUND_DIR", str(tmp_path))
+    monkeypatch.setattr(main, "OUTBOUND_HEARTBEAT", 0.01)
+    monkeypatch.setattr(main, "warm_up", lambda: None)
+    main.app.dependency_overrides[main.current_user] = lambda: "lead@example.com"
+    yield store
+    main.app.dependency_overrides.clear()
+
+
+def wait_for_status(store, status):
+    deadline = time.monotonic() + 5
+    while store.runs["lead@example.com"]["progress"]["status"] != status:
+        assert time.monotonic() < deadline, store.runs
+        time.sleep(0.01)
+
+
+def test_run_held_by_another_worker_is_reported_and_not_restarted(store):
+    store.runs["lead@example.com"] = {"run_id": "other", "progress": {"status": "running", "output": "x.jsonl"},
+                                      "cancel_requested": False}
+    with TestClient(main.app) as client:
+        assert client.post("/outbound", json={}).status_code == 409
+        assert client.get("/outbound").json()["status"] == "running"
+        # The cancel is left for the worker running it
+        client.post("/outbound/cancel")
+        assert store.runs["lead@example.com"]["cancel_requested"]
+    assert main.outbound_runs == {}
+
+
+def test_cancel_requested_through_another_worker_stops_the_run(store):
+    with TestClient(main.app) as client:
+        assert client.post("/outbound", json={}).json()["status"] == "running"
+        wait_for_status(store, "running")
+        store.cancel("lead@example.com")
+        wait_for_status(store, "cancelled")
+        # The slot is free for the next run
+        assert client.post("/outbound", json={}).status_code == 200
+
+
+def test_failed_run_is_logged_and_recorded(store, monkeypatch, caplog):
+    monkeypatch.setattr(FakeOutboundRun, "fail", True)
+    with caplog.at_level(logging.ERROR, logger="api.main"), TestClient(main.app) as client:
+        client.post("/outbound", json={})
+        wait_for_status(store, "failed")
+    assert "LLM client unavailable" in caplog.text
+
+
+def test_claim_colliding_with_a_live_run_fails(monkeypatch):
+    from pymongo.errors import DuplicateKeyError
+
+    class LiveRunCollection:
+        def find_one_and_update(self, query, update, upsert):
+            # Mongo's answer when the filter excludes the user's document and the upsert reuses its _id
+            assert upsert and query["_id"] == "lead@example.com"
+            raise DuplicateKeyError("E11000 duplicate key error")
+
+    monkeypatch.setattr(app.db, "outbound_runs_collection", LiveRunCollection())
+    assert not app.db.claim_outbound_run("lead@example.com", "run", {"status": "running"})
@@ -0,0 +1,52 @@
+import io
+import time
+import multiprocessing
+import PyPDF2
+import pytest
+from app import pdf_ingest
+
+
+def blank_pdf(pages):
+    writer = PyPDF2.PdfWriter()
+    for _ in range(pages):
+        writer.add_blank_page(width=72, height=72)
+    buffer = io.BytesIO()
+    writer.write(buffer)
+    return buffer.getvalue()
+
+
+def stuck_after_first_range(start, stop):
+    """Stands in for _extract_page_range on a document whose later pages never finish parsing."""
+    if start:
+        time.sleep(60)
+    return [(i, f"page {i + 1}") for i in range(start, stop)]
+
+
+@pytest.fixture
+def stuck_pages(monkeypatch):
+    # Pool workers are forked, so they inherit the patched module
+    if multiprocessing.get_start_method() != "fork":
+        pytest.skip("needs forked pool workers")
+    monkeypatch.setattr(pdf_ingest, "_extract_page_range", stuck_after_first_range)
+
+
+def test_pages_stream_in_order_across_the_pool():
+    pages = list(pdf_ingest.iter_pdf_pages(blank_pdf(10), workers=3, pages_per_task=2))
+    assert [number for number, _ in pages] == list(range(1, 11))
+    assert multiprocessing.active_children() == []
+
+
+def test_time_limit_terminates_stuck_workers(stuck_pages):
+    start = time.monotonic()
+    pages = list(pdf_ingest.iter_pdf_pages(blank_pdf(8), max_seconds=0.5, workers=2, pages_per_task=2))
+    assert [number for number, _ in pages] == [1, 2]
+    assert time.monotonic() - start < 10
+    assert multiprocessing.active_children() == []
+
+
+def test_abandoned_import_terminates_workers(stuck_pages):
+    pages = pdf_ingest.iter_pdf_pages(blank_pdf(8), workers=2, pages_per_task=2)
+    assert next(pages) == (1, "page 1")
+    # What a cancelled ingest job does when it stops consuming pages
+    pages.close()
+    assert multiprocessing.active_children() == []
@@ -0,0 +1,91 @@
+from datetime import datetime
+
+import pytest
+
+from app import db
+
+NOW = datetime(2026, 3, 2, 9, 30)
+
+
+class FakeRollups:
+    """Applies $inc/$setOnInsert upserts to flat {dotted field: value} documents and records each update."""
+
+    def __init__(self):
+        self.docs = {}
+        self.updates = []
+
+    def update_one(self, query, update, upsert=False):
+        self.updates.append((query["_id"], update))
+        doc = self.docs.get(query["_id"])
+        if doc is None:
+            if not upsert:
+                return
+            doc = self.docs[query["_id"]] = dict(update.get("$setOnInsert", {}))
+        for key, n in update.get("$inc", {}).items():
+            doc[key] = doc.get(key, 0) + n
+
+
+@pytest.fixture
+def rollups(monkeypatch):
+    fake = FakeRollups()
+    monkeypatch.setattr(db, "pipeline_rollups_collection", fake)
+    return fake
+
+
+def current(rollups):
+    return {key: n for key, n in rollups.docs["current"].items() if n}
+
+
+def test_first_turn_counts_a_new_conversation(rollups):
+    db._update_pipeline_rollups(None, {"stage": 1, "intent": "neutral", "score": 10}, NOW)
+    assert rollups.docs["2026-03-02"] == {
+        "day": "2026-03-02", "turns": 1, "new_conversations": 1,
+        "stages.1": 1, "intents.neutral": 1, "scores.0-19": 1,
+    }
+    assert current(rollups) == {"conversations": 1, "stages.1": 1, "intents.neutral": 1, "scores.0-19": 1}
+
+
+def test_later_turn_moves_the_conversation_between_buckets(rollups):
+    db._update_pipeline_rollups(None, {"stage": 1, "intent": "neutral", "score": 10}, NOW)
+    db._update_pipeline_rollups(
+        {"stage": 1, "intent": "neutral", "score": 10}, {"stage": 2, "intent": "interest", "score": 65}, NOW
+    )
+    assert current(rollups) == {"conversations": 1, "stages.2": 1, "intents.interest": 1, "scores.60-79": 1}
+    assert rollups.docs["2026-03-02"]["turns"] == 2
+    assert rollups.docs["2026-03-02"]["new_conversations"] == 1
+
+
+def test_unchanged_buckets_cancel_out(rollups):
+    analysis = {"stage": 2, "intent": "interest", "score": 65}
+    db._update_pipeline_rollups(analysis, {"stage": 2, "intent": "interest", "score": 70}, NOW)
+    # Nothing moved, so the snapshot isn't written at all
+    assert [doc_id for doc_id, _ in rollups.updates] == ["2026-03-02"]
+
+
+def test_only_the_changed_bucket_is_incremented(rollups):
+    db._update_pipeline_rollups(
+        {"stage": 2, "intent": "interest", "score": 65}, {"stage": 2, "intent": "frustration", "score": 61}, NOW
+    )
+    (_, update), = [u for u in rollups.updates if u[0] == "current"]
+    assert update == {"$inc": {"intents.frustration": 1, "intents.interest": -1}}
+
+
+def test_unexpected_intents_and_scores_are_folded(rollups):
+    db._update_pipeline_rollups(None, {"stage": 3, "intent": " Curious.", "score": 140}, NOW)
+    assert current(rollups) == {"conversations": 1, "stages.3": 1, "intents.other": 1, "scores.80-100": 1}
+
+
+def test_previous_without_a_stage_counts_as_new(rollups):
+    db._update_pipeline_rollups({"stage": None}, {"stage": 1, "intent": "neutral", "score": 0}, NOW)
+    assert rollups.docs["current"]["conversations"] == 1
+    assert rollups.docs["2026-03-02"]["new_conversations"] == 1
+
+
+def test_turns_on_different_days_go_to_their_own_rollup(rollups):
+    db._update_pipeline_rollups(None, {"stage": 1, "intent": "neutral", "score": 10}, NOW)
+    db._update_pipeline_rollups(
+        {"stage": 1, "intent": "neutral", "score": 10}, {"stage": 1, "intent": "neutral", "score": 10},
+        datetime(2026, 3, 3, 0, 5)
+    )
+    assert rollups.docs["2026-03-03"]["turns"] == 1
+    assert "new_conversations" not in rollups.docs["2026-03-03"]
@@ -0,0 +1,44 @@
+from langchain_core.messages import HumanMessage
+import app.chatbot as chatbot
+from app.prompt_cache import PrefixCacheMetrics
+
+
+def test_repeated_prefix_is_a_hit_until_it_expires():
+    metrics = PrefixCacheMetrics(ttl=60)
+    assert not metrics.record_prefix("You are a sales assistant.")
+    assert metrics.record_prefix("You are a sales assistant.")
+    assert not metrics.record_prefix("You are a sales assistant for Acme.")
+    assert metrics.stats()["prefix_hit_rate"] == round(1 / 3, 3)
+
+    expired = PrefixCacheMetrics(ttl=0)
+    expired.record_prefix("prefix")
+    assert not expired.record_prefix("prefix")
+
+
+def test_chat_messages_hash_the_system_message_as_sent(monkeypatch):
+    metrics = PrefixCacheMetrics(ttl=60)
+    monkeypatch.setattr(chatbot, "prefix_cache", metrics)
+    history = [HumanMessage(content="Hi")]
+    chatbot.chat_messages(1, history, "What does it cost?", "Pricing: $29")
+    chatbot.chat_messages(2, history, "Do you integrate with HubSpot?", "Integrations: HubSpot")
+    assert metrics.stats()["prefix_hits"] == 1
+
+    # A per-turn value formatted into the system prompt must show up as misses
+    leaky = chatbot.base_system_prompt + " Today is {day}."
+    for day in ("Monday", "Tuesday"):
+        monkeypatch.setattr(chatbot, "base_system_prompt", leaky.format(day=day))
+        chatbot.chat_messages(1, history, "Hello", "")
+    assert metrics.stats()["prefix_hits"] == 1
+    assert metrics.stats()["distinct_prefixes"] == 3
+
+
+def test_provider_cached_tokens_are_summed():
+    metrics = PrefixCacheMetrics()
+
+    class Response:
+        usage_metadata = {"input_tokens": 1200, "input_token_details": {"cache_read": 1024}}
+
+    metrics.record_response(Response())
+    metrics.record_response(object())
+    assert metrics.stats()["provider_prompt_tokens"] == 1200
+    assert metrics.stats()["provider_cached_tokens"] == 1024
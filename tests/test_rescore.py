@@ -0,0 +1,107 @@
+import time
+import json
+import asyncio
+import pytest
+from bson import ObjectId
+import app.rescore as rescore
+
+
+class FakeConversations:
+    """The two collection calls RescoreRun makes, over an in-memory list of conversations."""
+
+    def __init__(self, conversations):
+        self.conversations = sorted(conversations, key=lambda c: c["_id"])
+        self.writes = []
+
+    def aggregate(self, pipeline, **kwargs):
+        match = pipeline[0].get("$match", {}).get("_id", {})
+        for conversation in self.conversations:
+            if "$gt" in match and conversation["_id"] <= match["$gt"]:
+                continue
+            messages = conversation["messages"]
+            yield {"_id": conversation["_id"], "total": len(messages),
+                   "messages": messages[-rescore.RESCORE_HISTORY_WINDOW:]}
+
+    def bulk_write(self, operations, ordered=True):
+        self.writes.extend(operations)
+
+
+def conversation(labelled=False, text="hello"):
+    user = {"sender": "user", "message": text}
+    if labelled:
+        user.update(stage=3, intent="neutral")
+    return {"_id": ObjectId(), "messages": [user, {"sender": "ai", "message": "hi there"}]}
+
+
+@pytest.fixture
+def conversations(monkeypatch):
+    fake = FakeConversations([conversation(labelled=i % 2 == 1) for i in range(5)])
+    monkeypatch.setattr(rescore, "conversations_collection", fake)
+    monkeypatch.setattr(rescore, "rebuild_pipeline_snapshot", lambda: None)
+    monkeypatch.setattr(rescore, "classify_stage", lambda message, history: 5)
+    monkeypatch.setattr(rescore, "detect_intent", lambda message, history: "interest")
+    return fake
+
+
+def run(checkpoint, **kwargs):
+    rescore_run = rescore.RescoreRun(str(checkpoint), batch_size=2, requests_per_minute=0, **kwargs)
+    return asyncio.run(rescore_run.run())
+
+
+def test_reuses_stored_labels_and_classifies_the_rest(conversations, tmp_path):
+    result = run(tmp_path / "checkpoint.json")
+    assert result["status"] == "done"
+    assert (result["processed"], result["reused"], result["classified"]) == (5, 2, 3)
+    updates = [op._doc["$set"] for op in conversations.writes]
+    assert [u["stage"] for u in updates] == [5, 3, 5, 3, 5]
+    assert "messages.0.stage" in updates[0] and "messages.0.stage" not in updates[1]
+
+
+def test_completed_pass_is_not_resumed(conversations, tmp_path):
+    checkpoint = tmp_path / "checkpoint.json"
+    run(checkpoint)
+    assert json.loads(checkpoint.read_text())["status"] == "done"
+
+    conversations.writes.clear()
+    result = run(checkpoint)
+    assert result["processed"] == 5
+    assert len(conversations.writes) == 5
+
+
+def test_interrupted_pass_resumes_after_last_batch(conversations, tmp_path):
+    checkpoint = tmp_path / "checkpoint.json"
+    third = conversations.conversations[2]["_id"]
+    checkpoint.write_text(json.dumps({"status": "running", "last_id": str(conversations.conversations[1]["_id"])}))
+
+    result = run(checkpoint)
+    assert result["processed"] == 3
+    assert conversations.writes[0]._filter == {"_id": third}
+
+
+def test_failed_classification_is_counted_not_stored(conversations, monkeypatch, tmp_path):
+    def unavailable(message, history):
+        raise TimeoutError("LLM unavailable")
+
+    monkeypatch.setattr(rescore, "classify_stage", unavailable)
+    result = run(tmp_path / "checkpoint.json")
+    assert (result["failed"], result["reused"]) == (3, 2)
+    assert [op._doc["$set"]["stage"] for op in conversations.writes] == [3, 3]
+
+
+def test_run_returns_after_its_classifier_calls(conversations, monkeypatch, tmp_path):
+    finished = []
+
+    def unavailable(message, history):
+        raise TimeoutError("LLM unavailable")
+
+    def slow_intent(message, history):
+        time.sleep(0.2)
+        finished.append(message)
+        return "interest"
+
+    # The stage call fails at once, leaving the intent call of the same turn running
+    monkeypatch.setattr(rescore, "classify_stage", unavailable)
+    monkeypatch.setattr(rescore, "detect_intent", slow_intent)
+    result = run(tmp_path / "checkpoint.json")
+    assert result["failed"] == 3
+    assert len(finished) == 3
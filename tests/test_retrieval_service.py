@@ -0,0 +1,108 @@
+import time
+import asyncio
+import pytest
+from fastapi.testclient import TestClient
+import app.context
+import app.retrieval_service as retrieval_service
+from app.knowledge_base import KnowledgeBase
+from app.namespaces import NamespaceRegistry
+from app.retrieval_client import RetrievalClient
+from app.retrieval_service import EmbeddingBatcher
+
+LEADS_CSV = b"""name,company,title,city
+Ada Lovelace,Analytical Engines Ltd,Head of Sales,London
+Grace Hopper,Compilers Inc,VP Engineering,New York
+"""
+
+
+class CountingEmbeddings:
+    def __init__(self, fail=False):
+        self.calls = []
+        self.fail = fail
+
+    def embed_documents(self, texts):
+        self.calls.append(list(texts))
+        if self.fail:
+            raise RuntimeError("model crashed")
+        return [[float(len(text))] for text in texts]
+
+
+def embed_concurrently(batcher, requests):
+    async def run():
+        batcher.start()
+        try:
+            return await asyncio.gather(*(batcher.embed(texts) for texts in requests), return_exceptions=True)
+        finally:
+            await batcher.stop()
+
+    return asyncio.run(run())
+
+
+def test_concurrent_requests_share_one_model_call():
+    embeddings = CountingEmbeddings()
+    results = embed_concurrently(EmbeddingBatcher(embeddings, max_batch=64, max_wait_ms=50), [["a"], ["bb", "ccc"], ["dddd"]])
+    assert results == [[[1.0]], [[2.0], [3.0]], [[4.0]]]
+    assert embeddings.calls == [["a", "bb", "ccc", "dddd"]]
+
+
+def test_batches_are_capped():
+    embeddings = CountingEmbeddings()
+    embed_concurrently(EmbeddingBatcher(embeddings, max_batch=2, max_wait_ms=50), [["a"], ["b"], ["c"]])
+    assert [len(call) for call in embeddings.calls] == [2, 1]
+
+
+def test_model_error_fails_every_request_in_the_batch():
+    results = embed_concurrently(EmbeddingBatcher(CountingEmbeddings(fail=True), max_wait_ms=50), [["a"], ["b"]])
+    assert all(isinstance(result, RuntimeError) for result in results)
+
+
+@pytest.fixture
+def client(make_vector_db, embeddings, monkeypatch, tmp_path):
+    """A RetrievalClient talking to the service app, with a real registry and FAQ knowledge base."""
+    faq = tmp_path / "faq.txt"
+    faq.write_text("Pricing starts at 49 dollars per seat per month.\n\nRefunds are available within 30 days.")
+    monkeypatch.setattr(app.context, "count_tokens", lambda text: len(text.split()))
+    monkeypatch.setattr(retrieval_service, "get_embeddings", lambda: embeddings)
+    monkeypatch.setattr(retrieval_service, "get_namespace_registry", lambda: NamespaceRegistry(str(tmp_path / "ns")))
+    knowledge_base = KnowledgeBase([str(faq)], reload_interval=0)
+    knowledge_base.reload()
+    monkeypatch.setattr(retrieval_service, "get_knowledge_base", lambda: knowledge_base)
+    client = RetrievalClient("http://retrieval")
+    with TestClient(retrieval_service.app) as http:
+        client._http = http
+        yield client
+
+
+def wait_for_jobs(client, namespace):
+    deadline = time.monotonic() + 10
+    while any(job["status"] in ("queued", "running") for job in client.jobs(namespace)):
+        assert time.monotonic() < deadline
+        time.sleep(0.02)
+    return client.jobs(namespace)
+
+
+def test_ingest_then_search_and_build_context(client):
+    assert client.health()["faq_chunks"] > 0
+    client.ingest("ada@example.com", "leads.csv", LEADS_CSV)
+    assert [job["status"] for job in wait_for_jobs(client, "ada@example.com")] == ["done"]
+
+    results = client.search("leads", "Grace Hopper compilers", n_results=1, namespace="ada@example.com")
+    assert "Grace Hopper" in results["documents"][0][0]
+    context = client.context("Seat pricing per month for Grace Hopper", namespace="ada@example.com")
+    assert "Pricing starts at 49" in context and "Lead 1: " in context
+
+
+def test_namespaces_are_kept_apart(client):
+    client.ingest("ada@example.com", "leads.csv", LEADS_CSV)
+    wait_for_jobs(client, "ada@example.com")
+    assert client.search("leads", "Grace Hopper", namespace="bob@example.com") is None
+    client.clear("ada@example.com")
+    assert client.search("leads", "Grace Hopper", namespace="ada@example.com") is None
+
+
+def test_embed_and_bad_requests(client, embeddings):
+    assert client.embed(["pricing"]) == [embeddings.embed_query("pricing")]
+    with pytest.raises(Exception, match="400"):
+        client.search("leads", "Grace Hopper")
+    with pytest.raises(Exception, match="404"):
+        client.search("notes", "Grace Hopper")
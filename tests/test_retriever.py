@@ -0,0 +1,33 @@
+import pytest
+from app.retriever import hybrid_search, reciprocal_rank_fusion
+
+
+def test_rrf_rewards_agreement_between_lists():
+    fused = reciprocal_rank_fusion([["a", "b", "c"], ["b", "d"]], k=60)
+    assert [item_id for item_id, _ in fused] == ["b", "a", "d", "c"]
+    assert fused[0][1] == pytest.approx(1 / 62 + 1 / 61)
+
+
+def test_rrf_of_nothing_is_empty():
+    assert reciprocal_rank_fusion([[], []]) == []
+
+
+class FakeStore:
+    """Returns fixed dense (L2 distances, lower is better) and BM25 (scores, higher is better) hits."""
+
+    def query_vector_db(self, query_text, n_results, filters=None, query_vector=None):
+        return {"ids": [[1, 2]], "documents": [["near", "far"]], "metadatas": [[None, None]],
+                "distances": [[0.2, 1.6]], "similarities": [[0.9, 0.2]]}
+
+    def lexical_search(self, query_text, n_results, filters=None):
+        return {"ids": [[3, 1]], "documents": [["exact name", "near"]], "metadatas": [[None, None]],
+                "scores": [[7.5, 1.2]]}
+
+
+def test_hybrid_search_keeps_dense_and_lexical_scores_apart():
+    results = hybrid_search(FakeStore(), "query", n_results=3)
+    assert results["ids"][0][0] == 1  # found by both
+    by_id = dict(zip(results["ids"][0], zip(results["similarities"][0], results["lexical_scores"][0])))
+    assert by_id[1] == (pytest.approx(0.9), 1.2)
+    assert by_id[2] == (pytest.approx(0.2), None)
+    assert by_id[3] == (None, 7.5)
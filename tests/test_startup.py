@@ -0,0 +1,30 @@
+import os
+import sys
+import json
+import subprocess
+import pytest
+from benchmarks.bench_startup import profile
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# Loaded on first use (first chat, first ingest, first DB call), never at import
+HEAVY_MODULES = ["faiss", "sentence_transformers", "torch", "PyPDF2", "pymongo", "tiktoken", "pandas",
+                 "langchain_community", "app.vector_db", "app.retriever"]
+
+
+def modules_loaded_by(statement):
+    env = {**os.environ, "PYTHONPATH": os.pathsep.join(filter(None, [REPO_ROOT, os.environ.get("PYTHONPATH")]))}
+    script = f"{statement}\nimport json, sys\nprint(json.dumps(sorted(sys.modules)))"
+    out = subprocess.run([sys.executable, "-c", script], cwd=REPO_ROOT, env=env, capture_output=True, text=True, check=True)
+    return set(json.loads(out.stdout.strip().splitlines()[-1]))
+
+
+@pytest.mark.parametrize("statement", ["import api.main", "import app.chatbot, app.db, app.retrieval_client"])
+def test_entry_points_import_without_the_ml_stack(statement):
+    loaded = modules_loaded_by(statement)
+    assert [module for module in HEAVY_MODULES if module in loaded] == []
+
+
+def test_profile_sums_self_time_per_package():
+    wall, packages, total, error = profile("import json.decoder")
+    assert error is None and wall > 0
+    assert packages["json"] > 0 and total >= sum(packages.values())
@@ -0,0 +1,55 @@
+import pandas as pd
+import pytest
+from PyPDF2 import PdfReader
+
+from app.pdf_ingest import iter_pdf_pages
+from benchmarks import bench_retrieval
+from benchmarks.synthetic import generate_faq, generate_lead_rows, generate_lead_texts, write_lead_csv, write_pdf
+
+
+def test_lead_rows_are_reproducible_from_the_seed():
+    rows = generate_lead_rows(50, seed=3)
+    assert rows == generate_lead_rows(50, seed=3)
+    assert rows != generate_lead_rows(50, seed=4)
+    assert len({row["email"] for row in rows}) == 50
+
+
+def test_lead_texts_match_the_csv_chunks(tmp_path, make_vector_db):
+    df = pd.read_csv(write_lead_csv(tmp_path / "leads.csv", 20, seed=5), keep_default_na=False)
+    assert list(df.columns) == list(generate_lead_rows(1)[0])
+    assert make_vector_db().extract_chunks_from_csv(df) == generate_lead_texts(20, seed=5)
+
+
+def test_pdf_has_the_requested_pages_of_text(tmp_path):
+    path = write_pdf(tmp_path / "document.pdf", 3)
+    assert len(PdfReader(str(path)).pages) == 3
+    with open(path, "rb") as f:
+        pages = [text for _, text in iter_pdf_pages(f)]
+    assert len(pages) == 3
+    assert all("teams use" in text for text in pages)
+
+
+def test_faq_sections_have_topic_headers():
+    faq = generate_faq(10)
+    sections = faq.split("\n\n")
+    headers = [section.split("\n", 1)[0] for section in sections if not section.startswith(("Q:", "A:"))]
+    assert len(headers) == 10
+    assert all(header.endswith(f" {i}:") for i, header in enumerate(headers))
+
+
+def test_queries_come_from_the_corpus():
+    rows = generate_lead_rows(30)
+    queries = bench_retrieval.make_queries("csv", 30, 5)
+    assert len(queries) == 5
+    assert all(any(row["company"] in query for row in rows) for query in queries)
+    faq = generate_faq(10).replace("\n", " ")
+    assert all(query in faq for query in bench_retrieval.make_queries("faq", 10, 5))
+
+
+@pytest.mark.parametrize("corpus, size", [("csv", 40), ("pdf", 2), ("faq", 20)])
+def test_run_corpus_reports_a_result_row(make_vector_db, corpus, size):
+    row = bench_retrieval.run_corpus(corpus, size, n_queries=5, k=3)
+    assert row["corpus"] == corpus and row["chunks"] > 0
+    # The store is exact search at this size
+    assert row["recall@3"] == 1.0
+    assert set(row["hybrid_search"]) == {"p50_ms", "p99_ms"}
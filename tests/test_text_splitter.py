@@ -0,0 +1,93 @@
+import re
+
+import pytest
+
+from app import text_splitter
+from app.text_splitter import TokenTextSplitter
+
+
+class WordEncoding:
+    def __init__(self, text):
+        self.offsets = [(m.start(), m.end()) for m in re.finditer(r"\w+|[^\w\s]", text)]
+        self.ids = list(range(len(self.offsets)))
+
+
+class WordTokenizer:
+    """One token per word or punctuation mark, with the character offsets a `tokenizers.Tokenizer` reports."""
+
+    def encode(self, text, add_special_tokens=True):
+        return WordEncoding(text)
+
+    def encode_batch(self, texts, add_special_tokens=True):
+        return [WordEncoding(text) for text in texts]
+
+
+def splitter(chunk_tokens=20, chunk_overlap=4):
+    return TokenTextSplitter(WordTokenizer(), chunk_tokens, chunk_overlap)
+
+
+DOC = """# Pricing
+
+Plans start at ten dollars per seat. Annual billing gets two months free.
+
+Enterprise:
+Volume discounts apply above five hundred seats. Contact sales for a quote.
+
+# Security
+
+Data is encrypted at rest and in transit."""
+
+
+def test_offsets_point_back_into_the_source():
+    for doc in splitter().split_text(DOC, metadata={"source": "faq.md"}):
+        assert DOC[doc.metadata["start_index"]:doc.metadata["end_index"]] == doc.page_content
+        assert doc.metadata["source"] == "faq.md"
+
+
+def test_chunks_respect_the_token_limit():
+    for doc in splitter(chunk_tokens=8, chunk_overlap=2).split_text(DOC):
+        assert len(WordEncoding(doc.page_content).offsets) <= 8
+
+
+def test_chunks_carry_their_section_and_never_cross_a_header():
+    docs = list(splitter(chunk_tokens=200, chunk_overlap=4).split_text(DOC))
+    assert [doc.metadata["section"] for doc in docs] == ["Pricing", "Enterprise", "Security"]
+    assert docs[1].page_content.startswith("Enterprise:")
+    assert "Security" not in docs[1].page_content
+
+
+def test_section_carries_over_from_the_previous_page():
+    docs = list(splitter().split_text("More about encryption keys.", section="Security"))
+    assert docs[0].metadata["section"] == "Security"
+
+
+def test_long_paragraph_prefers_sentence_breaks_and_overlaps():
+    text = " ".join(f"Sentence number {i} is here." for i in range(10))
+    docs = list(splitter(chunk_tokens=20, chunk_overlap=4).split_text(text))
+    assert len(docs) > 1
+    for doc in docs[:-1]:
+        assert doc.page_content.endswith(".")
+    for previous, doc in zip(docs, docs[1:]):
+        assert doc.metadata["start_index"] < previous.metadata["end_index"]
+
+
+def test_oversized_block_is_cut_at_whitespace(monkeypatch):
+    monkeypatch.setattr(text_splitter, "SPLIT_BLOCK_CHARS", 30)
+    text = "alpha beta gamma delta epsilon zeta eta theta iota kappa"
+    docs = list(splitter(chunk_tokens=200, chunk_overlap=4).split_text(text))
+    assert len(docs) > 1
+    for doc in docs:
+        assert text[doc.metadata["start_index"]:doc.metadata["end_index"]] == doc.page_content
+        assert not doc.page_content.startswith(" ")
+
+
+def test_split_rows_keeps_keys_and_row_offsets():
+    rows = ["Ada | CTO | ada@engines.io", "Grace | VP Engineering"]
+    pairs = list(splitter().split_rows(rows, metadatas=[{"row": 0}, {"row": 1}], keys=[7, 9]))
+    assert [(doc.page_content, key) for doc, key in pairs] == list(zip(rows, [7, 9]))
+    assert pairs[1][0].metadata == {"row": 1, "start_index": 0, "end_index": len(rows[1])}
+
+
+def test_overlap_must_be_smaller_than_chunk():
+    with pytest.raises(ValueError):
+        splitter(chunk_tokens=10, chunk_overlap=10)
@@ -0,0 +1,107 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+import pytest
+from langchain_core.documents import Document
+
+from app import vector_db as vector_db_module
+from app.index_factory import build_index
+from tests.test_dedup import COLUMNS, LEADS, lead
+
+
+def test_second_import_merges_into_an_existing_lead(make_vector_db):
+    vector_db = make_vector_db()
+    # Blank cells as a CSV export leaves them
+    first = LEADS.fillna("")
+    first.loc[0, "industry"] = ""
+    assert vector_db.create_vector_db_from_csv(first, metadata_cols=["industry", "employees"])
+    rows = len(vector_db)
+
+    update = pd.DataFrame([
+        lead("Ada Lovelace", "Analytical Engines Ltd.", "ada@engines.io", industry="Fintech"),
+    ], columns=COLUMNS).fillna("")
+    assert vector_db.create_vector_db_from_csv(update, metadata_cols=["industry", "employees"])
+
+    # Nothing new is indexed; the earlier lead picks up the field it was missing
+    assert len(vector_db) == rows
+    assert vector_db.last_dedup_report["near_duplicates"] == 1
+    assert vector_db.metadata_index.candidate_ids({"industry": "fintech"}).tolist() == [0]
+    (_, _, metadata), = [lead for lead in vector_db.iter_leads() if "Ada" in lead[1]]
+    assert metadata["industry"] == "Fintech"
+
+
+def test_searches_on_one_store_run_in_parallel(make_vector_db, monkeypatch):
+    vector_db = make_vector_db()
+    assert vector_db.create_vector_db_from_csv(LEADS.fillna(""))
+    # Each search waits inside the index until the other one is in there too
+    both_searching = threading.Barrier(2, timeout=5)
+    search = vector_db.lexical_index.search
+
+    def rendezvous(*args, **kwargs):
+        both_searching.wait()
+        return search(*args, **kwargs)
+
+    monkeypatch.setattr(vector_db.lexical_index, "search", rendezvous)
+    with ThreadPoolExecutor(2) as pool:
+        results = list(pool.map(lambda query: vector_db.lexical_search(query), ["Ada", "Grace"]))
+    assert all(result["ids"][0] for result in results)
+
+
+def test_search_waits_for_an_append_to_finish(make_vector_db, monkeypatch):
+    vector_db = make_vector_db()
+    assert vector_db.create_vector_db_from_csv(LEADS.fillna(""))
+    rows = len(vector_db)
+    appending, release = threading.Event(), threading.Event()
+    add = vector_db.lexical_index.add
+
+    def slow_add(*args, **kwargs):
+        appending.set()
+        release.wait(5)
+        return add(*args, **kwargs)
+
+    monkeypatch.setattr(vector_db.lexical_index, "add", slow_add)
+    update = pd.DataFrame([lead("Katherine Johnson", "Orbital Mechanics Co", "katherine@orbital.io")], columns=COLUMNS).fillna("")
+    with ThreadPoolExecutor(2) as pool:
+        importing = pool.submit(vector_db.create_vector_db_from_csv, update)
+        assert appending.wait(5)
+        searching = pool.submit(vector_db.lexical_search, "Katherine")
+        with pytest.raises(TimeoutError):
+            searching.result(timeout=0.2)
+        release.set()
+        assert importing.result(timeout=5)
+        # The search sees the finished append, never a half-written one
+        assert searching.result(timeout=5)["ids"][0][0] >= rows
+
+
+@pytest.mark.parametrize("index_type, tolerance", [("flat", 1e-5), ("hnsw", 1e-5), ("ivfsq8", 0.02)])
+def test_similarities_are_cosines_whatever_the_index(make_vector_db, index_type, tolerance):
+    vector_db = make_vector_db()
+    rng = np.random.default_rng(0)
+    # Off the unit sphere, as a model without a normalization layer would return them
+    vectors = rng.normal(size=(300, 64)).astype("float32") * rng.uniform(0.5, 3, size=(300, 1)).astype("float32")
+    vector_db.add_embedded_documents([Document(page_content=f"row {i}") for i in range(300)], vectors.tolist())
+    if index_type != "flat":
+        vector_db.vectorstore.index = build_index(vector_db.vectorstore.index.reconstruct_n(0, 300), index_type)
+
+    query = vectors[7] + rng.normal(scale=0.3, size=64).astype("float32")
+    results = vector_db.query_vector_db("row 7", n_results=5, query_vector=query.tolist())
+    assert results["ids"][0][0] == 7
+    unit = vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+    cosines = unit[results["ids"][0]] @ (query / np.linalg.norm(query))
+    assert results["similarities"][0] == pytest.approx(cosines.tolist(), abs=tolerance)
+
+
+def test_csv_columns_are_metadata_only_when_chosen(make_vector_db, monkeypatch):
+    vector_db = make_vector_db()
+    assert vector_db.create_vector_db_from_csv(LEADS.fillna(""))
+    assert vector_db.metadata_index.infer_filters("leads in the research industry") == {}
+    (_, _, metadata), *_ = vector_db.iter_leads()
+    assert metadata == {}
+
+    monkeypatch.setattr(vector_db_module, "LEAD_METADATA_COLUMNS", ["industry", "employees", "budget"])
+    vector_db = make_vector_db()
+    assert vector_db.create_vector_db_from_csv(LEADS.fillna(""))
+    assert vector_db.metadata_index.infer_filters("leads in the research industry") == {"industry": ["research"]}
+    assert vector_db.metadata_index.numeric_cols == {"employees"}